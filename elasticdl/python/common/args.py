@@ -1,7 +1,12 @@
 import argparse
 from itertools import chain
 
-from elasticdl.python.common.constants import DistributionStrategy
+from elasticdl.python.common.constants import (
+    DistributionStrategy,
+    EmbeddingEvictionPolicy,
+    GradientCompression,
+    SparseUpdateEngine,
+)
 from elasticdl.python.common.log_utils import default_logger as logger
 
 MODEL_SPEC_GROUP = [
@@ -323,6 +328,65 @@ def add_train_params(parser):
         "and PS that synchronous SGD can accepts.",
         default=0,
     )
+    parser.add_argument(
+        "--embedding_eviction_policy",
+        type=str,
+        choices=[
+            "",
+            EmbeddingEvictionPolicy.LRU,
+            EmbeddingEvictionPolicy.LFU,
+            EmbeddingEvictionPolicy.TTL,
+        ],
+        default="",
+        help="The policy to evict rows of embedding tables on PS. "
+        '"lru" and "lfu" evict the least recently or least frequently '
+        "accessed rows of a table with more than "
+        "--embedding_eviction_max_rows rows. "
+        '"ttl" evicts rows which are neither pulled nor updated in the '
+        "latest --embedding_eviction_ttl model versions. "
+        "If empty, rows are never evicted.",
+    )
+    parser.add_argument(
+        "--embedding_eviction_max_rows",
+        type=non_neg_int,
+        help="The maximum number of rows of an embedding table kept by "
+        '"lru" and "lfu" eviction policies',
+        default=0,
+    )
+    parser.add_argument(
+        "--embedding_eviction_ttl",
+        type=non_neg_int,
+        help="The number of model versions after which a row neither pulled "
+        'nor updated is evicted by "ttl" eviction policy',
+        default=0,
+    )
+    parser.add_argument(
+        "--embedding_eviction_steps",
+        type=pos_int,
+        help="Evict rows of embedding tables every this many model versions",
+        default=100,
+    )
+    parser.add_argument(
+        "--sparse_update_engine",
+        type=str,
+        choices=[SparseUpdateEngine.TENSORFLOW, SparseUpdateEngine.NUMPY],
+        default=SparseUpdateEngine.TENSORFLOW,
+        help="The engine to update embedding vectors and their optimizer "
+        'slots on PS. "tensorflow" applies the TensorFlow optimizer to '
+        'temporary variables. "numpy" updates rows of embedding tables '
+        "in place with NumPy and supports SGD (including momentum and "
+        "Nesterov momentum), Adagrad, Adam, Ftrl and RMSprop (including "
+        "momentum) optimizers.",
+    )
+    parser.add_argument(
+        "--grad_check_pushes_per_worker",
+        type=non_neg_int,
+        default=0,
+        help="If positive, PS only checks the names and shapes of "
+        "gradients in the first this many successful pushes of each "
+        "worker, which saves CPU of PS for trusted jobs. If 0, gradients "
+        "of every push are checked.",
+    )
     add_bool_param(
         parser=parser,
         name="--use_async",
@@ -504,6 +568,86 @@ def add_common_args_between_master_and_worker(parser):
         default=1,
         help="Worker will get_model from PS every this many steps",
     )
+    parser.add_argument(
+        "--gradient_compression",
+        type=str,
+        choices=[
+            "",
+            GradientCompression.FP16,
+            GradientCompression.BF16,
+            GradientCompression.TOP_K,
+        ],
+        default="",
+        help="The codec to compress dense gradients pushed to PS. "
+        '"fp16" and "bf16" downcast gradients to 16-bit floats. "topk" '
+        "pushes the --gradient_compression_top_k_ratio elements of the "
+        "largest magnitude and accumulates the others on the worker for "
+        "later pushes. If empty, gradients are not compressed.",
+    )
+    parser.add_argument(
+        "--gradient_compression_top_k_ratio",
+        type=float,
+        default=0.01,
+        help='The ratio of elements of a gradient pushed by "topk" '
+        "gradient compression",
+    )
+    parser.add_argument(
+        "--tensor_chunk_bytes",
+        type=non_neg_int,
+        default=0,
+        help="If positive, workers push and pull the model and push "
+        "gradients with streaming gRPC calls to PS, which send one tensor "
+        "or one chunk of a tensor of at most this many bytes per message. "
+        "If 0, a single message is sent for each call.",
+    )
+    parser.add_argument(
+        "--max_inflight_gradient_pushes",
+        type=non_neg_int,
+        default=0,
+        help="The maximum number of gradient pushes of a worker which are "
+        "sent to PS but not completed yet. If positive, a worker goes on "
+        "with the next minibatch without waiting for the responses of a "
+        "push, and waits for the earliest push if this many pushes are "
+        "in flight. It only works with asynchronous SGD. If 0, a worker "
+        "waits for each push to complete.",
+    )
+    parser.add_argument(
+        "--embedding_cache_size",
+        type=non_neg_int,
+        default=0,
+        help="The maximum number of embedding vectors of an embedding "
+        "table cached by a worker. The cached vectors are used instead of "
+        "pulling them from PS again. If 0, embedding vectors are not "
+        "cached.",
+    )
+    parser.add_argument(
+        "--embedding_cache_policy",
+        type=str,
+        choices=[EmbeddingEvictionPolicy.LRU, EmbeddingEvictionPolicy.LFU],
+        default=EmbeddingEvictionPolicy.LRU,
+        help="The policy to evict embedding vectors from a full embedding "
+        'cache of a worker. "lru" and "lfu" evict the least recently or '
+        "least frequently used vectors.",
+    )
+    parser.add_argument(
+        "--embedding_cache_staleness",
+        type=non_neg_int,
+        default=0,
+        help="The maximum number of model versions that a cached embedding "
+        "vector may fall behind the model version of a worker. Staler "
+        "vectors are pulled from PS again.",
+    )
+    add_bool_param(
+        parser=parser,
+        name="--prefetch_embedding_vectors",
+        default=False,
+        help="If True, workers start pulling the embedding vectors of the "
+        "next minibatch from PS before processing the current minibatch, "
+        "so that pulling overlaps computation. The embedding vectors of a "
+        "minibatch may miss the updates of the previous minibatch. In "
+        "both cases, the vectors of all the embedding layers of a "
+        "minibatch are pulled with one call to each PS.",
+    )
     parser.add_argument(
         "--data_reader_params",
         type=str,
@@ -511,6 +655,25 @@ def add_common_args_between_master_and_worker(parser):
         help="The data reader parameters in a string separated by semi-colon "
         'used to instantiate the data reader, e.g. "param1=1; param2=2"',
     )
+    parser.add_argument(
+        "--data_reader_processes",
+        type=non_neg_int,
+        default=0,
+        help="The number of processes of a worker which read the records "
+        "of tasks in parallel. If the data reader provides "
+        "`record_parse_fn`, the records are also parsed by it in these "
+        "processes. If 0, records are read in the worker process.",
+    )
+    parser.add_argument(
+        "--prefetch_tasks",
+        type=non_neg_int,
+        default=0,
+        help="The number of tasks which a worker gets from the master ahead "
+        "of the task being read, in a background thread. The records of "
+        "the prefetched tasks are opened and the first records are read "
+        "in advance unless --data_reader_processes is positive. If 0, a "
+        "worker gets the next task after reading the current one.",
+    )
     parser.add_argument(
         "--distribution_strategy",
         type=str,
@@ -597,6 +760,12 @@ def parse_master_args(master_args=None):
         logger.warning(
             "get_model_steps is set to 1 when using synchronous SGD."
         )
+    if not args.use_async and args.max_inflight_gradient_pushes > 0:
+        args.max_inflight_gradient_pushes = 0
+        logger.warning(
+            "max_inflight_gradient_pushes is set to 0 when using "
+            "synchronous SGD."
+        )
     if args.use_async and args.grads_to_wait > 1:
         args.grads_to_wait = 1
         logger.warning(
@@ -70,3 +70,20 @@ class ReaderType(object):
     CSV_READER = "CSV"
     ODPS_READER = "ODPS"
     RECORDIO_READER = "RecordIO"
+
+
+class EmbeddingEvictionPolicy(object):
+    LRU = "lru"
+    LFU = "lfu"
+    TTL = "ttl"
+
+
+class SparseUpdateEngine(object):
+    TENSORFLOW = "tensorflow"
+    NUMPY = "numpy"
+
+
+class GradientCompression(object):
+    FP16 = "fp16"
+    BF16 = "bf16"
+    TOP_K = "topk"
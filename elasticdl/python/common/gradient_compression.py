@@ -0,0 +1,191 @@
+"""Codecs to compress dense gradients pushed from workers to PS"""
+
+import numpy as np
+import tensorflow as tf
+
+from elasticdl.proto import tensor_dtype_pb2
+from elasticdl.python.common.constants import GradientCompression
+from elasticdl.python.common.tensor import (
+    Tensor,
+    emplace_tensor_pb_from_ndarray,
+    serialize_tensor,
+)
+
+_BFLOAT16_BITS_DTYPE = np.dtype("<u2")
+_INDICES_DTYPE = np.dtype("<i8")
+_VALUES_DTYPE = np.dtype("<f4")
+
+
+def float32_to_bfloat16_bits(values):
+    """Rounds float32 values to the nearest bfloat16 values, ties to even.
+
+    Returns:
+        A uint16 numpy.ndarray of the bits of the bfloat16 values.
+    """
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    rounding_bias = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+    result = ((bits + rounding_bias) >> 16).astype(np.uint16)
+    # Keep NaN from being rounded to infinity
+    result[np.isnan(values)] = 0x7FC0
+    return result
+
+
+def bfloat16_bits_to_float32(bits):
+    """Converts the bits of bfloat16 values to float32 values."""
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+class GradientCompressor(object):
+    """Compresses dense gradients of a worker into tensor protocol buffers.
+
+    "fp16" and "bf16" downcast float32 gradients to 16-bit floats. "topk"
+    only pushes the `top_k_ratio` elements of the largest magnitude of a
+    gradient. The other elements are kept as residuals on the worker and
+    added to the gradient of the next push (error feedback).
+
+    Gradients of `tf.IndexedSlices`, which are already sparse, and
+    gradients which are not float32 are not compressed.
+    """
+
+    def __init__(self, compression="", top_k_ratio=0.01):
+        """
+        Args:
+            compression: A codec in `GradientCompression`, or "" to not
+                compress gradients.
+            top_k_ratio: The ratio of elements pushed by "topk" codec.
+        """
+        if compression not in (
+            "",
+            GradientCompression.FP16,
+            GradientCompression.BF16,
+            GradientCompression.TOP_K,
+        ):
+            raise ValueError("Unknown gradient compression %s" % compression)
+        if compression == GradientCompression.TOP_K and not (
+            0 < top_k_ratio <= 1
+        ):
+            raise ValueError(
+                "top_k_ratio should be in (0, 1], got %s" % top_k_ratio
+            )
+        self._compression = compression
+        self._top_k_ratio = top_k_ratio
+        self._residuals = {}
+        self._pending_residuals = {}
+
+    def emplace_gradient_pb(self, tensor_pb_list, grad, name):
+        """Compresses a gradient into a tensor protocol buffer and appends
+        it to `tensor_pb_list`.
+
+        Residuals of "topk" codec are pending until `update_residuals`.
+        """
+        if not self._compression or isinstance(grad, tf.IndexedSlices):
+            emplace_tensor_pb_from_ndarray(tensor_pb_list, grad, name=name)
+            return
+        values = grad.numpy() if isinstance(grad, tf.Tensor) else grad
+        if values.dtype != np.float32:
+            emplace_tensor_pb_from_ndarray(tensor_pb_list, values, name=name)
+            return
+
+        tensor_pb = tensor_pb_list.add()
+        if self._compression == GradientCompression.FP16:
+            serialize_tensor(
+                Tensor(values.astype(np.float16), name=name), tensor_pb
+            )
+        else:
+            tensor_pb.name = name
+            tensor_pb.dim.extend(values.shape)
+            if self._compression == GradientCompression.BF16:
+                tensor_pb.dtype = tensor_dtype_pb2.DT_BFLOAT16
+                tensor_pb.content = float32_to_bfloat16_bits(values).tobytes()
+            else:
+                indices, top_k_values = self._select_top_k(name, values)
+                tensor_pb.dtype = tensor_dtype_pb2.DT_FLOAT32
+                tensor_pb.content = top_k_values.tobytes()
+                tensor_pb.indices_content = indices.astype(
+                    _INDICES_DTYPE
+                ).tobytes()
+        tensor_pb.compression = self._compression
+
+    def _select_top_k(self, name, values):
+        residual = self._residuals.get(name)
+        if residual is None:
+            # Copy the gradient which may share memory with a TensorFlow
+            # tensor, since the residual is updated in place.
+            accumulated = values.flatten()
+        else:
+            accumulated = values.reshape(-1) + residual
+        k = min(
+            accumulated.size,
+            max(1, int(np.ceil(accumulated.size * self._top_k_ratio))),
+        )
+        if k == accumulated.size:
+            indices = np.arange(k)
+        else:
+            indices = np.argpartition(np.abs(accumulated), -k)[-k:]
+        top_k_values = accumulated[indices]
+        accumulated[indices] = 0
+        self._pending_residuals[name] = accumulated
+        return indices, top_k_values
+
+    def update_residuals(self, accepted_names):
+        """Keeps the pending residuals of the gradients `accepted_names`
+        accepted by PS, and drops the other pending residuals so that the
+        residuals of rejected gradients stay unchanged."""
+        for name in accepted_names:
+            if name in self._pending_residuals:
+                self._residuals[name] = self._pending_residuals[name]
+        self._pending_residuals.clear()
+
+
+def deserialize_gradient_pb(tensor_pb):
+    """Deserializes a tensor protocol buffer of a gradient which may be
+    compressed by `GradientCompressor`.
+
+    Compressed gradients are restored to dense float32 tensors. Like
+    `deserialize_tensor_pb`, the input tensor protocol buffer is reset.
+
+    Returns:
+        An ElasticDL `Tensor`.
+    """
+    compression = tensor_pb.compression
+    if not compression:
+        return Tensor.from_tensor_pb(tensor_pb)
+    if compression == GradientCompression.FP16:
+        tensor = Tensor.from_tensor_pb(tensor_pb)
+        tensor.values = tensor.values.astype(np.float32)
+        return tensor
+
+    shape = tuple(tensor_pb.dim)
+    size = int(np.prod(shape))
+    content = tensor_pb.content
+    if compression == GradientCompression.BF16:
+        bits = np.frombuffer(content, dtype=_BFLOAT16_BITS_DTYPE)
+        if bits.size != size:
+            raise ValueError(
+                "Gradient %s size mismatch, dim: %s, bfloat16 elements: %d"
+                % (tensor_pb.name, shape, bits.size)
+            )
+        values = bfloat16_bits_to_float32(bits).reshape(shape)
+    elif compression == GradientCompression.TOP_K:
+        indices = np.frombuffer(
+            tensor_pb.indices_content, dtype=_INDICES_DTYPE
+        )
+        top_k_values = np.frombuffer(content, dtype=_VALUES_DTYPE)
+        if indices.size != top_k_values.size or (
+            indices.size and not 0 <= indices.min() <= indices.max() < size
+        ):
+            raise ValueError(
+                "Gradient %s has invalid top-k elements for dim %s"
+                % (tensor_pb.name, shape)
+            )
+        values = np.zeros(size, dtype=np.float32)
+        values[indices] = top_k_values
+        values = values.reshape(shape)
+    else:
+        raise ValueError(
+            "Unknown gradient compression %s of gradient %s"
+            % (compression, tensor_pb.name)
+        )
+    tensor = Tensor(values, name=tensor_pb.name)
+    tensor_pb.Clear()
+    return tensor
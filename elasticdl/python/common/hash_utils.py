@@ -1,5 +1,7 @@
 import hashlib
 
+import numpy as np
+
 
 def string_to_id(name, bucket_num):
     h = hashlib.sha256(name.encode("utf-8"))
@@ -10,6 +12,33 @@ def int_to_id(number, bucket_num):
     return number % bucket_num
 
 
+def partition_ids(ids, bucket_num):
+    """Partitions ids into buckets by `int_to_id` with vectorized numpy
+    operations.
+
+    The ids of bucket `b` are `ids[order[offsets[b]:offsets[b + 1]]]`, in
+    the order they appear in `ids`. If the results of all buckets are
+    concatenated in the order of buckets, `inverse` gathers them back to
+    the order of `ids`.
+
+    For example, ids np.array([8, 1, 7, 2]) in two buckets are partitioned
+    to order np.array([0, 3, 1, 2]), offsets np.array([0, 2, 4]) and
+    inverse np.array([0, 2, 3, 1]).
+
+    Returns:
+        A tuple (order, offsets, inverse) of 1-D int64 numpy.ndarray.
+        `offsets` has `bucket_num + 1` elements.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    buckets = int_to_id(ids, bucket_num)
+    order = np.argsort(buckets, kind="stable")
+    offsets = np.zeros(bucket_num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(buckets, minlength=bucket_num), out=offsets[1:])
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return order, offsets, inverse
+
+
 def scatter_embedding_vector(values, indices, bucket_num):
     """
     Scatter embedding vectors to different parameter servers.
@@ -29,21 +58,16 @@ def scatter_embedding_vector(values, indices, bucket_num):
 
     The function return a dictionary:
     {
-        0: (np.array([[1, 2]]), [8]),
-        1: (np.array([[3, 4], [5, 6]]), [1, 7])
+        0: (np.array([[1, 2]]), np.array([8])),
+        1: (np.array([[3, 4], [5, 6]]), np.array([1, 7]))
     }
     """
-    ps_ids = {}
-    indices_list = indices.tolist()
-    for i, item_id in enumerate(indices_list):
-        ps_id = int_to_id(item_id, bucket_num)
-        if ps_id not in ps_ids:
-            ps_ids[ps_id] = [(i, item_id)]
-        else:
-            ps_ids[ps_id].append((i, item_id))
+    order, offsets, _ = partition_ids(indices, bucket_num)
+    values = values[order]
+    indices = np.asarray(indices)[order]
     results = {}
-    for ps_id, i_item_id in ps_ids.items():
-        i = [v[0] for v in i_item_id]
-        item_id = [v[1] for v in i_item_id]
-        results[ps_id] = (values[i, :], item_id)
+    for ps_id in range(bucket_num):
+        begin, end = offsets[ps_id], offsets[ps_id + 1]
+        if begin < end:
+            results[ps_id] = (values[begin:end], indices[begin:end])
     return results
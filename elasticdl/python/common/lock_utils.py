@@ -0,0 +1,116 @@
+import contextlib
+import threading
+
+import numpy as np
+
+
+class RWLock(object):
+    """A reader-writer lock.
+
+    Any number of readers can hold the lock at the same time, while a writer
+    holds it exclusively. New readers wait while a writer is waiting, so that
+    writers are not starved. The lock is not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def read_lock(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write_lock(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    @contextlib.contextmanager
+    def lock(self, exclusive):
+        if exclusive:
+            with self.write_lock():
+                yield
+        else:
+            with self.read_lock():
+                yield
+
+
+class StripedRWLock(object):
+    """Reader-writer locks of int64 keys partitioned into stripes.
+
+    A key is guarded by the `RWLock` of stripe `key % num_stripes`, so that
+    threads accessing keys of different stripes do not block each other.
+    """
+
+    def __init__(self, num_stripes=64):
+        """
+        Args:
+            num_stripes: The number of stripes. It must be a power of 2.
+        """
+        if num_stripes <= 0 or num_stripes & (num_stripes - 1):
+            raise ValueError("num_stripes should be a power of 2")
+        self._mask = num_stripes - 1
+        self._locks = [RWLock() for _ in range(num_stripes)]
+
+    def __len__(self):
+        return len(self._locks)
+
+    def group_by_stripe(self, keys):
+        """Groups positions of `keys` by their stripes.
+
+        Args:
+            keys: A 1-D int64 numpy.ndarray.
+
+        Returns:
+            A list of (stripe, positions) pairs, where `positions` is a 1-D
+            numpy.ndarray of the positions in `keys` of the keys in the
+            stripe. Stripes are in ascending order.
+        """
+        stripes = keys & self._mask
+        order = np.argsort(stripes, kind="stable")
+        sorted_stripes = stripes[order]
+        starts = np.flatnonzero(np.diff(sorted_stripes, prepend=-1))
+        ends = np.append(starts[1:], len(keys))
+        return [
+            (int(sorted_stripes[start]), order[start:end])
+            for start, end in zip(starts, ends)
+        ]
+
+    def lock(self, stripe, exclusive):
+        """Returns a context manager which holds the lock of `stripe`
+        exclusively if `exclusive` is True, otherwise shared."""
+        return self._locks[stripe].lock(exclusive)
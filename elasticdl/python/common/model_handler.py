@@ -37,10 +37,8 @@ def _convert_embedding_table_to_numpy_array(embedding_table, embedding_shape):
     Returns:
         A np.ndarray
     """
-    embedding_ids = list(embedding_table.embedding_vectors.keys())
-    embedding_values = list(embedding_table.embedding_vectors.values())
     embedding_weights = np.zeros(embedding_shape)
-    embedding_weights[embedding_ids] = embedding_values
+    embedding_weights[embedding_table.ids] = embedding_table.vectors
     return embedding_weights
 
 
@@ -258,4 +258,7 @@ class CheckpointSaver(object):
         parameters.non_embedding_params.update(non_embedding_vars)
         parameters.embedding_params.update(embedding_tables)
         parameters.version = version
+        parameters.set_non_embedding_params_modified(
+            non_embedding_vars, version
+        )
         return parameters
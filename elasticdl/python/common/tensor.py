@@ -7,6 +7,9 @@ from elasticdl.python.common.dtypes import (
     dtype_tensor_to_numpy,
 )
 
+# The dtype of indices in `Tensor.indices_content` of tensor protocol buffers
+_INDICES_DTYPE = np.dtype("<i8")
+
 
 class Tensor(object):
     """Data structure for tensors in ElasticDL.
@@ -108,7 +111,11 @@ class Tensor(object):
 
 
 def serialize_tensor(tensor, tensor_pb):
-    """Serialize ElasticDL Tensor to tensor protocol buffer."""
+    """Serialize ElasticDL Tensor to tensor protocol buffer.
+
+    Values and indices are dumped to bytes fields with one memory copy
+    each, without creating python objects for the elements.
+    """
     dtype = dtype_numpy_to_tensor(tensor.values.dtype)
     if not dtype:
         raise ValueError(
@@ -118,36 +125,50 @@ def serialize_tensor(tensor, tensor_pb):
     tensor_pb.dim.extend(tensor.values.shape)
     tensor_pb.content = tensor.values.tobytes()
     if tensor.is_indexed_slices():
-        tensor_pb.indices.extend(tuple(tensor.indices))
+        tensor_pb.indices_content = np.asarray(
+            tensor.indices, dtype=_INDICES_DTYPE
+        ).tobytes()
     if tensor.name:
         tensor_pb.name = tensor.name
 
 
+def _get_indices_from_tensor_pb(tensor_pb):
+    if tensor_pb.indices_content:
+        return np.frombuffer(tensor_pb.indices_content, dtype=_INDICES_DTYPE)
+    if tensor_pb.indices:
+        # Tensor protocol buffers in the deprecated format
+        return np.array(tensor_pb.indices, dtype=np.int64)
+    return None
+
+
 def deserialize_tensor_pb(tensor_pb, tensor):
     """Deserialize tensor protocol buffer to ElasticDL Tensor.
 
     Note that the input tensor protocol buffer is reset and underlying buffer
-    is passed to the returned ndarray.
+    is passed to the returned ndarray. The values and indices of the
+    returned tensor are read-only views of the buffers.
     """
     if not tensor_pb.dim:
         raise ValueError("Tensor PB has no dim defined")
 
     dtype = dtype_tensor_to_numpy(tensor_pb.dtype)
+    shape = tuple(tensor_pb.dim)
+    # Every access to a bytes field creates a new python bytes object,
+    # so `content` is only accessed once.
+    content = tensor_pb.content
     # Check that the buffer size agrees with dimensions.
     size = dtype.itemsize
-    for d in tensor_pb.dim:
+    for d in shape:
         size *= d
-    if size != len(tensor_pb.content):
+    if size != len(content):
         raise ValueError(
             "Tensor PB size mismatch, dim: %s, len(content): %d",
             tensor_pb.dim,
-            len(tensor_pb.content),
+            len(content),
         )
     tensor.set(
-        values=np.ndarray(
-            shape=tensor_pb.dim, dtype=dtype, buffer=tensor_pb.content
-        ),
-        indices=np.array(tensor_pb.indices) if tensor_pb.indices else None,
+        values=np.ndarray(shape=shape, dtype=dtype, buffer=content),
+        indices=_get_indices_from_tensor_pb(tensor_pb),
         name=tensor_pb.name,
     )
     tensor_pb.Clear()
@@ -185,3 +206,126 @@ def emplace_tensor_pb_from_ndarray(
     tensor_pb = tensor_pb_list.add()
     tensor = Tensor(values, indices, name)
     serialize_tensor(tensor, tensor_pb)
+
+
+def split_tensor_to_chunks(tensor, max_chunk_bytes):
+    """Splits an ElasticDL Tensor into chunks of rows, so that a large
+    tensor can be streamed in multiple messages.
+
+    Args:
+        tensor: An ElasticDL `Tensor`.
+        max_chunk_bytes: The maximum bytes of values of a chunk. A chunk has
+            at least one row. If 0, the tensor is not split.
+
+    Yields:
+        Tuples of (chunk, row_offset, total_rows), where `chunk` is an
+        ElasticDL `Tensor` of the rows from `row_offset`. `total_rows` is 0
+        if `chunk` is a whole tensor by itself, which is the case for a
+        tensor of one chunk, or a chunk of `tf.IndexedSlices` tensor which
+        has its own indices.
+    """
+    values = tensor.values
+    if (
+        not max_chunk_bytes
+        or values.ndim == 0
+        or values.nbytes <= max_chunk_bytes
+    ):
+        yield tensor, 0, 0
+        return
+    total_rows = values.shape[0]
+    row_bytes = max(1, values.nbytes // total_rows)
+    rows_per_chunk = max(1, max_chunk_bytes // row_bytes)
+    for start in range(0, total_rows, rows_per_chunk):
+        end = min(start + rows_per_chunk, total_rows)
+        if tensor.is_indexed_slices():
+            chunk = Tensor(
+                values[start:end], tensor.indices[start:end], tensor.name
+            )
+            yield chunk, start, 0
+        else:
+            chunk = Tensor(values[start:end], name=tensor.name)
+            yield chunk, start, total_rows
+
+
+def emplace_tensor_chunk_pb(tensor_pb_list, chunk, row_offset, total_rows):
+    """Serializes a chunk from `split_tensor_to_chunks` and appends it to
+    `tensor_pb_list`."""
+    tensor_pb = tensor_pb_list.add()
+    serialize_tensor(chunk, tensor_pb)
+    if total_rows:
+        tensor_pb.chunk_row_offset = row_offset
+        tensor_pb.chunk_total_rows = total_rows
+
+
+class TensorChunkAssembler(object):
+    """Assembles tensors from tensor protocol buffers of chunks.
+
+    The chunks of a tensor should be added in order and should not be
+    interleaved with the chunks of other tensors. The rows of chunks are
+    copied to a tensor allocated by the first chunk, so that the chunks are
+    released as soon as they are added.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._name = None
+        self._values = None
+        self._filled_rows = 0
+
+    def add(self, tensor_pb):
+        """Adds a tensor protocol buffer, which may be a chunk.
+
+        Note that the input tensor protocol buffer is reset.
+
+        Returns:
+            An ElasticDL `Tensor` if the tensor is complete, otherwise None.
+        """
+        total_rows = tensor_pb.chunk_total_rows
+        row_offset = tensor_pb.chunk_row_offset
+        chunk = Tensor.from_tensor_pb(tensor_pb)
+        if not total_rows:
+            if self._values is not None:
+                raise ValueError(
+                    "Tensor %s is interleaved with chunks of tensor %s"
+                    % (chunk.name, self._name)
+                )
+            return chunk
+
+        if self._values is None:
+            if row_offset != 0:
+                raise ValueError(
+                    "The first chunk of tensor %s starts from row %d"
+                    % (chunk.name, row_offset)
+                )
+            self._name = chunk.name
+            self._values = np.empty(
+                (total_rows,) + chunk.values.shape[1:],
+                dtype=chunk.values.dtype,
+            )
+        elif chunk.name != self._name or row_offset != self._filled_rows:
+            raise ValueError(
+                "Chunk of tensor %s from row %d is out of order"
+                % (chunk.name, row_offset)
+            )
+        end = row_offset + chunk.values.shape[0]
+        if end > total_rows:
+            raise ValueError(
+                "Chunk of tensor %s exceeds %d rows" % (chunk.name, total_rows)
+            )
+        self._values[row_offset:end] = chunk.values
+        self._filled_rows = end
+        if end < total_rows:
+            return None
+        tensor = Tensor(self._values, name=self._name)
+        self._reset()
+        return tensor
+
+    def finish(self):
+        """Checks that no tensor is partially assembled."""
+        if self._values is not None:
+            raise ValueError(
+                "Tensor %s only has %d of %d rows"
+                % (self._name, self._filled_rows, self._values.shape[0])
+            )
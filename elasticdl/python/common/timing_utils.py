@@ -7,6 +7,12 @@ TIMING_GROUP = [
     "report_gradient",
 ]
 
+COUNTER_GROUP = [
+    "embedding_cache_hits",
+    "embedding_cache_misses",
+    "embedding_cache_bytes_saved",
+]
+
 
 class Timing(object):
     def __init__(self, enable, logger=None):
@@ -14,6 +20,7 @@ class Timing(object):
         self.logger = logger
         self.timings = {}
         self.start_time = {}
+        self.counters = {}
         self.reset()
 
     def reset(self):
@@ -21,6 +28,8 @@ class Timing(object):
             return
         for timing_type in TIMING_GROUP:
             self.timings[timing_type] = 0
+        for counter_type in COUNTER_GROUP:
+            self.counters[counter_type] = 0
 
     def start_record_time(self, timing_type):
         if not self.enable:
@@ -32,6 +41,11 @@ class Timing(object):
             return
         self.timings[timing_type] += time.time() - self.start_time[timing_type]
 
+    def add_count(self, counter_type, count):
+        if not self.enable:
+            return
+        self.counters[counter_type] += count
+
     def report_timing(self, reset=False):
         if not self.enable:
             return
@@ -40,5 +54,18 @@ class Timing(object):
                 "%s time is %.6g seconds"
                 % (timing_type, self.timings[timing_type])
             )
+        lookups = (
+            self.counters["embedding_cache_hits"]
+            + self.counters["embedding_cache_misses"]
+        )
+        if lookups:
+            for counter_type in COUNTER_GROUP:
+                self.logger.debug(
+                    "%s is %d" % (counter_type, self.counters[counter_type])
+                )
+            self.logger.debug(
+                "embedding_cache hit rate is %.4g"
+                % (self.counters["embedding_cache_hits"] / lookups)
+            )
         if reset:
             self.reset()
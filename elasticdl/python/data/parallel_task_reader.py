@@ -0,0 +1,305 @@
+import atexit
+import multiprocessing
+import pickle
+import queue
+import traceback
+from collections import deque
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python < 3.8, chunks are sent through the result queue
+    shared_memory = None
+
+# The interval in seconds to check whether the worker processes are alive
+# while waiting for their results
+_POLL_INTERVAL = 1
+
+
+def _dump_chunk(chunk):
+    """Serializes a chunk of records or parsed columns. If shared memory is
+    available, the serialized chunk is put into a shared memory block and
+    its name and layout are returned, so that it is not copied through the
+    pipe of the result queue. The data of numpy arrays are written into
+    the block as they are, without being pickled."""
+    if shared_memory is None:
+        return pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+    buffers = []
+    data = pickle.dumps(chunk, protocol=5, buffer_callback=buffers.append)
+    buffers = [buffer.raw() for buffer in buffers]
+    sizes = [len(data)] + [buffer.nbytes for buffer in buffers]
+    shm = shared_memory.SharedMemory(create=True, size=max(sum(sizes), 1))
+    offset = 0
+    for buffer, size in zip([data] + buffers, sizes):
+        end = offset + size
+        shm.buf[offset:end] = buffer
+        offset = end
+    # The consumer process unlinks the block, so the resource tracker of
+    # this process should not unlink it when this process exits.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name, sizes
+
+
+def _load_chunk(chunk):
+    if isinstance(chunk, bytes):
+        return pickle.loads(chunk)
+    name, sizes = chunk
+    shm = shared_memory.SharedMemory(name=name)
+    # The out-of-band buffers are copied, so that the arrays loaded do not
+    # refer to the block.
+    buffers = []
+    offset = sizes[0]
+    for size in sizes[1:]:
+        end = offset + size
+        buffers.append(bytearray(shm.buf[offset:end]))
+        offset = end
+    data = shm.buf[: sizes[0]]
+    loaded = pickle.loads(data, buffers=buffers)
+    data.release()
+    shm.close()
+    shm.unlink()
+    return loaded
+
+
+def _parse_records(records, record_parse_fn, output_dtypes):
+    """Parses `records` with `record_parse_fn` into a tuple of numpy
+    arrays, one for each output. Each array has a row for each record."""
+    rows = [record_parse_fn(record) for record in records]
+    return tuple(
+        np.asarray([row[i] for row in rows], dtype=dtype)
+        for i, dtype in enumerate(output_dtypes)
+    )
+
+
+def read_task_loop(
+    data_reader,
+    task_queue,
+    result_queue,
+    chunk_size,
+    record_parse_fn=None,
+    output_dtypes=None,
+):
+    """
+    The worker loop gets a task from the task queue, reads its records
+    with the data reader, then the records are put to the result queue
+    in chunks. If `record_parse_fn` is not None, the records of a chunk
+    are parsed by it into column arrays, which are put instead.
+
+    If a None task is got, the loop finishes.
+
+    :param data_reader: the data reader to read the records of tasks
+    :param task_queue: a queue of (task index, task)
+    :param result_queue: a queue of (task index, chunk, done, error)
+    :param chunk_size: the number of records in a chunk
+    :param record_parse_fn: the function to parse a record into a tuple of
+        values, one for each output, or None
+    :param output_dtypes: the numpy dtypes of the outputs of
+        `record_parse_fn`
+    """
+
+    def _dump(records):
+        if not records:
+            return None
+        if record_parse_fn is not None:
+            records = _parse_records(records, record_parse_fn, output_dtypes)
+        return _dump_chunk(records)
+
+    while True:
+        item = task_queue.get()
+        if item is None:
+            break
+        index, task = item
+        try:
+            records = []
+            for record in data_reader.read_records(task):
+                if not record:
+                    continue
+                records.append(record)
+                if len(records) == chunk_size:
+                    result_queue.put((index, _dump(records), False, ""))
+                    records = []
+            result_queue.put((index, _dump(records), True, ""))
+        except Exception:
+            result_queue.put((index, None, True, traceback.format_exc()))
+
+
+class ParallelTaskReader(object):
+    """
+    The ParallelTaskReader reads the records of tasks with a number of
+    worker processes, so that reading and parsing records are not limited
+    to a single core by the GIL.
+
+    Worker process:
+    1. get a task from the task queue
+    2. read its records with `data_reader.read_records`
+    3. if `record_parse_fn` is set, parse each chunk of `chunk_size`
+       records into a tuple of column arrays
+    4. put the records or the column arrays to the result queue in chunks
+
+    Main process:
+    1. put tasks to the task queue, keeping `2 * num_processes` tasks in
+       flight
+    2. get chunks from the result queue and yield the records
+
+    The records are yielded strictly in the order of the tasks, and the
+    records of a task in the order of `read_records`. We use a dict of
+    chunk lists to buffer the chunks of the tasks behind the current one.
+    The chunks are passed through shared memory if it is available, where
+    the column arrays are not pickled.
+
+    The worker processes are spawned rather than forked, because the
+    runtimes of TensorFlow, gRPC and the Go library of RecordIO in the
+    worker do not survive `fork`. `close` should be called to stop them,
+    otherwise they are stopped when the main process exits.
+    """
+
+    def __init__(
+        self,
+        data_reader,
+        num_processes,
+        chunk_size=256,
+        record_parse_fn=None,
+        output_dtypes=None,
+    ):
+        """
+        Args:
+            data_reader: The picklable data reader to read the records of
+                tasks.
+            num_processes: The number of worker processes.
+            chunk_size: The number of records sent to the main process
+                at a time.
+            record_parse_fn: A picklable function to parse a record read by
+                `data_reader` into a tuple of values, one for each output,
+                in worker processes, or None.
+            output_dtypes: A list of the numpy dtypes of the outputs of
+                `record_parse_fn`.
+        """
+        self._parse_records = record_parse_fn is not None
+        self._num_processes = num_processes
+        context = multiprocessing.get_context("spawn")
+        self._task_queue = context.Queue()
+        self._result_queue = context.Queue()
+        # Task indices increase across `read` calls, so that the results of
+        # the tasks left in flight by an unfinished `read` can be told.
+        self._next_index = 0
+        self._workers = []
+        for _ in range(num_processes):
+            p = context.Process(
+                target=read_task_loop,
+                args=(
+                    data_reader,
+                    self._task_queue,
+                    self._result_queue,
+                    chunk_size,
+                    record_parse_fn,
+                    output_dtypes,
+                ),
+            )
+            p.daemon = True
+            p.start()
+            self._workers.append(p)
+        atexit.register(self.close)
+
+    def read(self, tasks):
+        """A generator of the records of `tasks`. If `record_parse_fn` is
+        set, a tuple of column arrays is yielded for each chunk of records
+        instead, in which each array has a row for each record.
+
+        Args:
+            tasks: An iterator of tasks. The next task is got only when
+                there is a free slot for it in the worker processes.
+        """
+        tasks = iter(tasks)
+        # The indices of the tasks in flight in order
+        inflight = deque()
+        # Task index -> a list of chunks which are not yielded yet
+        chunks = {}
+        done = set()
+        try:
+            while True:
+                while len(inflight) < 2 * self._num_processes:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    self._task_queue.put((self._next_index, task))
+                    inflight.append(self._next_index)
+                    chunks[self._next_index] = []
+                    self._next_index += 1
+                if not inflight:
+                    return
+
+                index = inflight[0]
+                while chunks[index]:
+                    chunk = _load_chunk(chunks[index].pop(0))
+                    if self._parse_records:
+                        yield chunk
+                    else:
+                        yield from chunk
+                if index in done:
+                    inflight.popleft()
+                    del chunks[index]
+                    done.remove(index)
+                    continue
+
+                self._get_result(chunks, done)
+        finally:
+            # Release the shared memory of the chunks not yielded
+            for task_chunks in chunks.values():
+                for chunk in task_chunks:
+                    _load_chunk(chunk)
+
+    def _get_result(self, chunks, done):
+        """Gets a chunk from the result queue and buffers it."""
+        while True:
+            try:
+                result = self._result_queue.get(timeout=_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                # A worker process killed, e.g. by the OOM killer, never
+                # puts the results of its task.
+                for w in self._workers:
+                    if not w.is_alive():
+                        raise RuntimeError(
+                            "Worker process %d of the task reader exited "
+                            "with code %s" % (w.pid, w.exitcode)
+                        )
+        index, chunk, is_done, err_msg = result
+        if index not in chunks:
+            # A result of a previous `read` which is not finished
+            if chunk is not None:
+                _load_chunk(chunk)
+            return
+        if err_msg:
+            raise RuntimeError(
+                "Failed to read task %d in a worker process:\n%s"
+                % (index, err_msg)
+            )
+        if chunk is not None:
+            chunks[index].append(chunk)
+        if is_done:
+            done.add(index)
+
+    def close(self):
+        """Stops the worker processes and releases the shared memory of the
+        chunks not consumed. It can be called more than once."""
+        if not self._workers:
+            return
+        atexit.unregister(self.close)
+        for w in self._workers:
+            if w.is_alive():
+                self._task_queue.put(None)
+        # A worker process can not exit until its results put to the
+        # result queue are consumed, so drain the queue.
+        while any(w.is_alive() for w in self._workers):
+            try:
+                _, chunk, _, _ = self._result_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if chunk is not None:
+                _load_chunk(chunk)
+        for w in self._workers:
+            w.join()
+        self._workers = []
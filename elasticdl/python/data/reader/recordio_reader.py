@@ -1,5 +1,7 @@
 import os
-from contextlib import closing
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
 
 import recordio
 import tensorflow as tf
@@ -10,19 +12,89 @@ from elasticdl.python.data.reader.data_reader import (
     check_required_kwargs,
 )
 
+# The max number of shard indices cached by a RecordIODataReader
+_MAX_CACHED_INDICES = 8
+
 
 class RecordIODataReader(AbstractDataReader):
     def __init__(self, **kwargs):
         AbstractDataReader.__init__(self, **kwargs)
         self._kwargs = kwargs
         check_required_kwargs(["data_dir"], self._kwargs)
+        # Shard name -> [`recordio.Index`, number of open scanners] in the
+        # order the shards are used. The index of a shard, i.e. the offsets
+        # of its chunks, is built once and shared by the scanners of the
+        # tasks of the shard. The least recently used indices without
+        # open scanners are closed if more than `_MAX_CACHED_INDICES`
+        # indices are cached.
+        self._indices = OrderedDict()
+        # Scanners are opened by the task prefetcher thread as well
+        self._indices_lock = threading.Lock()
+
+    def __getstate__(self):
+        # The indices are handles of the recordio library in this process
+        state = self.__dict__.copy()
+        state["_indices"] = OrderedDict()
+        del state["_indices_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._indices_lock = threading.Lock()
+
+    def close(self):
+        """Closes the cached indices."""
+        with self._indices_lock:
+            for index, _ in self._indices.values():
+                index.close()
+            self._indices.clear()
+
+    def _acquire_index(self, shard_name):
+        with self._indices_lock:
+            entry = self._indices.get(shard_name)
+            if entry is None:
+                entry = [recordio.Index(shard_name), 0]
+                self._indices[shard_name] = entry
+            else:
+                self._indices.move_to_end(shard_name)
+            entry[1] += 1
+            self._evict_indices()
+            return entry[0]
+
+    def _release_index(self, shard_name):
+        with self._indices_lock:
+            entry = self._indices.get(shard_name)
+            if entry is not None:
+                entry[1] -= 1
+                self._evict_indices()
+
+    def _evict_indices(self):
+        for shard_name in list(self._indices):
+            if len(self._indices) <= _MAX_CACHED_INDICES:
+                break
+            index, scanners = self._indices[shard_name]
+            if not scanners:
+                del self._indices[shard_name]
+                index.close()
+
+    @contextmanager
+    def _open_scanner(self, task):
+        index = self._acquire_index(task.shard_name)
+        try:
+            with closing(
+                recordio.Scanner(
+                    task.shard_name,
+                    task.start,
+                    task.end - task.start,
+                    index=index,
+                )
+            ) as reader:
+                yield reader
+        finally:
+            self._release_index(task.shard_name)
 
     def read_records(self, task):
-        with closing(
-            recordio.Scanner(
-                task.shard_name, task.start, task.end - task.start
-            )
-        ) as reader:
+        with self._open_scanner(task) as reader:
             while True:
                 record = reader.record()
                 if record:
@@ -30,6 +102,28 @@ class RecordIODataReader(AbstractDataReader):
                 else:
                     break
 
+    def read_record_batches(self, task, batch_size=256):
+        """Reads the records of `task` in lists of at most `batch_size`
+        records, so that a `tf.data.Dataset` created from the generator
+        gets a batch of records in a call instead of one record.
+
+        Note that the shards are not memory-mapped, and each record is
+        still copied out of the recordio library into its own `bytes`.
+        The chunks of RecordIO files are compressed with snappy by default,
+        so the records can not be served from the file without decoding.
+        """
+        with self._open_scanner(task) as reader:
+            records = []
+            record = reader.record()
+            while record:
+                records.append(record)
+                if len(records) == batch_size:
+                    yield records
+                    records = []
+                record = reader.record()
+            if records:
+                yield records
+
     def create_shards(self):
         data_dir = self._kwargs["data_dir"]
         start_ind = 0
@@ -3,6 +3,7 @@ import collections
 import numpy as np
 import tensorflow as tf
 from tensorflow.python.framework import ops
+from tensorflow.python.framework.func_graph import FuncGraph
 from tensorflow.python.ops import array_ops, math_ops, sparse_ops
 
 EmbeddingAndIds = collections.namedtuple(
@@ -29,37 +30,45 @@ class EmbeddingDelegate(object):
         # different iterations.
         # `tf.Variable` requires initial value if shape has `None` dimension.
         self._embedding_and_ids_graph = []
+        # The number of BETs recorded in the function being traced. Each
+        # call of the embedding in a forward-pass records its own BET, so an
+        # embedding called more than once can be traced by tf.function.
+        self._graph = None
+        self._graph_call_num = 0
         self.tape = None
 
     def set_tape(self, tape):
         self.tape = tape
 
-    def _init_for_graph_mode_if_necessary(self):
-        if (
-            tf.executing_eagerly()
-            or self._embedding_and_ids_graph
-            or not self.tape
-        ):
-            return
-
-        self._embedding_and_ids_graph = [
-            EmbeddingAndIds(
-                batch_embedding=tf.Variable(
-                    # In some cases, `tf.Variable` requires that initial value
-                    # is callable.
-                    initial_value=lambda: tf.zeros((1, self.output_dim)),
-                    shape=tf.TensorShape((None, self.output_dim)),
-                    dtype=tf.float32,
-                    trainable=True,
-                ),
-                batch_ids=tf.Variable(
-                    initial_value=lambda: tf.zeros((1, 1), dtype=tf.int64),
-                    shape=tf.TensorShape(None),
-                    dtype=tf.int64,
-                    trainable=False,
-                ),
+    def _get_embedding_and_ids_for_graph_mode(self):
+        """Returns the BET and ids variables of the current call in the
+        function being traced, creating them on the first trace."""
+        graph = _get_outermost_func_graph()
+        if graph is not self._graph:
+            self._graph = graph
+            self._graph_call_num = 0
+        if self._graph_call_num == len(self._embedding_and_ids_graph):
+            self._embedding_and_ids_graph.append(
+                EmbeddingAndIds(
+                    batch_embedding=tf.Variable(
+                        # In some cases, `tf.Variable` requires that initial
+                        # value is callable.
+                        initial_value=lambda: tf.zeros((1, self.output_dim)),
+                        shape=tf.TensorShape((None, self.output_dim)),
+                        dtype=tf.float32,
+                        trainable=True,
+                    ),
+                    batch_ids=tf.Variable(
+                        initial_value=lambda: tf.zeros((1, 1), dtype=tf.int64),
+                        shape=tf.TensorShape(None),
+                        dtype=tf.int64,
+                        trainable=False,
+                    ),
+                )
             )
-        ]
+        embedding_and_ids = self._embedding_and_ids_graph[self._graph_call_num]
+        self._graph_call_num += 1
+        return embedding_and_ids
 
     def embedding_lookup(self, ids):
         """Looks up `ids` in a list of embedding tensors. The result of this
@@ -67,8 +76,6 @@ class EmbeddingDelegate(object):
         But, this function is implemented to support lookup embedding using
         ParameterServer distribution strategy.
         """
-        self._init_for_graph_mode_if_necessary()
-
         ids = tf.cast(ids, tf.int64)
         ids = tf.convert_to_tensor(ids, name=self.name + "_ids")
         flat_ids = tf.reshape(ids, [-1])
@@ -104,8 +111,6 @@ class EmbeddingDelegate(object):
         to support lookup embedding using ParameterServer distribution
         strategy.
         """
-        self._init_for_graph_mode_if_necessary()
-
         sparse_ids = _prune_invalid_ids(sparse_ids)
         # Fill in dummy values for empty features, if necessary.
         sparse_ids, is_row_empty = sparse_ops.sparse_fill_empty_rows(
@@ -233,6 +238,11 @@ class EmbeddingDelegate(object):
                 inp=[unique_ids],
                 Tout=tf.float32,
             )
+            # The output shape of `tf.py_function` is unknown. Set the static
+            # shape so that the ops consuming the BET can be shape-inferred.
+            batch_embedding.set_shape(
+                unique_ids.get_shape().concatenate(self.output_dim)
+            )
         return batch_embedding
 
     def _gather_embedding_vectors(self, unique_ids):
@@ -264,7 +274,7 @@ class EmbeddingDelegate(object):
             # In graph mode, assigning tensors to trainable variables is
             # allowed and tape can record the gradients of trainable
             # variables automatically.
-            embedding_and_ids = self._embedding_and_ids_graph[0]
+            embedding_and_ids = self._get_embedding_and_ids_for_graph_mode()
             embedding_and_ids.batch_embedding.assign(batch_embedding)
             embedding_and_ids.batch_ids.assign(ids)
             batch_embedding = embedding_and_ids.batch_embedding
@@ -288,6 +298,16 @@ class EmbeddingDelegate(object):
         return self._embedding_and_ids_graph
 
 
+def _get_outermost_func_graph():
+    """Returns the graph of the outermost function being traced. The calls
+    in the branches of `tf.cond` or the body of `tf.while_loop` are traced
+    in nested function graphs, but belong to the same forward-pass."""
+    graph = ops.get_default_graph()
+    while isinstance(getattr(graph, "outer_graph", None), FuncGraph):
+        graph = graph.outer_graph
+    return graph
+
+
 def _prune_invalid_ids(sparse_ids):
     """Prune invalid IDs (< 0) from the input ids."""
     is_id_valid = tf.greater_equal(sparse_ids.values, 0)
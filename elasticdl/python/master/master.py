@@ -381,6 +381,18 @@ class Master(object):
                 str(args.num_workers),
                 "--log_level",
                 str(args.log_level),
+                "--embedding_eviction_policy",
+                args.embedding_eviction_policy,
+                "--embedding_eviction_max_rows",
+                str(args.embedding_eviction_max_rows),
+                "--embedding_eviction_ttl",
+                str(args.embedding_eviction_ttl),
+                "--embedding_eviction_steps",
+                str(args.embedding_eviction_steps),
+                "--sparse_update_engine",
+                args.sparse_update_engine,
+                "--grad_check_pushes_per_worker",
+                str(args.grad_check_pushes_per_worker),
             ]
 
             env_dict = parse_envs(args.envs)
@@ -63,7 +63,10 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
         return res
 
     def report_task_result(self, request, _):
-        if request.err_message:
+        if request.returned:
+            logger.info("Worker returned task %d" % request.task_id)
+            self._task_d.report(request, False)
+        elif request.err_message:
             logger.warning("Worker reported error: " + request.err_message)
             self._task_d.report(request, False)
         else:
@@ -0,0 +1,73 @@
+import numpy as np
+
+from elasticdl.python.common.constants import EmbeddingEvictionPolicy
+
+
+class EmbeddingEvictor(object):
+    """Selects rows to evict from embedding tables.
+
+    The supported policies are:
+        * "lru": If a table has more than `max_rows` rows, the least
+          recently accessed rows are evicted until `max_rows` rows remain.
+        * "lfu": If a table has more than `max_rows` rows, the least
+          frequently accessed rows are evicted until `max_rows` rows remain.
+        * "ttl": Rows which are neither pulled nor updated in the latest
+          `ttl` model versions are evicted.
+    """
+
+    def __init__(self, policy, max_rows=0, ttl=0, steps=1):
+        """
+        Args:
+            policy: The eviction policy, "lru", "lfu" or "ttl".
+            max_rows: The maximum number of rows to keep in an embedding
+                table for "lru" and "lfu" policies.
+            ttl: The number of model versions for "ttl" policy.
+            steps: Evict embedding tables every this many model versions.
+        """
+        if policy in (
+            EmbeddingEvictionPolicy.LRU,
+            EmbeddingEvictionPolicy.LFU,
+        ):
+            if max_rows <= 0:
+                raise ValueError(
+                    "max_rows should be positive for %s eviction policy"
+                    % policy
+                )
+        elif policy == EmbeddingEvictionPolicy.TTL:
+            if ttl <= 0:
+                raise ValueError("ttl should be positive for ttl eviction")
+        else:
+            raise ValueError("Unknown eviction policy %s" % policy)
+        if steps <= 0:
+            raise ValueError("steps should be positive for eviction")
+        self.policy = policy
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.steps = steps
+
+    def need_to_evict(self, version):
+        return version % self.steps == 0
+
+    def select_ids(self, table, version):
+        """Select ids to evict from an `EmbeddingTable`.
+
+        Args:
+            table: An `EmbeddingTable` instance.
+            version: The current model version.
+
+        Returns:
+            A 1-D numpy.ndarray of ids to evict.
+        """
+        if self.policy == EmbeddingEvictionPolicy.TTL:
+            expired = table.access_versions < version - self.ttl
+            return table.ids[expired]
+
+        evict_num = len(table) - self.max_rows
+        if evict_num <= 0:
+            return np.empty(0, dtype=np.int64)
+        if self.policy == EmbeddingEvictionPolicy.LRU:
+            scores = table.access_clocks
+        else:
+            scores = table.access_counts
+        rows = np.argpartition(scores, evict_num - 1)[:evict_num]
+        return table.ids[rows]
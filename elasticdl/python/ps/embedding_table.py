@@ -2,20 +2,56 @@ import numpy as np
 import tensorflow as tf
 
 from elasticdl.proto.elasticdl_pb2 import EmbeddingTableInfo
+from elasticdl.python.common.lock_utils import RWLock, StripedRWLock
 from elasticdl.python.common.tensor import Tensor
+from elasticdl.python.ps.id_index import IdIndex
+
+# The number of lock stripes of rows in an embedding table.
+_NUM_LOCK_STRIPES = 64
+
+# The numpy.ndarray attributes of `EmbeddingTable` which hold one entry
+# for each row.
+_ROW_ARRAY_NAMES = (
+    "_ids",
+    "_vectors",
+    "_access_counts",
+    "_access_clocks",
+    "_access_versions",
+)
 
 
 class EmbeddingTable(object):
     """
     EmbeddingTable is used to store embedding parameters of an embedding
     layer. The name of an embedding table is actually the embedding layer
-    name. It uses a dictionary to store embedding vectors, the key is the
-    item id, the value is a 1-D numpy.ndarray.
+    name. Embedding vectors are stored as rows of a contiguous 2-D float32
+    numpy.ndarray, which grows on demand. An `IdIndex` maps item ids to
+    rows of this array, so lookups and updates are vectorized gathers and
+    scatters.
 
     Embedding vectors are lazily initialized in parameter server.
     EmbeddingTable also has dim and initializer fields. Inside the get
-    interface of EmbeddingTable, if the id is not in the embedding_vectors
-    dictionary, the corresponding value will be initialized.
+    interface of EmbeddingTable, if an id is not in the index, a new row
+    is allocated and initialized for it.
+
+    Optimizer slots of embedding vectors, e.g. "m" and "v" of Adam, can be
+    stored in the same rows after the embedding vectors. A row is laid out
+    as [embedding vector | slot 0 | slot 1 | ...], so that `get_with_slots`
+    and `set_with_slots` access an embedding vector and all its slots with
+    one gather or scatter.
+
+    For each row, EmbeddingTable also records how many times and how
+    recently it has been accessed, and the model version of its last
+    update. `EmbeddingEvictor` uses them to select rows to `remove`.
+
+    EmbeddingTable is thread-safe. A reader-writer lock guards the
+    structure of the table, i.e. the index and the storage arrays, which
+    changes when rows are created or removed. Rows are partitioned into
+    lock stripes by id, and a batch of rows is accessed stripe by stripe
+    with reader-writer locks of stripes. Thus concurrent gets never block
+    each other, and concurrent updates of ids in different stripes run in
+    parallel. Access statistics are updated without exclusive locks and
+    may miss concurrent accesses, which is fine for eviction.
     """
 
     def __init__(self, name, dim=None, initializer=None, is_slot=False):
@@ -41,41 +77,312 @@ class EmbeddingTable(object):
                 self.initializer_value
             )
         self.is_slot = is_slot
-        self.embedding_vectors = {}
+        self._batch_initializer = _get_batch_initializer(self.initializer)
+        self.slot_names = []
+        self._slot_initial_values = []
+        self._structure_lock = RWLock()
+        self._stripe_locks = StripedRWLock(_NUM_LOCK_STRIPES)
+        self.clear()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def ids(self):
+        """The ids in the table ordered by their rows."""
+        return self._ids[: self._size]
+
+    @property
+    def vectors(self):
+        """The embedding vectors in the table ordered by their rows."""
+        return self._vectors[: self._size, : self.dim]
+
+    @property
+    def row_dim(self):
+        """The dimension of a row with the embedding vector and slots."""
+        return self.dim * (1 + len(self.slot_names))
+
+    def create_slots(self, slot_names, initial_values):
+        """Add slots after the embedding vectors in rows.
+
+        Args:
+            slot_names: A list of slot names.
+            initial_values: A list of float values to initialize slots.
+        """
+        for slot_name in slot_names:
+            if slot_name in self.slot_names:
+                raise ValueError(
+                    "Slot %s already exists in embedding table %s"
+                    % (slot_name, self.name)
+                )
+        with self._structure_lock.write_lock():
+            row_dim = self.row_dim + self.dim * len(slot_names)
+            vectors = np.empty((len(self._vectors), row_dim), dtype=np.float32)
+            vectors[:, : self.row_dim] = self._vectors
+            self._vectors = vectors
+            for slot_name, value in zip(slot_names, initial_values):
+                self.slot_names.append(slot_name)
+                self._slot_initial_values.append(float(value))
+                begin, end = self._slot_columns(slot_name)
+                self._vectors[: self._size, begin:end] = value
+
+    def _slot_columns(self, slot_name):
+        if slot_name not in self.slot_names:
+            raise ValueError(
+                "Slot %s is not in embedding table %s" % (slot_name, self.name)
+            )
+        begin = self.dim * (1 + self.slot_names.index(slot_name))
+        return begin, begin + self.dim
+
+    @property
+    def access_counts(self):
+        """The number of `get` calls which have accessed each row."""
+        return self._access_counts[: self._size]
+
+    @property
+    def access_clocks(self):
+        """The value of the table access clock when each row was last
+        accessed by `get` or `set`. A larger value is more recent."""
+        return self._access_clocks[: self._size]
 
-    def get(self, indices):
+    @property
+    def access_versions(self):
+        """The model version when each row was last accessed by `get` or
+        updated by `set`."""
+        return self._access_versions[: self._size]
+
+    def get(self, indices, version=None):
+        """Get embedding vectors of `indices`.
+
+        Args:
+            indices: A list or 1-D numpy.ndarray of ids.
+            version: The model version of the access. If it is not None,
+                it is recorded as the access version of the rows.
+        """
+        return self._get_columns(indices, version, 0, self.dim)
+
+    def get_slot(self, slot_name, indices, version=None):
+        begin, end = self._slot_columns(slot_name)
+        return self._get_columns(indices, version, begin, end)
+
+    def get_with_slots(self, indices):
+        """Get rows of `indices`, in which each embedding vector is followed
+        by its slots in the order of `slot_names`."""
+        return self._get_columns(indices, None, 0, self.row_dim)
+
+    def _get_columns(self, indices, version, begin, end):
         if len(indices) == 0:
             return None
-        values = []
-        for i in indices:
-            value = self.embedding_vectors.get(i, None)
-            if value is None:
-                value = self.initializer(shape=(self.dim,)).numpy()
-                self.embedding_vectors[i] = value
-            values.append(value)
-        return np.stack(values)
-
-    def set(self, indices, values):
-        # TODO(qijun) need to add a RWLock in Sync-SGD
-        for index, i in enumerate(indices):
-            embedding_vector = values[index]
-            self.embedding_vectors[i] = embedding_vector
+        if version is not None:
+            self._version = version
+        ids = np.asarray(indices, dtype=np.int64)
+        values = np.empty((len(ids), end - begin), dtype=np.float32)
+        self._clock += 1
+        clock = self._clock
+
+        def _read(rows, positions):
+            values[positions] = self._vectors[rows, begin:end]
+            self._access_clocks[rows] = clock
+            self._access_versions[rows] = self._version
+            np.add.at(self._access_counts, rows, 1)
+
+        self._access_rows(ids, False, True, _read)
+        return values
+
+    def set(self, indices, values, version=None):
+        """Set embedding vectors of `indices` to `values`.
+
+        Args:
+            indices: A list or 1-D numpy.ndarray of ids.
+            values: A 2-D numpy.ndarray of embedding vectors.
+            version: The model version of the update. If it is not None,
+                it is recorded as the access version of the rows.
+        """
+        self._set_columns(indices, values, version, 0, self.dim)
+
+    def set_slot(self, slot_name, indices, values, version=None):
+        begin, end = self._slot_columns(slot_name)
+        self._set_columns(indices, values, version, begin, end)
+
+    def set_with_slots(self, indices, values, version=None):
+        """Set rows of `indices` to `values`, in which each embedding vector
+        is followed by its slots in the order of `slot_names`."""
+        self._set_columns(indices, values, version, 0, self.row_dim)
+
+    def _set_columns(self, indices, values, version, begin, end):
+        if len(indices) == 0:
+            return
+        if version is not None:
+            self._version = version
+        ids = np.asarray(indices, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        self._clock += 1
+        clock = self._clock
+
+        def _write(rows, positions):
+            self._vectors[rows, begin:end] = values[positions]
+            self._access_clocks[rows] = clock
+            self._access_versions[rows] = self._version
+
+        # The embedding vectors of new rows are not initialized if they
+        # are overwritten here.
+        self._access_rows(ids, True, begin > 0, _write)
+
+    def update_with_slots(self, indices, update_fn, version=None):
+        """Update rows of `indices` in place by `update_fn`.
+
+        The rows in a lock stripe are read, updated and written back with
+        the stripe locked exclusively, so that concurrent updates of the
+        same ids are not lost.
+
+        Args:
+            indices: A 1-D numpy.ndarray of unique ids.
+            update_fn: A function `update_fn(values, positions)` which
+                updates `values` in place. `values` is a 2-D numpy.ndarray
+                of the rows of `indices[positions]`, in which each
+                embedding vector is followed by its slots.
+            version: The model version of the update.
+        """
+        if len(indices) == 0:
+            return
+        if version is not None:
+            self._version = version
+        ids = np.asarray(indices, dtype=np.int64)
+        self._clock += 1
+        clock = self._clock
+
+        def _update(rows, positions):
+            values = self._vectors[rows]
+            update_fn(values, positions)
+            self._vectors[rows] = values
+            self._access_clocks[rows] = clock
+            self._access_versions[rows] = self._version
+
+        self._access_rows(ids, True, True, _update)
+
+    def _access_rows(self, ids, exclusive, init_vectors, access_fn):
+        """Calls `access_fn(rows, positions)` to access the rows of
+        `ids[positions]` with locks held.
+
+        If all ids are in the table, the rows are accessed stripe by
+        stripe, with the structure lock held shared and the lock of each
+        stripe held exclusively if `exclusive` is True, otherwise shared.
+        Otherwise, rows are created for unseen ids and all rows are
+        accessed at once with the structure lock held exclusively.
+        """
+        with self._structure_lock.read_lock():
+            rows = self._index.lookup(ids)
+            if (rows >= 0).all():
+                for stripe, positions in self._stripe_locks.group_by_stripe(
+                    ids
+                ):
+                    with self._stripe_locks.lock(stripe, exclusive):
+                        access_fn(rows[positions], positions)
+                return
+        with self._structure_lock.write_lock():
+            rows = self._get_or_create_rows(ids, init_vectors)
+            access_fn(rows, slice(None))
+
+    def remove(self, indices):
+        """Remove the rows of `indices` from the table.
+
+        The remaining rows are compacted into new arrays which fit them
+        exactly, so that the memory of removed rows is released. Ids which
+        are not in the table are ignored.
+
+        Returns:
+            The number of removed rows.
+        """
+        with self._structure_lock.write_lock():
+            rows = self._index.lookup(np.asarray(indices, dtype=np.int64))
+            rows = rows[rows >= 0]
+            if rows.size == 0:
+                return 0
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            for name in _ROW_ARRAY_NAMES:
+                setattr(self, name, getattr(self, name)[: self._size][keep])
+            self._size = len(self._ids)
+            self._index.reset(self._ids)
+            removed = len(keep) - self._size
+            self.evicted_count += removed
+            return removed
+
+    def _get_or_create_rows(self, ids, init_vectors):
+        """Returns the rows of `ids` and allocates rows for unseen ids.
+
+        The slots of new rows are filled by their initial values. The
+        embedding vectors of new rows are filled by the initializer if
+        `init_vectors` is True, otherwise they are left for the caller to
+        overwrite. The caller must hold the structure lock exclusively.
+        """
+        rows = self._index.lookup(ids)
+        missing = rows < 0
+        if missing.any():
+            new_ids, first, inverse = np.unique(
+                ids[missing], return_index=True, return_inverse=True
+            )
+            # Allocate rows in the order ids first appear in `ids`.
+            order = np.argsort(first)
+            new_rows = np.empty(len(new_ids), dtype=np.int64)
+            new_rows[order] = self._allocate_rows(new_ids[order])
+            if init_vectors:
+                self._vectors[new_rows, : self.dim] = self._batch_initializer(
+                    shape=(len(new_ids), self.dim)
+                ).numpy()
+            for slot_name, value in zip(
+                self.slot_names, self._slot_initial_values
+            ):
+                begin, end = self._slot_columns(slot_name)
+                self._vectors[new_rows, begin:end] = value
+            rows[missing] = new_rows[inverse]
+        return rows
+
+    def _allocate_rows(self, new_ids):
+        start = self._size
+        end = start + len(new_ids)
+        if end > len(self._ids):
+            self._grow(end)
+        self._ids[start:end] = new_ids
+        self._access_counts[start:end] = 0
+        self._access_clocks[start:end] = self._clock
+        self._access_versions[start:end] = self._version
+        new_rows = np.arange(start, end, dtype=np.int64)
+        self._index.insert(new_ids, new_rows)
+        self._size = end
+        return new_rows
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * len(self._ids))
+        for name in _ROW_ARRAY_NAMES:
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], array.dtype)
+            grown[: self._size] = array[: self._size]
+            setattr(self, name, grown)
 
     def clear(self):
-        self.embedding_vectors.clear()
+        with self._structure_lock.write_lock():
+            self._index = IdIndex()
+            self._ids = np.empty(0, dtype=np.int64)
+            self._vectors = np.empty(
+                (0, (self.dim or 0) * (1 + len(self.slot_names))),
+                dtype=np.float32,
+            )
+            self._access_counts = np.empty(0, dtype=np.int64)
+            self._access_clocks = np.empty(0, dtype=np.int64)
+            self._access_versions = np.empty(0, dtype=np.int32)
+            self._size = 0
+            self._clock = 0
+            self._version = 0
+            self.evicted_count = 0
 
     def to_tensor(self):
-        """Convert the embedding table to elasticDL Tensor"""
-        indices = []
-        embedding_vectors = []
-        for id, embedding_vector in self.embedding_vectors.items():
-            indices.append(id)
-            embedding_vectors.append(embedding_vector)
-        return Tensor(
-            values=np.array(embedding_vectors),
-            indices=np.array(indices),
-            name=self.name,
-        )
+        """Convert the embedding table to elasticDL Tensor.
+
+        Note that the values and indices of the returned tensor are views
+        of the table storage.
+        """
+        return Tensor(values=self.vectors, indices=self.ids, name=self.name)
 
     def to_embedding_table_info_pb(self):
         """Convert the embedding table information to a protobuf"""
@@ -86,25 +393,49 @@ class EmbeddingTable(object):
         return embedding_pb
 
     def get_table_size(self):
-        """Get the element count of an embedding table"""
-        if len(self.embedding_vectors) > 0:
-            element_size = list(self.embedding_vectors.values())[0].itemsize
-            size = self.dim * len(self.embedding_vectors) * element_size
-            return size
-        return 0
+        """Get the size in bytes of the embedding vectors of the table,
+        excluding their slots."""
+        return self._size * (self.dim or 0) * self._vectors.itemsize
+
+    def get_slots_size(self):
+        """Get the size in bytes of the slots of the table."""
+        return self._vectors[: self._size].nbytes - self.get_table_size()
 
     def debug_info(self):
         return (
             "Embedding param name: %s\n  shape: [%d, %d]\n  size: %d bytes\n"
+            "  slots: %s\n  slots size: %d bytes\n  evicted rows: %d\n"
             % (
                 self.name,
-                len(self.embedding_vectors),
+                self._size,
                 self.dim,
                 self.get_table_size(),
+                ", ".join(self.slot_names),
+                self.get_slots_size(),
+                self.evicted_count,
             )
         )
 
 
+def _get_batch_initializer(initializer):
+    """Get an initializer which initializes a batch of embedding vectors
+    of shape (n, dim) with the same distribution as `initializer` draws
+    each vector of shape (dim,).
+
+    Variance scaling initializers compute the variance from the fans of
+    the shape. Both fans of shape (dim,) are dim, which equals the fan-out
+    of shape (n, dim), so the batch initializer always uses "fan_out".
+    """
+    if isinstance(initializer, tf.keras.initializers.VarianceScaling):
+        return tf.keras.initializers.VarianceScaling(
+            scale=initializer.scale,
+            mode="fan_out",
+            distribution=initializer.distribution,
+            seed=initializer.seed,
+        )
+    return initializer
+
+
 # TODO(bug): create_embedding_table does not create EmbeddingTable correctly
 #     if it is a slot table.
 def create_embedding_table(embedding_table_info_pb):
@@ -0,0 +1,193 @@
+import threading
+from contextlib import ExitStack
+
+import numpy as np
+
+from elasticdl.python.common.tensor import Tensor
+from elasticdl.python.ps.id_index import IdIndex
+
+
+def _shape_mismatch_error(name, values, accumulated_values):
+    return ValueError(
+        "Gradient %s of shape %s can not be added to the accumulated "
+        "gradients of shape %s"
+        % (name, values.shape, accumulated_values.shape)
+    )
+
+
+class DenseGradientAccumulator(object):
+    """Sums dense gradients of a parameter in place.
+
+    The buffer is allocated by the first gradient and reused after `reset`,
+    so accumulating a gradient neither allocates memory nor depends on the
+    number of gradients accumulated before. `add` is thread-safe.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._values = None
+        self.count = 0
+
+    def add(self, grad):
+        """Adds an ElasticDL `Tensor` of a dense gradient."""
+        add_gradients([self], [grad])
+
+    def _prepare(self, grad):
+        if grad.is_indexed_slices():
+            raise NotImplementedError(
+                "Only Tensor with the same type could be added"
+            )
+        return grad.values
+
+    def _check(self, values):
+        if self.count and self._values.shape != values.shape:
+            raise _shape_mismatch_error(self.name, values, self._values)
+
+    def _add(self, values):
+        if self.count == 0:
+            if self._values is None or self._values.shape != values.shape:
+                self._values = np.array(values)
+            else:
+                np.copyto(self._values, values)
+        else:
+            np.add(self._values, values, out=self._values)
+        self.count += 1
+
+    def get(self):
+        """Returns an ElasticDL `Tensor` of the sum of the gradients.
+
+        Note that the values of the returned tensor are a view of the
+        buffer, which is overwritten after `reset`.
+        """
+        return Tensor(self._values, name=self.name)
+
+    def reset(self):
+        self.count = 0
+
+
+class SparseGradientAccumulator(object):
+    """Sums `tf.IndexedSlices` gradients of a parameter by ids.
+
+    Each distinct id has one row in a growing buffer, and an `IdIndex` maps
+    ids to their rows. The values of duplicated ids are summed into the
+    same row, so the buffer holds the distinct ids instead of the
+    concatenation of all gradients. The buffer and the index keep their
+    capacity after `reset`. `add` is thread-safe.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._index = IdIndex()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._values = None
+        self._size = 0
+        self.count = 0
+
+    def add(self, grad):
+        """Adds an ElasticDL `Tensor` of a `tf.IndexedSlices` gradient."""
+        add_gradients([self], [grad])
+
+    def _prepare(self, grad):
+        if not grad.is_indexed_slices():
+            raise NotImplementedError(
+                "Only Tensor with the same type could be added"
+            )
+        ids = np.asarray(grad.indices, dtype=np.int64)
+        values = grad.values
+        # Merge duplicated ids of the gradient before taking the lock, so
+        # that the values are ordered by `unique_ids`.
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        merged = np.zeros((len(unique_ids),) + values.shape[1:], values.dtype)
+        if len(unique_ids) < len(ids):
+            np.add.at(merged, inverse, values)
+        else:
+            merged[inverse] = values
+        return unique_ids, merged
+
+    def _check(self, merged_grad):
+        _, merged = merged_grad
+        if self.count and self._values.shape[1:] != merged.shape[1:]:
+            raise _shape_mismatch_error(self.name, merged, self._values)
+
+    def _add(self, merged_grad):
+        unique_ids, merged = merged_grad
+        if self._values is None or self._values.shape[1:] != merged.shape[1:]:
+            self._values = np.empty((0,) + merged.shape[1:], merged.dtype)
+            self._index.clear()
+            self._size = 0
+        rows = self._index.lookup(unique_ids)
+        new = rows < 0
+        if new.any():
+            rows[new] = self._allocate_rows(unique_ids[new])
+        self._values[rows] += merged
+        self.count += 1
+
+    def _allocate_rows(self, new_ids):
+        start = self._size
+        end = start + len(new_ids)
+        if end > len(self._ids):
+            capacity = max(end, 2 * len(self._ids))
+            ids = np.empty(capacity, dtype=np.int64)
+            ids[:start] = self._ids[:start]
+            self._ids = ids
+            values = np.empty(
+                (capacity,) + self._values.shape[1:], self._values.dtype
+            )
+            values[:start] = self._values[:start]
+            self._values = values
+        self._ids[start:end] = new_ids
+        self._values[start:end] = 0
+        new_rows = np.arange(start, end, dtype=np.int64)
+        self._index.insert(new_ids, new_rows)
+        self._size = end
+        return new_rows
+
+    def get(self):
+        """Returns an ElasticDL `Tensor` of the sum of the gradients, which
+        has no duplicated indices.
+
+        Note that the values and indices of the returned tensor are views
+        of the buffer, which is overwritten after `reset`.
+        """
+        return Tensor(
+            self._values[: self._size], self._ids[: self._size], self.name
+        )
+
+    def reset(self):
+        self._index.clear()
+        self._size = 0
+        self.count = 0
+
+
+def create_gradient_accumulator(grad):
+    """Creates an accumulator for gradients of the same type as the
+    ElasticDL `Tensor` `grad`."""
+    if grad.is_indexed_slices():
+        return SparseGradientAccumulator(grad.name)
+    return DenseGradientAccumulator(grad.name)
+
+
+def add_gradients(accumulators, grads):
+    """Adds each ElasticDL `Tensor` of `grads` to the accumulator at the
+    same position of `accumulators`.
+
+    The gradients are added atomically. All the accumulators are locked,
+    in the order of their names to avoid deadlocks, and the gradients are
+    added only if all of them can be added. So a push which fails leaves
+    no partial sums, even if a concurrent push changes the accumulators
+    after the gradients are validated.
+    """
+    prepared = [
+        accumulator._prepare(grad)
+        for accumulator, grad in zip(accumulators, grads)
+    ]
+    unique_accumulators = {id(a): a for a in accumulators}.values()
+    with ExitStack() as stack:
+        for accumulator in sorted(unique_accumulators, key=lambda a: a.name):
+            stack.enter_context(accumulator._lock)
+        for accumulator, values in zip(accumulators, prepared):
+            accumulator._check(values)
+        for accumulator, values in zip(accumulators, prepared):
+            accumulator._add(values)
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Multiplier for Fibonacci hashing, i.e. 2^64 / golden ratio.
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_EMPTY_KEY = np.iinfo(np.int64).min
+_MIN_CAPACITY = 1024
+
+
+class IdIndex(object):
+    """A hash index from int64 ids to int64 row numbers.
+
+    `IdIndex` is an open addressing hash table with linear probing. Keys and
+    values live in two flat numpy arrays, so that the index costs 16 bytes
+    per slot instead of a Python object per entry. All operations accept
+    a batch of ids and probe the table in a vectorized way. The load factor
+    is kept under 0.5, which keeps the number of probing rounds small.
+
+    The minimum int64 value is reserved to mark empty slots and can not be
+    used as an id.
+    """
+
+    def __init__(self, capacity=_MIN_CAPACITY):
+        self._allocate(capacity)
+
+    def __len__(self):
+        return self._size
+
+    def _allocate(self, capacity):
+        capacity = max(_MIN_CAPACITY, 1 << (int(capacity) - 1).bit_length())
+        self._keys = np.full(capacity, _EMPTY_KEY, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.int64)
+        self._mask = capacity - 1
+        self._shift = np.uint64(64 - capacity.bit_length() + 1)
+        self._size = 0
+
+    def _hash(self, ids):
+        slots = (ids.view(np.uint64) * _HASH_MULTIPLIER) >> self._shift
+        return slots.astype(np.int64)
+
+    def lookup(self, ids):
+        """Looks up the rows of `ids`.
+
+        Args:
+            ids: A 1-D int64 numpy.ndarray.
+
+        Returns:
+            A 1-D int64 numpy.ndarray with the same length as `ids`. The
+            row of an id which is not in the index is -1.
+        """
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if self._size == 0 or len(ids) == 0:
+            return rows
+        pending = np.arange(len(ids))
+        slots = self._hash(ids)
+        while pending.size:
+            keys = self._keys[slots]
+            found = keys == ids[pending]
+            rows[pending[found]] = self._values[slots[found]]
+            probing = ~found & (keys != _EMPTY_KEY)
+            pending = pending[probing]
+            slots = (slots[probing] + 1) & self._mask
+        return rows
+
+    def insert(self, ids, rows):
+        """Inserts `ids` with their `rows` into the index.
+
+        Args:
+            ids: A 1-D int64 numpy.ndarray. Ids must be unique and must not
+                be in the index yet.
+            rows: A 1-D int64 numpy.ndarray with the same length as `ids`.
+        """
+        if len(ids) == 0:
+            return
+        if 2 * (self._size + len(ids)) > len(self._keys):
+            self._rehash(2 * (self._size + len(ids)))
+        pending = np.arange(len(ids))
+        slots = self._hash(ids)
+        while pending.size:
+            free = np.flatnonzero(self._keys[slots] == _EMPTY_KEY)
+            # Several pending ids may probe the same free slot in one
+            # round. Only the first of them takes the slot.
+            _, first = np.unique(slots[free], return_index=True)
+            placed = free[first]
+            self._keys[slots[placed]] = ids[pending[placed]]
+            self._values[slots[placed]] = rows[pending[placed]]
+            probing = np.ones(len(pending), dtype=bool)
+            probing[placed] = False
+            pending = pending[probing]
+            slots = (slots[probing] + 1) & self._mask
+        self._size += len(ids)
+
+    def items(self):
+        """Returns a tuple of (ids, rows) of all entries in the index."""
+        occupied = self._keys != _EMPTY_KEY
+        return self._keys[occupied], self._values[occupied]
+
+    def _rehash(self, capacity):
+        ids, rows = self.items()
+        self._allocate(capacity)
+        self.insert(ids, rows)
+
+    def clear(self):
+        """Removes all entries and keeps the capacity of the index."""
+        self._keys.fill(_EMPTY_KEY)
+        self._size = 0
+
+    def reset(self, ids=None):
+        """Clears the index and maps `ids[i]` to row `i` if `ids` is set."""
+        if ids is None:
+            ids = np.empty(0, dtype=np.int64)
+        self._allocate(2 * len(ids))
+        self.insert(ids, np.arange(len(ids), dtype=np.int64))
@@ -2,6 +2,7 @@
 
 import threading
 
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras.optimizers import (
     SGD,
@@ -14,8 +15,12 @@ from tensorflow.keras.optimizers import (
     RMSprop,
 )
 
+from elasticdl.python.common.constants import SparseUpdateEngine
 from elasticdl.python.common.log_utils import default_logger as logger
-from elasticdl.python.ps.embedding_table import get_slot_table_name
+from elasticdl.python.ps.sparse_optimizer import (
+    SparseOptimizer,
+    merge_duplicate_ids,
+)
 
 
 def _get_embedding_layer_name_from_var(var):
@@ -60,7 +65,18 @@ class OptimizerWrapper(object):
     does nothing but calls `apply_gradients` function of TensorFlow optimizer.
     Otherwise, `OptimizerWrapper` looks up embedding vectors and slot values
     from external kv store before updating variables, and updates embedding
-    vectors and slot values in kv store after updating variables.
+    vectors and slot values in kv store after updating variables. Embedding
+    vectors and slot values of a layer are looked up and updated together
+    in rows laid out as [embedding vector | slot 0 | slot 1 | ...], where
+    slots are in the order of `allowed_slot_names`.
+
+    If `sparse_update_engine` is "numpy", embedding vectors and slot values
+    are updated by `SparseOptimizer` with NumPy instead of TensorFlow
+    variables, and only non-embedding variables are updated by the
+    TensorFlow optimizer. If `update_embedding_inplace_func` is also set,
+    `OptimizerWrapper` relies on it to update embedding rows atomically and
+    applies gradients concurrently, while it serializes updates of
+    embedding tables with a lock otherwise.
     """
 
     def __init__(
@@ -69,6 +85,8 @@ class OptimizerWrapper(object):
         use_async=False,
         lookup_embedding_func=None,
         update_embedding_func=None,
+        sparse_update_engine=SparseUpdateEngine.TENSORFLOW,
+        update_embedding_inplace_func=None,
     ):
         """
         Arguments:
@@ -82,15 +100,25 @@ class OptimizerWrapper(object):
                 using asynchronous updates, `OptimizerWrapper` is thread-safe
                 for non-embedding variables and is not thread-safe for
                 embedding table.
-            lookup_embedding_func: The function to lookup embeddings. The
-                argument of this function is a list of keys.
-            update_embedding_func: The function to update embeddings. The
-                arguments of this function is a key list and a value list.
+            lookup_embedding_func: The function to lookup embeddings with
+                their slots. The arguments of this function are a layer
+                name and a list of keys.
+            update_embedding_func: The function to update embeddings with
+                their slots. The arguments of this function are a layer
+                name, a key list and a 2-D value array.
+            sparse_update_engine: The engine to update embedding vectors,
+                "tensorflow" or "numpy".
+            update_embedding_inplace_func: The function to update
+                embeddings with their slots in place. The arguments of this
+                function are a layer name, a key list and a function which
+                updates a 2-D value array of a subset of keys in place. It
+                is only used by "numpy" sparse update engine.
         """
         self._opt = opt
         self._use_async = use_async
         self._lookup_embedding_func = lookup_embedding_func
         self._update_embedding_func = update_embedding_func
+        self._update_embedding_inplace_func = update_embedding_inplace_func
         self._slot_initial_value = {}
 
         self._update_gradient_lock = threading.Lock()
@@ -134,6 +162,23 @@ class OptimizerWrapper(object):
         for slot in self._allowed_slot_names:
             self._slot_initial_value.setdefault(slot, 0.0)
 
+        if sparse_update_engine == SparseUpdateEngine.NUMPY:
+            self._sparse_optimizer = SparseOptimizer(
+                opt, self._allowed_slot_names
+            )
+        elif sparse_update_engine == SparseUpdateEngine.TENSORFLOW:
+            self._sparse_optimizer = None
+        else:
+            raise ValueError(
+                "Unknown sparse update engine %s" % sparse_update_engine
+            )
+        # The TensorFlow optimizer is not thread-safe when slots of
+        # embedding variables are injected into it.
+        self._concurrent_embedding_update = (
+            self._sparse_optimizer is not None
+            and update_embedding_inplace_func is not None
+        )
+
     def _init_thread_local(self):
         self._tls._unique_ids_all_layers = {}
         self._tls._embed_variables = {}
@@ -151,7 +196,7 @@ class OptimizerWrapper(object):
         if not hasattr(self._tls, "_embed_variables"):
             self._init_thread_local()
 
-        if self._has_embedding:
+        if self._has_embedding and not self._concurrent_embedding_update:
             with self._update_gradient_lock:
                 self._update_parameters_by_gradients(grads_and_vars)
         else:
@@ -159,6 +204,10 @@ class OptimizerWrapper(object):
 
     def _update_parameters_by_gradients(self, grads_and_vars):
         """Update parameters by gradients received by GRPC"""
+        if self._sparse_optimizer is not None:
+            self._update_parameters_by_sparse_optimizer(grads_and_vars)
+            return
+
         grads_and_vars_new = []
         for grad, var in grads_and_vars:
             # If var is a string, create the grad var pair for
@@ -174,6 +223,44 @@ class OptimizerWrapper(object):
         self._update_embedding_param()
         self._delete_slots_and_weights_in_optimizer()
 
+    def _update_parameters_by_sparse_optimizer(self, grads_and_vars):
+        """Update embedding parameters by `SparseOptimizer` and other
+        parameters by TensorFlow optimizer."""
+        embedding_grads = []
+        dense_grads_and_vars = []
+        for grad, var in grads_and_vars:
+            if isinstance(var, str):
+                embedding_grads.append((var, grad))
+                self._has_embedding = True
+            else:
+                dense_grads_and_vars.append((grad, var))
+
+        if embedding_grads:
+            # Read hyperparameters before `apply_gradients` increases
+            # the step count of the optimizer.
+            coefficients = self._sparse_optimizer.get_coefficients()
+        if dense_grads_and_vars:
+            self._opt.apply_gradients(dense_grads_and_vars)
+        elif embedding_grads:
+            self._opt.iterations.assign_add(1)
+
+        for layer_name, grad in embedding_grads:
+            ids, grad_values = merge_duplicate_ids(
+                grad.indices.numpy(), grad.values.numpy()
+            )
+
+            def _apply(values, positions):
+                self._sparse_optimizer.apply_gradients(
+                    values, grad_values[positions], coefficients
+                )
+
+            if self._update_embedding_inplace_func is not None:
+                self._update_embedding_inplace_func(layer_name, ids, _apply)
+            else:
+                values = self._lookup_embedding_func(layer_name, ids)
+                _apply(values, slice(None))
+                self._update_embedding_func(layer_name, ids, values)
+
     def _get_embedding_var_and_grad(self, grad, layer_name):
         unique_ids, indices = tf.unique(grad.indices)
         unique_ids = unique_ids.numpy()
@@ -185,9 +272,12 @@ class OptimizerWrapper(object):
         self._tls._unique_ids_all_layers[layer_name] = unique_ids
         new_grad = tf.IndexedSlices(values=grad.values, indices=indices)
 
-        embed_value = self._lookup_embedding_func(layer_name, unique_ids)
+        values = self._lookup_embedding_func(layer_name, unique_ids)
+        embed_value, *slot_values = np.split(
+            values, 1 + len(self._allowed_slot_names), axis=1
+        )
         embed_var = self._create_embedding_variable(layer_name, embed_value)
-        self._get_slot_and_set_to_optimizer(layer_name)
+        self._set_slots_to_optimizer(layer_name, slot_values)
         return new_grad, embed_var
 
     def _create_embedding_variable(self, name, initial_value):
@@ -210,12 +300,17 @@ class OptimizerWrapper(object):
             embed_var.assign(initial_value)
         return embed_var
 
-    def _get_slot_and_set_to_optimizer(self, layer_name):
-        """Looks up slot value and set it to TensorFlow optimizer."""
-        for slot_name in self._allowed_slot_names:
-            param_name = get_slot_table_name(layer_name, slot_name)
-            indices = self._tls._unique_ids_all_layers[layer_name]
-            slot_value = self._lookup_embedding_func(param_name, indices)
+    def _set_slots_to_optimizer(self, layer_name, slot_values):
+        """Sets slot values to TensorFlow optimizer.
+
+        Args:
+            layer_name: The name of an ElasticDL embedding layer.
+            slot_values: A list of slot values in the order of
+                `allowed_slot_names`.
+        """
+        for slot_name, slot_value in zip(
+            self._allowed_slot_names, slot_values
+        ):
             # self._create_slot_variable creates a slot variable in tf
             # optimizer and set slot_value to it.
             self._create_slot_variable(layer_name, slot_name, slot_value)
@@ -295,13 +390,12 @@ class OptimizerWrapper(object):
     def _update_embedding_param(self):
         """Report updated embedding vectors and slots to kv store."""
         for layer, ids in self._tls._unique_ids_all_layers.items():
-            value = self._get_embedding_variable(layer).numpy()
-            self._update_embedding_func(layer, ids, value)
-
+            values = [self._get_embedding_variable(layer).numpy()]
             for slot in self._allowed_slot_names:
-                value = self._get_slot_variable(layer, slot).numpy()
-                slot_table_name = get_slot_table_name(layer, slot)
-                self._update_embedding_func(slot_table_name, ids, value)
+                values.append(self._get_slot_variable(layer, slot).numpy())
+            self._update_embedding_func(
+                layer, ids, np.concatenate(values, axis=1)
+            )
 
     def _delete_slots_and_weights_in_optimizer(self):
         """Clear the slots and weights in the optimizer according
@@ -15,6 +15,7 @@ from elasticdl.python.common.model_utils import (
     load_module,
 )
 from elasticdl.python.common.save_utils import CheckpointSaver
+from elasticdl.python.ps.embedding_evictor import EmbeddingEvictor
 from elasticdl.python.ps.parameters import Parameters
 from elasticdl.python.ps.servicer import PserverServicer
 
@@ -26,6 +27,8 @@ class ParameterServer(object):
         self.lr_staleness_modulation = args.lr_staleness_modulation
         self.sync_version_tolerance = args.sync_version_tolerance
         self.use_async = args.use_async
+        self.sparse_update_engine = args.sparse_update_engine
+        self.grad_check_pushes_per_worker = args.grad_check_pushes_per_worker
         self.port = args.port
         model_module = load_module(
             get_module_file_path(args.model_zoo, args.model_def)
@@ -46,6 +49,7 @@ class ParameterServer(object):
         self.namespace = args.namespace
         self._init_checkpoint_saver(args)
         self._restore_params_from_checkpoint(args.checkpoint_dir_for_init)
+        self._init_embedding_evictor(args)
         self._debug_info_needed = args.log_level.upper() == "DEBUG"
 
     def _set_lr_scheduler(self, model_module, learning_rate_scheduler_arg):
@@ -75,6 +79,19 @@ class ParameterServer(object):
             % self.parameters.version
         )
 
+    def _init_embedding_evictor(self, args):
+        if args.embedding_eviction_policy:
+            self.parameters.embedding_evictor = EmbeddingEvictor(
+                args.embedding_eviction_policy,
+                max_rows=args.embedding_eviction_max_rows,
+                ttl=args.embedding_eviction_ttl,
+                steps=args.embedding_eviction_steps,
+            )
+            self.logger.info(
+                "Embedding eviction policy is %s"
+                % args.embedding_eviction_policy
+            )
+
     def _init_checkpoint_saver(self, args):
         if all([args.checkpoint_dir, args.checkpoint_steps]):
             self.checkpoint_saver = CheckpointSaver(
@@ -115,6 +132,8 @@ class ParameterServer(object):
             checkpoint_saver=self.checkpoint_saver,
             ps_id=self.ps_id,
             num_ps_pods=self.num_ps_pods,
+            sparse_update_engine=self.sparse_update_engine,
+            grad_check_pushes_per_worker=self.grad_check_pushes_per_worker,
         )
         elasticdl_pb2_grpc.add_PserverServicer_to_server(
             pserver_servicer, server
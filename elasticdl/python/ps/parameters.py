@@ -3,13 +3,10 @@ import tensorflow as tf
 from elasticdl.proto import elasticdl_pb2
 from elasticdl.python.common.tensor import (
     Tensor,
-    deserialize_tensor_pb,
     emplace_tensor_pb_from_ndarray,
     serialize_tensor,
-    tensor_pb_to_ndarray,
 )
 from elasticdl.python.ps.embedding_table import (
-    EmbeddingTable,
     create_embedding_table,
     get_slot_table_name,
 )
@@ -26,47 +23,159 @@ class Parameters(object):
        hashmap `embedding_params`, the key is the embedding layer name,
        the value is an `EmbeddingTable` object.
 
+    Optimizer slots of embedding parameters are stored in the rows of the
+    `EmbeddingTable` of the embedding layer. They can be accessed by the
+    slot table name from `get_slot_table_name`, or together with the
+    embedding vectors by `get_embedding_param_with_slots`.
+
+    If `embedding_evictor` is set, rows of embedding parameters are evicted
+    by `evict_embedding_params`.
+
+    The version in which each non-embedding parameter was last modified is
+    saved in `non_embedding_param_versions`, so that only the parameters
+    modified after the model version of a worker are sent to the worker.
     """
 
     def __init__(self):
         self.version = 0
         self.init_status = False
         self.non_embedding_params = {}
+        self.non_embedding_param_versions = {}
+        # A dict of {name: (variable, shape tuple)} of non-embedding params
+        self._non_embedding_param_shapes = {}
         self.embedding_params = {}
+        self.embedding_evictor = None
+        self._slot_names = []
+        self._slot_initial_values = {}
+        self._slot_tables = {}
 
     def reset(self):
         self.version = 0
         self.init_status = False
         self.non_embedding_params.clear()
+        self.non_embedding_param_versions.clear()
+        self._non_embedding_param_shapes.clear()
         self.embedding_params.clear()
+        self._slot_names = []
+        self._slot_initial_values = {}
+        self._slot_tables.clear()
 
     def get_non_embedding_param(self, name, default_value=None):
         return self.non_embedding_params.get(name, default_value)
 
+    def set_non_embedding_params_modified(self, names, version):
+        """Records that non-embedding params `names` are modified in
+        model version `version`."""
+        for name in names:
+            self.non_embedding_param_versions[name] = version
+
+    def get_non_embedding_param_version(self, name):
+        """Returns the model version in which non-embedding param `name`
+        was last modified. A param of unknown modification is treated as
+        modified in the current version."""
+        return self.non_embedding_param_versions.get(name, self.version)
+
+    def _get_embedding_table(self, name):
+        """Returns a tuple of the `EmbeddingTable` of an embedding param or
+        a slot table, and the slot name which is None for embedding params.
+        """
+        if name in self.embedding_params:
+            return self.embedding_params[name], None
+        if name in self._slot_tables:
+            layer_name, slot_name = self._slot_tables[name]
+            return self.embedding_params[layer_name], slot_name
+        raise ValueError("Please initialize embedding param %s first!" % name)
+
     def get_embedding_param(self, name, indices):
+        table, slot_name = self._get_embedding_table(name)
+        if slot_name is None:
+            return table.get(indices, self.version)
+        return table.get_slot(slot_name, indices, self.version)
+
+    def set_embedding_param(self, name, indices, values):
+        table, slot_name = self._get_embedding_table(name)
+        if slot_name is None:
+            table.set(indices, values, self.version)
+        else:
+            table.set_slot(slot_name, indices, values, self.version)
+
+    def get_embedding_param_with_slots(self, name, indices):
+        """Get embedding vectors of `indices` followed by their slots in
+        the order of `slot_names` passed to `create_slot_params`."""
         if name not in self.embedding_params:
             raise ValueError(
                 "Please initialize embedding param %s first!" % name
             )
-        return self.embedding_params[name].get(indices)
+        return self.embedding_params[name].get_with_slots(indices)
 
-    def set_embedding_param(self, name, indices, values):
+    def set_embedding_param_with_slots(self, name, indices, values):
+        """Set embedding vectors of `indices` and their slots to `values`
+        in the layout of `get_embedding_param_with_slots`."""
         if name not in self.embedding_params:
             raise ValueError(
                 "Please initialize embedding param %s first!" % name
             )
-        self.embedding_params[name].set(indices, values)
+        self.embedding_params[name].set_with_slots(
+            indices, values, self.version
+        )
+
+    def update_embedding_param_with_slots(self, name, indices, update_fn):
+        """Update embedding vectors of `indices` and their slots in place
+        by `update_fn`. See `EmbeddingTable.update_with_slots`."""
+        if name not in self.embedding_params:
+            raise ValueError(
+                "Please initialize embedding param %s first!" % name
+            )
+        self.embedding_params[name].update_with_slots(
+            indices, update_fn, self.version
+        )
+
+    def evict_embedding_params(self):
+        """Evict rows of embedding tables selected by `embedding_evictor`.
+
+        Returns:
+            The number of evicted rows of embedding tables.
+        """
+        if self.embedding_evictor is None:
+            return 0
+        evicted_num = 0
+        for name, table in list(self.embedding_params.items()):
+            if table.is_slot:
+                continue
+            ids = self.embedding_evictor.select_ids(table, self.version)
+            if ids.size == 0:
+                continue
+            evicted_num += table.remove(ids)
+        return evicted_num
+
+    def _get_non_embedding_param_shape(self, name):
+        """Returns the shape tuple of non-embedding param `name`, or None if
+        there is no such param. Shapes are cached by the param variables,
+        so that TensorFlow is not called for every gradient."""
+        var = self.non_embedding_params.get(name)
+        if var is None:
+            return None
+        cached = self._non_embedding_param_shapes.get(name)
+        if cached is not None and cached[0] is var:
+            return cached[1]
+        shape = tuple(var.shape.as_list())
+        self._non_embedding_param_shapes[name] = (var, shape)
+        return shape
 
     def check_grad(self, grad):
         name = grad.name
-        if name in self.non_embedding_params:
-            param_shape = tuple(
-                self.non_embedding_params[name].get_shape().as_list()
-            )
+        param_shape = self._get_non_embedding_param_shape(name)
+        if param_shape is not None:
             if grad.is_indexed_slices():
-                dim0 = tf.math.reduce_max(grad.indices).numpy()
+                # The number of rows needed by the indices
+                indices = grad.indices
+                dim0 = int(indices.max()) + 1 if len(indices) else 0
                 dim1 = grad.values.shape[1]
-                if dim0 > param_shape[0] or dim1 != param_shape[1]:
+                if (
+                    dim0 > param_shape[0]
+                    or dim1 != param_shape[1]
+                    or (len(indices) and indices.min() < 0)
+                ):
                     raise ValueError(
                         "Keras embedding param error: "
                         "the shape of gradient %s is (%d, %d), "
@@ -126,56 +235,87 @@ class Parameters(object):
         Returns:
             A bool indicates whether `Parameters` accepts this model pb or not.
         """
+        return self.init_from_tensors(
+            model_pb.version,
+            model_pb.embedding_table_info,
+            (Tensor.from_tensor_pb(pb) for pb in model_pb.param),
+        )
+
+    def init_from_tensors(self, version, embeddings_pb, tensors):
+        """Initializes `Parameters` like `init_from_model_pb` with the
+        parameters of the model in ElasticDL `Tensor`s.
+
+        Args:
+            version: The model version.
+            embeddings_pb: A list of `EmbeddingTableInfo` protocol buffers.
+            tensors: An iterable of ElasticDL `Tensor`s of parameters.
+
+        Returns:
+            A bool indicates whether `Parameters` accepts the model or not.
+        """
         if not self.init_status:
-            tensors_pb = model_pb.param
-            embeddings_pb = model_pb.embedding_table_info
             self.init_embedding_params(embeddings_pb)
-            self._restore_params_from_pb(tensors_pb)
-            self.version = max(0, model_pb.version)
+            self._restore_params(tensors)
+            self.version = max(0, version)
+            self.set_non_embedding_params_modified(
+                self.non_embedding_params, self.version
+            )
             self.init_status = True
             return True
         return False
 
-    def _restore_params_from_pb(self, tensors_pb):
-        for pb in tensors_pb:
-            name = pb.name
-            if not pb.indices:
+    def _restore_params(self, tensors):
+        for tensor in tensors:
+            name = tensor.name
+            if not tensor.is_indexed_slices():
                 # Please note that `tf.Variable` will do something with magic.
                 # If you pass a name "somename" to a `tf.Variable`, the final
                 # variable name will be "somename:0". So the `tf.Variable.name`
                 # is meaningless, we must avoid use it in PS side.
-                arr = tensor_pb_to_ndarray(pb)
+                arr = tensor.to_ndarray()
                 var = tf.Variable(initial_value=arr, trainable=True)
                 self.non_embedding_params[name] = var
+                self._non_embedding_param_shapes[name] = (var, arr.shape)
             else:
                 # Only pb of embedding parameters has indices.
-                tensor = Tensor()
-                deserialize_tensor_pb(pb, tensor)
                 self.embedding_params[name].set(tensor.indices, tensor.values)
 
     def init_embedding_params(self, embeddings_pb):
         for pb in embeddings_pb:
             if pb.name not in self.embedding_params:
                 self.embedding_params[pb.name] = create_embedding_table(pb)
+                if self._slot_names:
+                    self._create_slots(pb.name)
 
     def has_embedding_params(self):
         return len(self.embedding_params) > 0
 
     def create_slot_params(self, slot_names, init_values):
-        embed_layer_names = list(self.embedding_params.keys())
-        for layer_name in embed_layer_names:
-            for slot_name in slot_names:
-                key = get_slot_table_name(layer_name, slot_name)
-                if key in self.embedding_params:
-                    raise ValueError(
-                        "An embedding layer has unexpected name %s" % key
-                    )
-                self.embedding_params[key] = EmbeddingTable(
-                    key,
-                    self.embedding_params[layer_name].dim,
-                    init_values[slot_name],
-                    True,
+        """Create slots in all embedding tables. Embedding tables
+        initialized later also get these slots.
+
+        Args:
+            slot_names: A list of slot names.
+            init_values: A dictionary of {slot name: initial value}.
+        """
+        self._slot_names = list(slot_names)
+        self._slot_initial_values = dict(init_values)
+        for layer_name in list(self.embedding_params.keys()):
+            if not self.embedding_params[layer_name].is_slot:
+                self._create_slots(layer_name)
+
+    def _create_slots(self, layer_name):
+        for slot_name in self._slot_names:
+            key = get_slot_table_name(layer_name, slot_name)
+            if key in self.embedding_params:
+                raise ValueError(
+                    "An embedding layer has unexpected name %s" % key
                 )
+            self._slot_tables[key] = (layer_name, slot_name)
+        self.embedding_params[layer_name].create_slots(
+            self._slot_names,
+            [self._slot_initial_values[name] for name in self._slot_names],
+        )
 
     def to_model_pb(self):
         """ Convert all parameters including embedding and non-embedding
@@ -204,9 +344,14 @@ class Parameters(object):
     def debug_info(self):
         info = ""
         total_size = 0
+        total_evicted_count = 0
         for param in self.embedding_params:
             info += self.embedding_params[param].debug_info()
             total_size += self.embedding_params[param].get_table_size()
+            if not self.embedding_params[param].is_slot:
+                total_evicted_count += self.embedding_params[
+                    param
+                ].evicted_count
         for param in self.non_embedding_params:
             shape = self.non_embedding_params[param].get_shape().as_list()
             size = (
@@ -218,5 +363,6 @@ class Parameters(object):
                 % (param, str(shape), size)
             )
             total_size += size
+        info += "Total evicted embedding rows: %d\n" % total_evicted_count
         info += "Total parameters size: %d bytes" % total_size
         return info
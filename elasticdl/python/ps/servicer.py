@@ -3,14 +3,30 @@ import threading
 from google.protobuf import empty_pb2
 
 from elasticdl.proto import elasticdl_pb2, elasticdl_pb2_grpc
+from elasticdl.python.common.constants import SparseUpdateEngine
+from elasticdl.python.common.gradient_compression import (
+    deserialize_gradient_pb,
+)
+from elasticdl.python.common.lock_utils import RWLock
 from elasticdl.python.common.log_utils import default_logger as logger
 from elasticdl.python.common.tensor import (
     Tensor,
+    TensorChunkAssembler,
+    emplace_tensor_chunk_pb,
     emplace_tensor_pb_from_ndarray,
     serialize_tensor,
+    split_tensor_to_chunks,
+)
+from elasticdl.python.ps.gradient_accumulator import (
+    add_gradients,
+    create_gradient_accumulator,
 )
 from elasticdl.python.ps.optimizer_wrapper import OptimizerWrapper
 
+# The max seconds a sync-SGD push beyond `grads_to_wait` waits for the
+# pushes of the current version to be applied before it is rejected
+_SYNC_PUSH_WAIT_TIMEOUT = 10
+
 
 class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
     """PS service implementation"""
@@ -29,6 +45,8 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
         checkpoint_saver=None,
         ps_id=None,
         num_ps_pods=None,
+        sparse_update_engine=SparseUpdateEngine.TENSORFLOW,
+        grad_check_pushes_per_worker=0,
     ):
         if master_channel is None:
             self._master_stub = None
@@ -46,37 +64,111 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
         self._checkpoint_saver = checkpoint_saver
         self._ps_id = ps_id
         self._num_ps_pods = num_ps_pods
+        self._sparse_update_engine = sparse_update_engine
+        # Gradients of a worker are only checked in its first
+        # `_grad_check_pushes_per_worker` successful pushes if it is
+        # positive. `_checked_pushes` counts them by worker ids.
+        self._grad_check_pushes_per_worker = grad_check_pushes_per_worker
+        self._checked_pushes = {}
         self._version_lock = threading.Lock()
         self._lock = threading.Lock()
+        # In sync-SGD, parameters are updated with `_params_lock` held
+        # exclusively, and snapshots are taken with it held shared.
+        self._params_lock = RWLock()
+        self._snapshot_lock = threading.Lock()
+        self._dense_snapshot = None
         self._use_wrap_opt = False
 
+        # In sync-SGD, `_grads_reserved` pushes have started to accumulate
+        # gradients in the current version and `_grads_n` of them have
+        # finished. Both are guarded by `_lock`.
         self._grads_n = 0
+        self._grads_reserved = 0
+        self._grads_applied = threading.Condition(self._lock)
+        # A dict of {parameter name: gradient accumulator} in sync-SGD
         self._grads_buffer = {}
 
     def pull_variable(self, request, _):
         """
-        Response with all non-embedding parameters if initialized.
+        Response with the non-embedding parameters modified after
+        `request.current_model_version` if initialized. The response is
+        shared by pulls of the same version and must not be modified.
         """
-        res = elasticdl_pb2.PullVariableResponse()
         if not self._parameters.init_status:
+            res = elasticdl_pb2.PullVariableResponse()
             res.model_init_status = False
             return res
 
-        # Only sync-SGD needs lock
-        # TODO: use a read-write lock to support multiple concurrent reads
-        if not self._use_async:
-            self._lock.acquire()
-        res.model.version = self._parameters.version
-        # No need to send variables if the requester has the latest version.
-        if self._parameters.version > request.current_model_version:
-            for name, var in self._parameters.non_embedding_params.items():
-                emplace_tensor_pb_from_ndarray(
-                    res.model.param, var.numpy(), name=name
+        snapshot = self._get_dense_snapshot()
+        return snapshot.get_pull_variable_response(
+            request.current_model_version
+        )
+
+    def pull_variable_stream(self, request, _):
+        """
+        Streaming variant of `pull_variable`. The first response only has
+        the model init status and the model version, and each following
+        response has one parameter or one chunk of a parameter of at most
+        `request.max_chunk_bytes` bytes.
+        """
+        res = elasticdl_pb2.PullVariableResponse()
+        res.model_init_status = self._parameters.init_status
+        if not res.model_init_status:
+            yield res
+            return
+
+        snapshot = self._get_dense_snapshot()
+        res.model.version = snapshot.version
+        yield res
+        for name in snapshot.get_modified_names(request.current_model_version):
+            tensor = Tensor(snapshot.params[name], name=name)
+            for chunk, row_offset, total_rows in split_tensor_to_chunks(
+                tensor, request.max_chunk_bytes
+            ):
+                res = elasticdl_pb2.PullVariableResponse()
+                res.model_init_status = True
+                res.model.version = snapshot.version
+                emplace_tensor_chunk_pb(
+                    res.model.param, chunk, row_offset, total_rows
                 )
-        if not self._use_async:
-            self._lock.release()
-        res.model_init_status = True
-        return res
+                yield res
+
+    def _get_dense_snapshot(self):
+        """Returns a `_DenseSnapshot` of the current version.
+
+        A snapshot is immutable and is serialized once for each version by
+        the first pull of the version. It is published by replacing the
+        reference `self._dense_snapshot`, so that pulls of a version share
+        the snapshot without taking any lock. A version bump invalidates
+        the snapshot.
+        """
+        snapshot = self._dense_snapshot
+        if snapshot is not None and (
+            snapshot.version == self._parameters.version
+        ):
+            return snapshot
+        with self._snapshot_lock:
+            snapshot = self._dense_snapshot
+            if snapshot is None or (
+                snapshot.version != self._parameters.version
+            ):
+                with self._params_lock.read_lock():
+                    version = self._parameters.version
+                    params = {
+                        name: var.numpy()
+                        for name, var in (
+                            self._parameters.non_embedding_params.items()
+                        )
+                    }
+                    modified_versions = {
+                        name: self._parameters.get_non_embedding_param_version(
+                            name
+                        )
+                        for name in params
+                    }
+                snapshot = _DenseSnapshot(version, params, modified_versions)
+                self._dense_snapshot = snapshot
+        return snapshot
 
     def pull_embedding_vector(self, request, _):
         ret = elasticdl_pb2.Tensor()
@@ -89,13 +181,55 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
         serialize_tensor(tensor, ret)
         return ret
 
+    def pull_embedding_vectors(self, request, _):
+        """Batched `pull_embedding_vector` of multiple embedding tables."""
+        res = elasticdl_pb2.PullEmbeddingVectorsResponse()
+        for req in request.requests:
+            if not req.ids:
+                res.embedding_vectors.add().name = req.name
+                continue
+            embedding_vectors = self._parameters.get_embedding_param(
+                req.name, req.ids
+            )
+            emplace_tensor_pb_from_ndarray(
+                res.embedding_vectors, embedding_vectors, name=req.name
+            )
+        return res
+
     def push_model(self, request, _):
-        with self._lock:
+        with self._lock, self._params_lock.write_lock():
             accepted = self._parameters.init_from_model_pb(request)
         if accepted and self._parameters.has_embedding_params():
             self.wrap_optimizer_and_set_slot()
         return empty_pb2.Empty()
 
+    def push_model_stream(self, request_iterator, _):
+        """
+        Streaming variant of `push_model`, where parameters may be split
+        into chunks in multiple requests. The model is initialized after
+        all requests are received.
+        """
+        version = None
+        embeddings_pb = []
+        tensors = []
+        assembler = TensorChunkAssembler()
+        for request in request_iterator:
+            if version is None:
+                version = request.version
+            embeddings_pb.extend(request.embedding_table_info)
+            for pb in request.param:
+                tensor = assembler.add(pb)
+                if tensor is not None:
+                    tensors.append(tensor)
+        assembler.finish()
+        with self._lock, self._params_lock.write_lock():
+            accepted = self._parameters.init_from_tensors(
+                version or 0, embeddings_pb, tensors
+            )
+        if accepted and self._parameters.has_embedding_params():
+            self.wrap_optimizer_and_set_slot()
+        return empty_pb2.Empty()
+
     def push_embedding_info(self, request, _):
         with self._lock:
             self._parameters.init_embedding_params(
@@ -105,12 +239,63 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
         return empty_pb2.Empty()
 
     def push_gradient(self, request, _):
+        return self._push_gradient(
+            request.model_version,
+            (deserialize_gradient_pb(pb) for pb in request.gradients),
+            request.worker_id,
+        )
+
+    def push_gradient_stream(self, request_iterator, _):
+        """
+        Streaming variant of `push_gradient`, where gradients may be split
+        into chunks in multiple requests. Gradients are applied after all
+        requests are received.
+        """
+        model_version = None
+        worker_id = 0
+        grads = {}
+        assembler = TensorChunkAssembler()
+        for request in request_iterator:
+            if model_version is None:
+                model_version = request.model_version
+                worker_id = request.worker_id
+            for pb in request.gradients:
+                if pb.compression:
+                    grad = deserialize_gradient_pb(pb)
+                else:
+                    grad = assembler.add(pb)
+                if grad is None:
+                    continue
+                # Chunks of a tf.IndexedSlices gradient are concatenated
+                if grad.name in grads:
+                    grads[grad.name] = grads[grad.name] + grad
+                else:
+                    grads[grad.name] = grad
+        assembler.finish()
+        return self._push_gradient(
+            model_version or 0, grads.values(), worker_id
+        )
+
+    def _push_gradient(self, model_version, grads, worker_id=0):
+        """Applies gradients pushed by a worker of model version
+        `model_version`.
+
+        Args:
+            model_version: The model version of the worker.
+            grads: An iterable of ElasticDL `Tensor`s of the gradients.
+            worker_id: The id of the worker.
+
+        Returns:
+            A `PushGradientResponse`.
+        """
         res = elasticdl_pb2.PushGradientResponse()
+        need_to_check = self._need_to_check_grads(worker_id)
         if self._use_async:
             grad_vars = []
-            for pb in request.gradients:
-                grad = Tensor.from_tensor_pb(pb)
-                self._parameters.check_grad(grad)
+            dense_names = []
+            for grad in grads:
+                if need_to_check:
+                    self._parameters.check_grad(grad)
                 name = grad.name
                 var = self._parameters.get_non_embedding_param(name)
                 grad = grad.to_tf_tensor()
@@ -118,81 +303,175 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
                     grad_vars.append((grad, name))
                 else:
                     grad_vars.append((grad, var))
+                    dense_names.append(name)
 
             if self._lr_scheduler:
                 self._lr_scheduler.set_model_version(self._parameters.version)
             self._optimizer.apply_gradients(grad_vars)
             with self._version_lock:
+                # Mark parameters before bumping the version, so that a
+                # snapshot of the new version never misses them.
+                self._parameters.set_non_embedding_params_modified(
+                    dense_names, self._parameters.version + 1
+                )
                 self._parameters.version += 1
                 self._save_params_to_checkpoint_if_needed()
+                self._evict_embedding_params_if_needed()
                 version = self._parameters.version
             self._report_version_if_needed(version)
+            if need_to_check:
+                self._count_checked_push(worker_id)
 
             res.accepted = True
             res.model_version = self._parameters.version
             return res
         else:
             if (
-                request.model_version
+                model_version
                 < self._parameters.version - self._sync_version_tolerance
             ):
                 res.accepted = False
                 res.model_version = self._parameters.version
                 return res
 
-            with self._lock:
-                for pb in request.gradients:
-                    grad = Tensor.from_tensor_pb(pb)
+            # Decode and validate gradients before taking any lock
+            grads = list(grads)
+            if need_to_check:
+                for grad in grads:
                     self._parameters.check_grad(grad)
-                    if grad.name in self._grads_buffer:
-                        self._grads_buffer[grad.name] = (
-                            self._grads_buffer[grad.name] + grad
-                        )
-                    else:
-                        self._grads_buffer[grad.name] = grad
 
-                self._grads_n += 1
-                res.accepted = True
+            with self._lock:
+                # Pushes beyond `grads_to_wait` wait for the next version.
+                # They are rejected if the reserved pushes are not applied
+                # in time, e.g. when applying the gradients is stuck.
+                ready = self._grads_applied.wait_for(
+                    lambda: self._grads_reserved < self._grads_to_wait,
+                    _SYNC_PUSH_WAIT_TIMEOUT,
+                )
+                # The version may have been bumped while waiting
+                if not ready or (
+                    model_version
+                    < self._parameters.version - self._sync_version_tolerance
+                ):
+                    res.accepted = False
+                    res.model_version = self._parameters.version
+                    return res
+                self._grads_reserved += 1
+
+            # Accumulators have their own locks, so concurrent pushes only
+            # contend on the same parameters. The gradients of a push are
+            # added atomically, so that a malformed push is rejected
+            # without modifying the sums.
+            try:
+                accumulators = [
+                    self._get_grad_accumulator(grad) for grad in grads
+                ]
+                add_gradients(accumulators, grads)
+            except Exception:
+                with self._lock:
+                    self._grads_reserved -= 1
+                    self._grads_applied.notify_all()
+                raise
 
-                updated_version = False
+            with self._lock:
+                self._grads_n += 1
+                need_to_apply = self._grads_n == self._grads_to_wait
                 version = self._parameters.version
-                if self._grads_n == self._grads_to_wait:
-                    grad_vars = []
-                    for name, grad in self._grads_buffer.items():
-                        # Dense gradients are averaged,
-                        # while sparse gradients are summed
-                        if not grad.is_indexed_slices():
-                            grad.values = grad.values / self._grads_to_wait
-                        var = self._parameters.get_non_embedding_param(name)
-                        grad = grad.to_tf_tensor()
-                        if var is None:
-                            grad_vars.append((grad, name))
-                        else:
-                            grad_vars.append((grad, var))
-
-                    if self._lr_scheduler:
-                        self._lr_scheduler.set_model_version(
-                            self._parameters.version
-                        )
-                    self._optimizer.apply_gradients(grad_vars)
-                    self._grads_n = 0
-                    self._grads_buffer.clear()
-                    self._parameters.version += 1
-                    self._save_params_to_checkpoint_if_needed()
-                    version = self._parameters.version
-                    updated_version = True
 
-            if updated_version:
+            if need_to_apply:
+                version = self._apply_accumulated_grads()
                 self._report_version_if_needed(version)
+            if need_to_check:
+                self._count_checked_push(worker_id)
+            res.accepted = True
             res.model_version = version
             return res
 
+    def _need_to_check_grads(self, worker_id):
+        return (
+            not self._grad_check_pushes_per_worker
+            or self._checked_pushes.get(worker_id, 0)
+            < self._grad_check_pushes_per_worker
+        )
+
+    def _count_checked_push(self, worker_id):
+        if self._grad_check_pushes_per_worker:
+            # Concurrent pushes of a worker may miss a count without a
+            # lock, which only delays skipping the check.
+            self._checked_pushes[worker_id] = (
+                self._checked_pushes.get(worker_id, 0) + 1
+            )
+
+    def _get_grad_accumulator(self, grad):
+        accumulator = self._grads_buffer.get(grad.name)
+        if accumulator is None:
+            with self._lock:
+                accumulator = self._grads_buffer.get(grad.name)
+                if accumulator is None:
+                    accumulator = create_gradient_accumulator(grad)
+                    self._grads_buffer[grad.name] = accumulator
+        return accumulator
+
+    def _apply_accumulated_grads(self):
+        """Applies the gradients accumulated from `grads_to_wait` pushes in
+        sync-SGD and returns the new model version.
+
+        It is called by the push which completes the accumulation. No other
+        push accumulates gradients until it finishes. If the gradients fail
+        to be applied, they are dropped and the accumulation of the next
+        version starts, so that the waiting pushes are not blocked.
+        """
+        try:
+            self._apply_grads_in_buffer()
+        finally:
+            # Keep the buffers of accumulators for the next version
+            for accumulator in self._grads_buffer.values():
+                accumulator.reset()
+            version = self._parameters.version
+            with self._lock:
+                self._grads_n = 0
+                self._grads_reserved = 0
+                self._grads_applied.notify_all()
+        return version
+
+    def _apply_grads_in_buffer(self):
+        grad_vars = []
+        dense_names = []
+        for name, accumulator in self._grads_buffer.items():
+            if not accumulator.count:
+                continue
+            grad = accumulator.get()
+            # Dense gradients are averaged,
+            # while sparse gradients are summed
+            if not grad.is_indexed_slices():
+                grad.values /= self._grads_to_wait
+            var = self._parameters.get_non_embedding_param(name)
+            grad = grad.to_tf_tensor()
+            if var is None:
+                grad_vars.append((grad, name))
+            else:
+                grad_vars.append((grad, var))
+                dense_names.append(name)
+
+        if self._lr_scheduler:
+            self._lr_scheduler.set_model_version(self._parameters.version)
+        with self._params_lock.write_lock():
+            self._optimizer.apply_gradients(grad_vars)
+            self._parameters.version += 1
+            self._parameters.set_non_embedding_params_modified(
+                dense_names, self._parameters.version
+            )
+        self._save_params_to_checkpoint_if_needed()
+        self._evict_embedding_params_if_needed()
+
     def wrap_optimizer(self):
         self._optimizer = OptimizerWrapper(
             self._optimizer,
             self._use_async,
-            self._parameters.get_embedding_param,
-            self._parameters.set_embedding_param,
+            self._parameters.get_embedding_param_with_slots,
+            self._parameters.set_embedding_param_with_slots,
+            self._sparse_update_engine,
+            self._parameters.update_embedding_param_with_slots,
         )
 
     def _report_version_if_needed(self, version):
@@ -229,3 +508,69 @@ class PserverServicer(elasticdl_pb2_grpc.PserverServicer):
                 shard_index=self._ps_id,
                 shard_num=self._num_ps_pods,
             )
+
+    def _evict_embedding_params_if_needed(self):
+        """Evict rows of embedding parameters by the eviction policy"""
+        evictor = self._parameters.embedding_evictor
+        if evictor and evictor.need_to_evict(self._parameters.version):
+            evicted_num = self._parameters.evict_embedding_params()
+            if evicted_num:
+                logger.info(
+                    "Evict %d embedding rows at version %d"
+                    % (evicted_num, self._parameters.version)
+                )
+
+
+class _DenseSnapshot(object):
+    """An immutable snapshot of non-embedding parameters of a model version,
+    which memoizes the serialized responses of `pull_variable`.
+
+    A response only contains the parameters modified after the model
+    version of the requester. Requesters of the same version get the same
+    response, so the responses are keyed by the set of parameters they
+    contain. The responses are shared by all pulls of the version and must
+    not be modified.
+    """
+
+    def __init__(self, version, params, modified_versions):
+        """
+        Args:
+            version: The model version.
+            params: A python dictionary of {name: numpy.ndarray}.
+            modified_versions: A python dictionary of {name: the model
+                version in which the parameter was last modified}.
+        """
+        self.version = version
+        self.params = params
+        self._modified_versions = modified_versions
+        self._responses = {}
+        self._responses_lock = threading.Lock()
+
+    def get_modified_names(self, current_model_version):
+        """Returns a tuple of the names of parameters modified after
+        `current_model_version`."""
+        return tuple(
+            name
+            for name in self.params
+            if self._modified_versions[name] > current_model_version
+        )
+
+    def get_pull_variable_response(self, current_model_version):
+        """Returns the response to a requester with the model version
+        `current_model_version`."""
+        names = self.get_modified_names(current_model_version)
+        response = self._responses.get(names)
+        if response is not None:
+            return response
+        with self._responses_lock:
+            response = self._responses.get(names)
+            if response is None:
+                response = elasticdl_pb2.PullVariableResponse()
+                response.model_init_status = True
+                response.model.version = self.version
+                for name in names:
+                    emplace_tensor_pb_from_ndarray(
+                        response.model.param, self.params[name], name=name
+                    )
+                self._responses[names] = response
+        return response
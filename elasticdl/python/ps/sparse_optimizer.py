@@ -0,0 +1,198 @@
+"""NumPy implementations of sparse updates of Keras optimizers"""
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.optimizers import SGD, Adagrad, Adam, Ftrl, RMSprop
+
+
+def merge_duplicate_ids(ids, values):
+    """Sums the rows of `values` which have the same id.
+
+    Args:
+        ids: A 1-D numpy.ndarray of ids.
+        values: A 2-D numpy.ndarray with one row for each id.
+
+    Returns:
+        A tuple of (unique_ids, merged_values), where unique ids are sorted.
+    """
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    if len(unique_ids) == len(ids):
+        return unique_ids, values[np.argsort(inverse)]
+    order = np.argsort(inverse, kind="stable")
+    starts = np.flatnonzero(np.diff(inverse[order], prepend=-1))
+    return unique_ids, np.add.reduceat(values[order], starts, axis=0)
+
+
+class SparseOptimizer(object):
+    """Updates rows of embedding vectors and their slots with NumPy.
+
+    `SparseOptimizer` applies the same math as the sparse updates of a Keras
+    optimizer, i.e. `_resource_apply_sparse`, without creating TensorFlow
+    variables. The rows are laid out as
+    [embedding vector | slot 0 | slot 1 | ...] and are updated in place.
+    Hyperparameters are read from the Keras optimizer, so that learning rate
+    schedulers and learning rate modulation still take effect.
+
+    SGD with or without (Nesterov) momentum, Adagrad, Adam, Ftrl and
+    RMSprop with or without momentum are supported.
+    """
+
+    def __init__(self, opt, slot_names):
+        """
+        Arguments:
+            opt: A Keras optimizer instance.
+            slot_names: A list of slot names in the order they are laid out
+                in rows.
+        """
+        self._opt = opt
+        self._slot_names = slot_names
+        if isinstance(opt, SGD):
+            self._apply = self._apply_sgd
+        elif isinstance(opt, Adam):
+            self._apply = self._apply_adam
+        elif isinstance(opt, Adagrad):
+            self._apply = self._apply_adagrad
+        elif isinstance(opt, Ftrl):
+            self._apply = self._apply_ftrl
+        elif isinstance(opt, RMSprop):
+            self._apply = self._apply_rmsprop
+        else:
+            raise NotImplementedError(
+                "Optimizer %s is not supported by SparseOptimizer." % type(opt)
+            )
+
+    def _get_hyper(self, name):
+        return float(self._opt._get_hyper(name, tf.float32))
+
+    def get_coefficients(self):
+        """Gets the hyperparameters of the current step.
+
+        This function should be called before `iterations` of the Keras
+        optimizer is increased for the step.
+
+        Returns:
+            A python dictionary of {name: float value}.
+        """
+        coefficients = {
+            "lr": float(self._opt._decayed_lr(tf.float32)),
+            "local_step": float(self._opt.iterations.numpy() + 1),
+        }
+        if isinstance(self._opt, SGD):
+            coefficients["momentum"] = self._get_hyper("momentum")
+        elif isinstance(self._opt, Adam):
+            coefficients["beta_1"] = self._get_hyper("beta_1")
+            coefficients["beta_2"] = self._get_hyper("beta_2")
+        elif isinstance(self._opt, Ftrl):
+            for name in [
+                "learning_rate_power",
+                "l1_regularization_strength",
+                "l2_regularization_strength",
+            ]:
+                coefficients[name] = self._get_hyper(name)
+        elif isinstance(self._opt, RMSprop):
+            coefficients["rho"] = self._get_hyper("rho")
+            coefficients["momentum"] = self._get_hyper("momentum")
+        return coefficients
+
+    def apply_gradients(self, values, grads, coefficients):
+        """Updates rows of embedding vectors and slots in place.
+
+        Args:
+            values: A 2-D float32 numpy.ndarray of rows. Each row contains
+                an embedding vector followed by its slots.
+            grads: A 2-D float32 numpy.ndarray of gradients of the embedding
+                vectors. Each row of `values` must have exactly one row of
+                gradients.
+            coefficients: The hyperparameters from `get_coefficients`.
+        """
+        var, *slot_values = np.split(values, 1 + len(self._slot_names), axis=1)
+        slots = dict(zip(self._slot_names, slot_values))
+        self._apply(var, slots, grads, coefficients)
+
+    # The following functions follow `_resource_apply_sparse` of Keras
+    # optimizers in TensorFlow 2.0 and the sparse kernels they call.
+    def _apply_sgd(self, var, slots, grad, coef):
+        lr = coef["lr"]
+        if "momentum" not in slots:
+            var -= lr * grad
+            return
+        accum = slots["momentum"]
+        accum *= coef["momentum"]
+        accum -= lr * grad
+        if self._opt.nesterov:
+            var += accum * coef["momentum"] - lr * grad
+        else:
+            var += accum
+
+    def _apply_adagrad(self, var, slots, grad, coef):
+        acc = slots["accumulator"]
+        acc += grad * grad
+        var -= coef["lr"] * grad / (np.sqrt(acc) + self._opt.epsilon)
+
+    def _apply_adam(self, var, slots, grad, coef):
+        beta_1, beta_2 = coef["beta_1"], coef["beta_2"]
+        beta_1_power = beta_1 ** coef["local_step"]
+        beta_2_power = beta_2 ** coef["local_step"]
+        lr = coef["lr"] * np.sqrt(1 - beta_2_power) / (1 - beta_1_power)
+        m, v = slots["m"], slots["v"]
+        m *= beta_1
+        m += grad * (1 - beta_1)
+        v *= beta_2
+        v += grad * grad * (1 - beta_2)
+        if self._opt.amsgrad:
+            v_hat = slots["vhat"]
+            np.maximum(v_hat, v, out=v_hat)
+            v = v_hat
+        var -= lr * m / (np.sqrt(v) + self._opt.epsilon)
+
+    def _apply_ftrl(self, var, slots, grad, coef):
+        accum, linear = slots["accumulator"], slots["linear"]
+        lr = coef["lr"]
+        lr_power = coef["learning_rate_power"]
+        l1 = coef["l1_regularization_strength"]
+        l2 = coef["l2_regularization_strength"]
+        l2_shrinkage = self._opt._l2_shrinkage_regularization_strength
+        if l2_shrinkage > 0:
+            grad_with_shrinkage = grad + 2 * l2_shrinkage * var
+        else:
+            grad_with_shrinkage = grad
+        new_accum = accum + grad * grad
+        if lr_power == -0.5:
+            sigma = (np.sqrt(new_accum) - np.sqrt(accum)) / lr
+            y = np.sqrt(new_accum) / lr + 2 * l2
+        else:
+            sigma = (
+                np.power(new_accum, -lr_power) - np.power(accum, -lr_power)
+            ) / lr
+            y = np.power(new_accum, -lr_power) / lr + 2 * l2
+        linear += grad_with_shrinkage - sigma * var
+        x = np.clip(linear, -l1, l1) - linear
+        var[...] = x / y
+        accum[...] = new_accum
+
+    def _apply_rmsprop(self, var, slots, grad, coef):
+        lr, rho = coef["lr"], coef["rho"]
+        epsilon = self._opt.epsilon
+        rms = slots["rms"]
+        if "momentum" in slots:
+            mom = slots["momentum"]
+            rms += (grad * grad - rms) * (1 - rho)
+            if "mg" in slots:
+                mg = slots["mg"]
+                mg += (grad - mg) * (1 - rho)
+                denom = rms - mg * mg + epsilon
+            else:
+                denom = rms + epsilon
+            mom *= coef["momentum"]
+            mom += lr * grad / np.sqrt(denom)
+            var -= mom
+        else:
+            rms *= rho
+            rms += grad * grad * (1 - rho)
+            denom = rms
+            if "mg" in slots:
+                mg = slots["mg"]
+                mg *= rho
+                mg += grad * (1 - rho)
+                denom = rms - mg * mg
+            var -= lr * grad / (np.sqrt(denom) + epsilon)
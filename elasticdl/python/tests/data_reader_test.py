@@ -4,6 +4,7 @@ import tempfile
 import time
 import unittest
 from collections import namedtuple
+from unittest import mock
 
 import numpy as np
 import tensorflow as tf
@@ -12,6 +13,7 @@ from odps import ODPS
 from elasticdl.python.common.constants import MaxComputeConfig
 from elasticdl.python.common.model_utils import load_module
 from elasticdl.python.data.odps_io import is_odps_configured
+from elasticdl.python.data.reader import recordio_reader
 from elasticdl.python.data.reader.csv_reader import CSVDataReader
 from elasticdl.python.data.reader.data_reader import Metadata
 from elasticdl.python.data.reader.data_reader_factory import create_data_reader
@@ -57,6 +59,48 @@ class RecordIODataReaderTest(unittest.TestCase):
                 for k, v in parsed_record.items():
                     self.assertEqual(len(v.numpy()), 1)
 
+            # Test reading records in batches
+            task = _MockedTask(10, num_records, shard_name)
+            batches = list(reader.read_record_batches(task, batch_size=50))
+            self.assertListEqual([len(b) for b in batches], [50, 50, 18])
+            self.assertListEqual(
+                [record for batch in batches for record in batch],
+                list(reader.read_records(task)),
+            )
+
+    def test_recordio_data_reader_index_cache(self):
+        num_records = 16
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            shard_names = [
+                create_recordio_file(
+                    num_records, DatasetName.TEST_MODULE, 1, temp_dir_name
+                )
+                for _ in range(4)
+            ]
+            reader = RecordIODataReader(data_dir=temp_dir_name)
+            with mock.patch.object(recordio_reader, "_MAX_CACHED_INDICES", 2):
+                # The index of a shard with an open scanner is not evicted
+                records = reader.read_records(
+                    _MockedTask(0, num_records, shard_names[0])
+                )
+                next(records)
+                for shard_name in shard_names[1:]:
+                    task = _MockedTask(0, num_records, shard_name)
+                    self.assertEqual(
+                        len(list(reader.read_records(task))), num_records
+                    )
+                self.assertListEqual(
+                    list(reader._indices), [shard_names[0], shard_names[3]]
+                )
+                records.close()
+                task = _MockedTask(0, num_records, shard_names[1])
+                list(reader.read_records(task))
+                self.assertListEqual(
+                    list(reader._indices), [shard_names[3], shard_names[1]]
+                )
+            reader.close()
+            self.assertFalse(reader._indices)
+
 
 class CSVDataReaderTest(unittest.TestCase):
     def test_csv_data_reader(self):
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+
+from elasticdl.python.common.constants import EmbeddingEvictionPolicy
+from elasticdl.python.worker.embedding_cache import EmbeddingCache
+
+
+def _vectors(ids, dim=4):
+    return np.repeat(
+        np.asarray(ids, dtype=np.float32).reshape(-1, 1), dim, axis=1
+    )
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def _cached_ids(self, cache, name, ids, version):
+        hit, _ = cache.lookup(name, np.array(ids, dtype=np.int64), version)
+        return sorted(np.array(ids)[hit].tolist())
+
+    def test_invalid_args(self):
+        with self.assertRaises(ValueError):
+            EmbeddingCache(0)
+        with self.assertRaises(ValueError):
+            EmbeddingCache(10, "fifo")
+        with self.assertRaises(ValueError):
+            EmbeddingCache(10, staleness=-1)
+
+    def test_lookup_and_insert(self):
+        cache = EmbeddingCache(10)
+        ids = np.array([3, 1, 3, 7], dtype=np.int64)
+        hit, vectors = cache.lookup("a", ids, 0)
+        self.assertFalse(hit.any())
+        self.assertIsNone(vectors)
+
+        cache.insert("a", ids, _vectors(ids), 0)
+        self.assertEqual(len(cache), 3)
+        ids = np.array([7, 5, 3, 3], dtype=np.int64)
+        hit, vectors = cache.lookup("a", ids, 0)
+        self.assertListEqual(hit.tolist(), [True, False, True, True])
+        np.testing.assert_array_equal(vectors, _vectors([7, 3, 3]))
+
+        # Tables are cached separately
+        hit, _ = cache.lookup("b", ids, 0)
+        self.assertFalse(hit.any())
+
+        # A vector is replaced by the one pulled later
+        cache.insert("a", np.array([3]), _vectors([30]), 0)
+        _, vectors = cache.lookup("a", np.array([3]), 0)
+        np.testing.assert_array_equal(vectors, _vectors([30]))
+        self.assertEqual(len(cache), 3)
+
+    def test_staleness(self):
+        cache = EmbeddingCache(10, staleness=2)
+        cache.insert("a", np.array([1, 2]), _vectors([1, 2]), 3)
+        cache.insert("a", np.array([3]), _vectors([3]), 4)
+        self.assertListEqual(
+            self._cached_ids(cache, "a", [1, 2, 3], 5), [1, 2, 3]
+        )
+        self.assertListEqual(self._cached_ids(cache, "a", [1, 2, 3], 6), [3])
+        self.assertListEqual(self._cached_ids(cache, "a", [1, 2, 3], 7), [])
+
+    def test_lru(self):
+        cache = EmbeddingCache(4, EmbeddingEvictionPolicy.LRU)
+        cache.insert("a", np.arange(4), _vectors(range(4)), 0)
+        cache.lookup("a", np.array([0]), 0)
+        cache.lookup("a", np.array([2, 1]), 0)
+        # 3 and then 0 are the least recently used
+        cache.insert("a", np.array([4, 5]), _vectors([4, 5]), 0)
+        self.assertEqual(len(cache), 4)
+        self.assertListEqual(
+            self._cached_ids(cache, "a", range(6), 0), [1, 2, 4, 5]
+        )
+        _, vectors = cache.lookup("a", np.array([5, 1, 4, 2]), 0)
+        np.testing.assert_array_equal(vectors, _vectors([5, 1, 4, 2]))
+
+    def test_lfu(self):
+        cache = EmbeddingCache(4, EmbeddingEvictionPolicy.LFU)
+        cache.insert("a", np.arange(4), _vectors(range(4)), 0)
+        cache.lookup("a", np.array([0, 0, 1]), 0)
+        cache.lookup("a", np.array([3]), 0)
+        cache.lookup("a", np.array([0]), 0)
+        # 2 is the least frequently used but it is inserted again, so 1
+        # and 3 are evicted.
+        cache.insert("a", np.array([2, 4, 5]), _vectors([2, 4, 5]), 0)
+        self.assertListEqual(
+            self._cached_ids(cache, "a", range(6), 0), [0, 2, 4, 5]
+        )
+
+    def test_evict_stale_vectors_first(self):
+        cache = EmbeddingCache(3, staleness=1)
+        cache.insert("a", np.array([0]), _vectors([0]), 0)
+        cache.insert("a", np.array([1, 2]), _vectors([1, 2]), 2)
+        cache.lookup("a", np.array([0]), 1)
+        # 0 is the most recently used, but it is stale at version 2.
+        cache.insert("a", np.array([3]), _vectors([3]), 2)
+        self.assertListEqual(
+            self._cached_ids(cache, "a", range(4), 2), [1, 2, 3]
+        )
+
+    def test_insert_more_than_capacity(self):
+        cache = EmbeddingCache(3)
+        cache.insert("a", np.arange(2), _vectors(range(2)), 0)
+        cache.insert("a", np.arange(10), _vectors(range(10)), 0)
+        self.assertEqual(len(cache), 3)
+        hit, vectors = cache.lookup("a", np.arange(10), 0)
+        np.testing.assert_array_equal(vectors, _vectors(np.arange(10)[hit]))
+
+    def test_evict_in_bulk(self):
+        cache = EmbeddingCache(100)
+        cache.insert("a", np.arange(100), _vectors(range(100)), 0)
+        # 0 to 10 are the least recently used
+        cache.lookup("a", np.arange(11, 100), 0)
+        # 10% of the capacity is evicted besides the row for the new id
+        cache.insert("a", np.array([100]), _vectors([100]), 0)
+        self.assertEqual(len(cache), 90)
+        hit, _ = cache.lookup("a", np.arange(101), 0)
+        self.assertListEqual(
+            np.flatnonzero(hit).tolist(), list(range(11, 101))
+        )
+        # The next inserts fill the evicted rows without evicting
+        for i in range(101, 111):
+            cache.insert("a", np.array([i]), _vectors([i]), 0)
+        self.assertEqual(len(cache), 100)
+        hit, vectors = cache.lookup("a", np.arange(111), 0)
+        self.assertEqual(np.count_nonzero(hit), 100)
+        np.testing.assert_array_equal(vectors, _vectors(np.arange(111)[hit]))
+
+
+if __name__ == "__main__":
+    unittest.main()
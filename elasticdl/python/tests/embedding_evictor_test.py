@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from elasticdl.python.common.constants import EmbeddingEvictionPolicy
+from elasticdl.python.ps.embedding_evictor import EmbeddingEvictor
+from elasticdl.python.ps.embedding_table import EmbeddingTable
+
+
+class EmbeddingEvictorTest(unittest.TestCase):
+    def setUp(self):
+        self.table = EmbeddingTable("embedding_1", 4, "uniform")
+        # Rows are accessed 1, 3, 3 and 2 times, and they are accessed
+        # in the order of their ids at last.
+        self.table.get([0, 1, 2, 3])
+        self.table.get([1, 2])
+        self.table.get([1])
+        self.table.get([2])
+        self.table.get([3])
+
+    def test_invalid_args(self):
+        with self.assertRaises(ValueError):
+            EmbeddingEvictor("fifo")
+        with self.assertRaises(ValueError):
+            EmbeddingEvictor(EmbeddingEvictionPolicy.LRU, max_rows=0)
+        with self.assertRaises(ValueError):
+            EmbeddingEvictor(EmbeddingEvictionPolicy.TTL, ttl=0)
+
+    def test_lru(self):
+        evictor = EmbeddingEvictor(EmbeddingEvictionPolicy.LRU, max_rows=2)
+        ids = evictor.select_ids(self.table, version=0)
+        self.assertListEqual(sorted(ids.tolist()), [0, 1])
+
+        evictor = EmbeddingEvictor(EmbeddingEvictionPolicy.LRU, max_rows=4)
+        self.assertEqual(evictor.select_ids(self.table, version=0).size, 0)
+
+    def test_lfu(self):
+        evictor = EmbeddingEvictor(EmbeddingEvictionPolicy.LFU, max_rows=2)
+        ids = evictor.select_ids(self.table, version=0)
+        self.assertListEqual(sorted(ids.tolist()), [0, 3])
+
+    def test_ttl(self):
+        values = np.zeros((2, 4), dtype=np.float32)
+        self.table.set([0, 1], values, version=5)
+        self.table.set([2], values[:1], version=8)
+        # Id 1 is only pulled after it is updated
+        self.table.get([1], version=9)
+        evictor = EmbeddingEvictor(EmbeddingEvictionPolicy.TTL, ttl=3)
+        ids = evictor.select_ids(self.table, version=10)
+        # Id 3 is never accessed with a version and its access version is 0
+        self.assertListEqual(sorted(ids.tolist()), [0, 3])
+
+    def test_remove(self):
+        vectors = self.table.get([1, 2])
+        self.assertEqual(self.table.remove([0, 3, 100]), 2)
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.evicted_count, 2)
+        self.assertListEqual(self.table.ids.tolist(), [1, 2])
+        np.testing.assert_array_equal(self.table.get([1, 2]), vectors)
+        self.assertListEqual(self.table.access_counts.tolist(), [5, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
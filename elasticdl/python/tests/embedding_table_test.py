@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 import numpy as np
@@ -37,13 +38,31 @@ class EmbeddingTableTest(unittest.TestCase):
         self.assertIsNone(res)
 
         self.table.get([0, 3, 8])
-        self.assertEqual(len(self.table.embedding_vectors), 4)
+        self.assertEqual(len(self.table), 4)
+
+    def test_embedding_table_batch_initialization(self):
+        dim = 16
+        table = EmbeddingTable("glorot", dim, "glorot_uniform")
+        values = table.get(np.arange(2000))
+        # A vector of shape (dim,) from glorot_uniform is uniformly
+        # distributed in [-sqrt(3 / dim), sqrt(3 / dim)].
+        limit = np.sqrt(3.0 / dim)
+        self.assertLessEqual(np.abs(values).max(), limit)
+        self.assertGreater(np.abs(values).max(), 0.9 * limit)
+
+        table = EmbeddingTable("normal", dim, "random_normal")
+        values = table.get(np.arange(2000))
+        self.assertAlmostEqual(values.std(), 0.05, delta=0.005)
 
     def test_embedding_table_set(self):
         self.table.clear()
         indices = [0, 1, 4]
         x = len(indices)
-        values = np.random.uniform(size=x * self.dim).reshape((x, self.dim))
+        values = (
+            np.random.uniform(size=x * self.dim)
+            .reshape((x, self.dim))
+            .astype(np.float32)
+        )
         self.table.set(indices, values)
 
         row0 = self.table.get([0])
@@ -54,6 +73,89 @@ class EmbeddingTableTest(unittest.TestCase):
         rows = np.concatenate(rows)
         np.testing.assert_array_equal(rows, values)
 
+    def test_embedding_table_grow(self):
+        self.table.clear()
+        ids = np.arange(5000, dtype=np.int64)[::-1]
+        values = np.random.uniform(size=(len(ids), self.dim)).astype(
+            np.float32
+        )
+        self.table.set(ids, values)
+        self.assertEqual(len(self.table), len(ids))
+        np.testing.assert_array_equal(self.table.get(ids), values)
+
+        tensor = self.table.to_tensor()
+        np.testing.assert_array_equal(tensor.indices, ids)
+        np.testing.assert_array_equal(tensor.values, values)
+        self.assertEqual(self.table.get_table_size(), len(ids) * self.dim * 4)
+
+    def test_embedding_table_slots(self):
+        self.table.clear()
+        values = np.random.uniform(size=(2, self.dim)).astype(np.float32)
+        self.table.set([1, 5], values)
+        self.table.create_slots(["m", "v"], [0.5, 1.5])
+        self.assertEqual(self.table.row_dim, 3 * self.dim)
+        np.testing.assert_array_equal(self.table.get([1, 5]), values)
+        np.testing.assert_array_equal(self.table.get_slot("m", [1, 5]), 0.5)
+        np.testing.assert_array_equal(self.table.get_slot("v", [1, 5]), 1.5)
+
+        # New rows get initial slot values.
+        rows = self.table.get_with_slots([5, 8])
+        self.assertTupleEqual(rows.shape, (2, 3 * self.dim))
+        embedding, m, v = np.split(rows, 3, axis=1)
+        np.testing.assert_array_equal(embedding[0], values[1])
+        np.testing.assert_array_equal(m, 0.5)
+        np.testing.assert_array_equal(v, 1.5)
+
+        rows = np.random.uniform(size=(2, 3 * self.dim)).astype(np.float32)
+        self.table.set_with_slots([8, 9], rows)
+        embedding, m, v = np.split(rows, 3, axis=1)
+        np.testing.assert_array_equal(self.table.get([8, 9]), embedding)
+        np.testing.assert_array_equal(self.table.get_slot("v", [8, 9]), v)
+
+        # Setting a slot of a new row initializes its embedding vector.
+        self.table.set_slot("m", [10], np.zeros((1, self.dim)))
+        self.assertTrue(self.table.get([10]).any())
+        np.testing.assert_array_equal(self.table.get_slot("v", [10]), 1.5)
+
+        self.assertEqual(self.table.remove([5]), 1)
+        np.testing.assert_array_equal(self.table.get_with_slots([8]), rows[:1])
+        # Rows 1, 8, 9 and 10 remain
+        self.assertEqual(self.table.get_table_size(), 4 * self.dim * 4)
+        self.assertEqual(self.table.get_slots_size(), 2 * 4 * self.dim * 4)
+        with self.assertRaisesRegex(ValueError, "not in embedding table"):
+            self.table.get_slot("momentum", [1])
+
+    def test_embedding_table_update_with_slots(self):
+        self.table.clear()
+        self.table.create_slots(["accumulator"], [0.0])
+        ids = np.arange(100)
+        self.table.set(ids, np.zeros((len(ids), self.dim)))
+
+        def _add_one(values, positions):
+            values += 1
+
+        def _update(thread_id):
+            # Threads update overlapping ids and create new ids
+            for i in range(20):
+                self.table.update_with_slots(
+                    np.arange(i, i + 50), _add_one, version=i
+                )
+                self.table.get([1000 * (thread_id + 1) + i])
+
+        threads = [
+            threading.Thread(target=_update, args=(i,)) for i in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        expected = 4 * np.minimum(np.minimum(ids + 1, 20), 69 - ids).clip(0)
+        values = self.table.get_with_slots(ids)
+        np.testing.assert_array_equal(values[:, 0], expected)
+        np.testing.assert_array_equal(values[:, -1], expected)
+        self.assertEqual(len(self.table), 100 + 4 * 20)
+
     def test_create_embedding_table(self):
         embedding_pb = EmbeddingTableInfo()
         embedding_pb.name = self.name
@@ -0,0 +1,115 @@
+import unittest
+
+import numpy as np
+
+from elasticdl.python.common.tensor import Tensor
+from elasticdl.python.ps.gradient_accumulator import (
+    DenseGradientAccumulator,
+    SparseGradientAccumulator,
+    add_gradients,
+    create_gradient_accumulator,
+)
+
+
+class GradientAccumulatorTest(unittest.TestCase):
+    def test_dense_accumulator(self):
+        grads = [np.random.rand(3, 2).astype(np.float32) for _ in range(3)]
+        first_grad = grads[0].copy()
+        accumulator = create_gradient_accumulator(Tensor(grads[0], name="v"))
+        self.assertIsInstance(accumulator, DenseGradientAccumulator)
+        for grad in grads:
+            accumulator.add(Tensor(grad, name="v"))
+        self.assertEqual(accumulator.count, 3)
+        buffer = accumulator.get().values
+        np.testing.assert_allclose(buffer, sum(grads), rtol=1e-6)
+        # The input gradients are not modified
+        np.testing.assert_array_equal(grads[0], first_grad)
+
+        # The buffer is reused after reset
+        accumulator.reset()
+        self.assertEqual(accumulator.count, 0)
+        accumulator.add(Tensor(grads[1], name="v"))
+        tensor = accumulator.get()
+        self.assertIs(tensor.values, buffer)
+        self.assertEqual(tensor.name, "v")
+        np.testing.assert_array_equal(tensor.values, grads[1])
+
+        with self.assertRaises(NotImplementedError):
+            accumulator.add(Tensor(grads[0], np.arange(3), "v"))
+
+        # The accumulated sum is kept if a gradient of another shape is added
+        with self.assertRaises(ValueError):
+            accumulator.add(Tensor(np.ones((2, 2), np.float32), name="v"))
+        self.assertEqual(accumulator.count, 1)
+        np.testing.assert_array_equal(accumulator.get().values, grads[1])
+
+        # The shape of the buffer changes only if no gradient is accumulated
+        accumulator.reset()
+        accumulator.add(Tensor(np.ones((2, 2), np.float32), name="v"))
+        np.testing.assert_array_equal(
+            accumulator.get().values, np.ones((2, 2))
+        )
+
+    def test_sparse_accumulator(self):
+        accumulator = create_gradient_accumulator(
+            Tensor(np.ones((1, 2)), np.array([0]), "e")
+        )
+        self.assertIsInstance(accumulator, SparseGradientAccumulator)
+        expected = {}
+        rng = np.random.RandomState(0)
+        for _ in range(10):
+            ids = rng.randint(0, 50, size=20)
+            values = rng.rand(20, 2).astype(np.float32)
+            accumulator.add(Tensor(values, ids, "e"))
+            for i, value in zip(ids, values):
+                expected[i] = expected.get(i, 0) + value
+
+        tensor = accumulator.get()
+        self.assertEqual(tensor.name, "e")
+        # Duplicated ids are merged into one row
+        self.assertEqual(len(tensor.indices), len(expected))
+        self.assertEqual(len(set(tensor.indices.tolist())), len(expected))
+        for i, value in zip(tensor.indices, tensor.values):
+            np.testing.assert_allclose(value, expected[i], rtol=1e-5)
+
+        accumulator.reset()
+        accumulator.add(
+            Tensor(np.ones((3, 2), np.float32), np.array([7, 100, 7]), "e")
+        )
+        tensor = accumulator.get()
+        self.assertListEqual(tensor.indices.tolist(), [7, 100])
+        np.testing.assert_array_equal(tensor.values, [[2, 2], [1, 1]])
+
+        with self.assertRaises(NotImplementedError):
+            accumulator.add(Tensor(np.ones((3, 2)), name="e"))
+
+        with self.assertRaises(ValueError):
+            accumulator.add(Tensor(np.ones((1, 3)), np.array([7]), "e"))
+        tensor = accumulator.get()
+        self.assertListEqual(tensor.indices.tolist(), [7, 100])
+        np.testing.assert_array_equal(tensor.values, [[2, 2], [1, 1]])
+
+    def test_add_gradients(self):
+        dense = DenseGradientAccumulator("v")
+        sparse = SparseGradientAccumulator("e")
+        dense_grad = Tensor(np.ones((2, 2), np.float32), name="v")
+        sparse_grad = Tensor(np.ones((1, 2), np.float32), np.array([3]), "e")
+        dense.add(dense_grad)
+        add_gradients([sparse, dense], [sparse_grad, dense_grad])
+        self.assertEqual(dense.count, 2)
+        self.assertEqual(sparse.count, 1)
+
+        # No gradient is added if one of them can not be added
+        with self.assertRaises(ValueError):
+            add_gradients(
+                [sparse, dense],
+                [sparse_grad, Tensor(np.ones((3, 2)), name="v")],
+            )
+        self.assertEqual(sparse.count, 1)
+        self.assertEqual(dense.count, 2)
+        np.testing.assert_array_equal(sparse.get().values, [[1, 1]])
+        np.testing.assert_array_equal(dense.get().values, np.full((2, 2), 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
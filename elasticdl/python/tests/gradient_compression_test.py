@@ -0,0 +1,122 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from elasticdl.proto import elasticdl_pb2, tensor_dtype_pb2
+from elasticdl.python.common.constants import GradientCompression
+from elasticdl.python.common.gradient_compression import (
+    GradientCompressor,
+    bfloat16_bits_to_float32,
+    deserialize_gradient_pb,
+    float32_to_bfloat16_bits,
+)
+
+
+class GradientCompressionTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.grad = rng.normal(size=(10, 20)).astype(np.float32)
+
+    def _round_trip(self, compressor, grad, name="dense"):
+        request = elasticdl_pb2.PushGradientRequest()
+        compressor.emplace_gradient_pb(request.gradients, grad, name)
+        pb = request.gradients[0]
+        size = pb.ByteSize()
+        tensor = deserialize_gradient_pb(pb)
+        self.assertEqual(tensor.name, name)
+        return tensor, size
+
+    def test_bfloat16_rounding(self):
+        values = np.concatenate(
+            [self.grad.reshape(-1), [0.0, -0.0, 1e-40, 3e38, -np.inf]]
+        ).astype(np.float32)
+        bits = float32_to_bfloat16_bits(values)
+        expected = tf.cast(tf.cast(values, tf.bfloat16), tf.float32).numpy()
+        np.testing.assert_array_equal(bfloat16_bits_to_float32(bits), expected)
+        nan_bits = float32_to_bfloat16_bits(
+            np.array([np.nan], dtype=np.float32)
+        )
+        self.assertTrue(np.isnan(bfloat16_bits_to_float32(nan_bits)).all())
+
+    def test_no_compression(self):
+        tensor, _ = self._round_trip(GradientCompressor(), self.grad)
+        np.testing.assert_array_equal(tensor.values, self.grad)
+
+    def test_fp16(self):
+        compressor = GradientCompressor(GradientCompression.FP16)
+        tensor, size = self._round_trip(compressor, tf.constant(self.grad))
+        self.assertEqual(tensor.values.dtype, np.float32)
+        np.testing.assert_allclose(tensor.values, self.grad, rtol=1e-3)
+        self.assertLess(size, self.grad.nbytes * 0.6)
+
+    def test_bf16(self):
+        compressor = GradientCompressor(GradientCompression.BF16)
+        tensor, size = self._round_trip(compressor, self.grad)
+        self.assertEqual(tensor.values.dtype, np.float32)
+        self.assertTupleEqual(tensor.values.shape, self.grad.shape)
+        np.testing.assert_allclose(tensor.values, self.grad, rtol=1e-2)
+        self.assertLess(size, self.grad.nbytes * 0.6)
+
+    def test_top_k_error_feedback(self):
+        compressor = GradientCompressor(GradientCompression.TOP_K, 0.1)
+        pushed = np.zeros_like(self.grad)
+        for _ in range(3):
+            tensor, size = self._round_trip(compressor, self.grad)
+            compressor.update_residuals(["dense"])
+            self.assertEqual(np.count_nonzero(tensor.values), 20)
+            pushed += tensor.values
+        # An int64 index and a float32 value for each pushed element
+        self.assertLess(size, self.grad.nbytes * 0.1 * 3 + 32)
+        # Elements not pushed are kept as residuals
+        residual = compressor._residuals["dense"].reshape(self.grad.shape)
+        np.testing.assert_allclose(
+            pushed + residual, self.grad * 3, rtol=1e-5, atol=1e-5
+        )
+
+        # The residuals of a rejected gradient stay unchanged
+        self._round_trip(compressor, self.grad)
+        compressor.update_residuals([])
+        np.testing.assert_array_equal(
+            compressor._residuals["dense"].reshape(self.grad.shape), residual
+        )
+
+    def test_top_k_of_small_gradient(self):
+        compressor = GradientCompressor(GradientCompression.TOP_K, 0.1)
+        grad = np.array([3.0, -1.0], dtype=np.float32)
+        tensor, _ = self._round_trip(compressor, grad)
+        np.testing.assert_array_equal(tensor.values, [3.0, 0.0])
+
+    def test_uncompressed_gradients(self):
+        compressor = GradientCompressor(GradientCompression.TOP_K, 0.1)
+        grad = tf.IndexedSlices(tf.constant(self.grad), tf.range(10))
+        tensor, _ = self._round_trip(compressor, grad)
+        np.testing.assert_array_equal(tensor.values, self.grad)
+        np.testing.assert_array_equal(tensor.indices, np.arange(10))
+
+        grad = self.grad.astype(np.float64)
+        tensor, _ = self._round_trip(compressor, grad)
+        np.testing.assert_array_equal(tensor.values, grad)
+
+    def test_invalid_compressed_gradient(self):
+        pb = elasticdl_pb2.Tensor()
+        pb.dim.extend([2, 3])
+        pb.dtype = tensor_dtype_pb2.DT_FLOAT32
+        pb.compression = GradientCompression.TOP_K
+        pb.content = np.ones(2, dtype=np.float32).tobytes()
+        pb.indices_content = np.array([0, 6], dtype=np.int64).tobytes()
+        with self.assertRaises(ValueError):
+            deserialize_gradient_pb(pb)
+
+        pb.compression = "unknown"
+        with self.assertRaises(ValueError):
+            deserialize_gradient_pb(pb)
+
+        with self.assertRaises(ValueError):
+            GradientCompressor("unknown")
+        with self.assertRaises(ValueError):
+            GradientCompressor(GradientCompression.TOP_K, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
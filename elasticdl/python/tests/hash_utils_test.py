@@ -4,6 +4,7 @@ import numpy as np
 
 from elasticdl.python.common.hash_utils import (
     int_to_id,
+    partition_ids,
     scatter_embedding_vector,
 )
 
@@ -38,7 +39,25 @@ class HashUtilTest(unittest.TestCase):
             np.testing.assert_array_equal(
                 results[ps_id][0], expected_results[ps_id][0]
             )
-            self.assertListEqual(results[ps_id][1], expected_results[ps_id][1])
+            np.testing.assert_array_equal(
+                results[ps_id][1], expected_results[ps_id][1]
+            )
+
+    def test_partition_ids(self):
+        ids = np.array([8, 1, 7, 2, 5, 14, 11])
+        num = 3
+        order, offsets, inverse = partition_ids(ids, num)
+        self.assertEqual(len(offsets), num + 1)
+        for ps_id in range(num):
+            begin, end = offsets[ps_id], offsets[ps_id + 1]
+            bucket_ids = ids[order[begin:end]]
+            expected_ids = [i for i in ids if int_to_id(i, num) == ps_id]
+            self.assertListEqual(bucket_ids.tolist(), expected_ids)
+        np.testing.assert_array_equal(ids[order][inverse], ids)
+
+        order, offsets, inverse = partition_ids(np.array([], np.int64), num)
+        self.assertEqual(order.size, 0)
+        self.assertListEqual(offsets.tolist(), [0] * (num + 1))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from elasticdl.python.ps.id_index import IdIndex
+
+
+class IdIndexTest(unittest.TestCase):
+    def test_insert_and_lookup(self):
+        index = IdIndex()
+        ids = np.array([8, 1, 7, 1 << 40], dtype=np.int64)
+        index.insert(ids, np.arange(4, dtype=np.int64))
+        self.assertEqual(len(index), 4)
+
+        rows = index.lookup(np.array([7, 3, 8, 1 << 40, 7], dtype=np.int64))
+        self.assertListEqual(rows.tolist(), [2, -1, 0, 3, 2])
+
+    def test_rehash(self):
+        index = IdIndex()
+        ids = np.unique(np.random.randint(1 << 50, size=10000))
+        np.random.shuffle(ids)
+        rows = np.arange(len(ids), dtype=np.int64)
+        for i in range(0, len(ids), 1000):
+            index.insert(ids[i : i + 1000], rows[i : i + 1000])  # noqa: E203
+        self.assertEqual(len(index), len(ids))
+        np.testing.assert_array_equal(index.lookup(ids), rows)
+
+        items_ids, items_rows = index.items()
+        order = np.argsort(items_rows)
+        np.testing.assert_array_equal(items_ids[order], ids)
+
+    def test_reset(self):
+        index = IdIndex()
+        index.insert(np.array([1, 2], dtype=np.int64), np.array([0, 1]))
+        index.reset(np.array([5, 2], dtype=np.int64))
+        rows = index.lookup(np.array([1, 2, 5], dtype=np.int64))
+        self.assertListEqual(rows.tolist(), [-1, 1, 0])
+
+        index.reset()
+        self.assertEqual(len(index), 0)
+
+    def test_clear(self):
+        index = IdIndex()
+        ids = np.arange(3000, dtype=np.int64)
+        index.insert(ids, ids)
+        capacity = len(index._keys)
+        index.clear()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(len(index._keys), capacity)
+        self.assertListEqual(index.lookup(ids[:3]).tolist(), [-1, -1, -1])
+        index.insert(ids[:2], np.array([5, 6], dtype=np.int64))
+        self.assertListEqual(index.lookup(ids[:3]).tolist(), [5, 6, -1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -262,14 +262,23 @@ class EmbeddingLayerTest(unittest.TestCase):
                 layer.reset()
 
         # Test when an embedding layer is called more than once.
-        # When an embedding layer is called more than once, `tf.function` is
-        # not supported.
         correct_ids_list = [[0, 1, 3, 1, 2, 0], [0, 10, 3, 11, 2, 1]]
-        with tf.GradientTape() as tape:
-            layer.set_tape(tape)
-            for inputs in inputs_list:
-                _ = layer.call(inputs)
+
+        def _call_more_than_once(inputs_list):
+            return [layer.call(inputs) for inputs in inputs_list]
+
+        call_fns = [_call_more_than_once, tf.function(_call_more_than_once)]
+        for call_fn in call_fns:
+            with tf.GradientTape() as tape:
+                layer.set_tape(tape)
+                outputs = call_fn(inputs_list)
+                output = tf.add_n(outputs) * multiply_tensor
             self.assertTrue(len(layer.embedding_and_ids) == len(inputs_list))
+            batch_embeddings = [
+                batch_embedding
+                for batch_embedding, _ in layer.embedding_and_ids
+            ]
+            grads = tape.gradient(output, batch_embeddings)
             for i, correct_ids in enumerate(correct_ids_list):
                 self.assertTrue(
                     (
@@ -277,6 +286,35 @@ class EmbeddingLayerTest(unittest.TestCase):
                         == correct_ids
                     ).all()
                 )
+                self.assertTrue(
+                    (grads[i].values.numpy() == multiply_values).all()
+                )
+            layer.reset()
+
+        # Test when an embedding layer is called twice in a branch of
+        # `tf.cond`, which is traced in a nested function graph. Each call
+        # records its own BET.
+        @tf.function
+        def _call_in_cond(inputs_list):
+            output = layer.call(inputs_list[0])
+            return output + tf.cond(
+                tf.reduce_all(inputs_list[0] >= 0),
+                lambda: tf.add_n(_call_more_than_once(inputs_list)),
+                lambda: tf.zeros_like(output),
+            )
+
+        layer.set_tape(tf.GradientTape())
+        _call_in_cond(inputs_list)
+        self.assertEqual(len(layer.embedding_and_ids), 3)
+        for i, correct_ids in enumerate(
+            correct_ids_list[:1] + correct_ids_list
+        ):
+            self.assertTrue(
+                (
+                    layer.embedding_and_ids[i].batch_ids.numpy() == correct_ids
+                ).all()
+            )
+        layer.reset()
 
     def test_embedding_layer_gradient_with_sparse_inputs(self):
         output_dim = 8
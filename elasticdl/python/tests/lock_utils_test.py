@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from elasticdl.python.common.lock_utils import RWLock, StripedRWLock
+
+
+class RWLockTest(unittest.TestCase):
+    def test_concurrent_readers(self):
+        lock = RWLock()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def _read():
+            with lock.read_lock():
+                # All readers hold the lock at the same time
+                barrier.wait()
+
+        threads = [threading.Thread(target=_read) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertFalse(barrier.broken)
+
+    def test_exclusive_writer(self):
+        lock = RWLock()
+        events = []
+
+        def _write():
+            with lock.write_lock():
+                events.append("write")
+
+        lock.acquire_read()
+        writer = threading.Thread(target=_write)
+        writer.start()
+        time.sleep(0.1)
+        events.append("read")
+        lock.release_read()
+        writer.join()
+        self.assertListEqual(events, ["read", "write"])
+
+    def test_waiting_writer_blocks_new_readers(self):
+        lock = RWLock()
+        events = []
+
+        def _write():
+            with lock.write_lock():
+                events.append("write")
+
+        def _read():
+            with lock.read_lock():
+                events.append("read")
+
+        lock.acquire_read()
+        writer = threading.Thread(target=_write)
+        writer.start()
+        time.sleep(0.1)
+        reader = threading.Thread(target=_read)
+        reader.start()
+        time.sleep(0.1)
+        self.assertListEqual(events, [])
+        lock.release_read()
+        writer.join()
+        reader.join()
+        self.assertListEqual(events, ["write", "read"])
+
+
+class StripedRWLockTest(unittest.TestCase):
+    def test_group_by_stripe(self):
+        lock = StripedRWLock(4)
+        self.assertEqual(len(lock), 4)
+        keys = np.array([5, 2, 9, -3, 6, 13], dtype=np.int64)
+        groups = lock.group_by_stripe(keys)
+        self.assertListEqual([stripe for stripe, _ in groups], [1, 2])
+        np.testing.assert_array_equal(groups[0][1], [0, 2, 3, 5])
+        np.testing.assert_array_equal(groups[1][1], [1, 4])
+
+    def test_invalid_num_stripes(self):
+        with self.assertRaises(ValueError):
+            StripedRWLock(6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -101,8 +101,8 @@ def _train_edl_embedding_with_optimizer_wrapper(
     tf.random.set_seed(random_seed)
     opt_wrapper = OptimizerWrapper(
         opt_keras,
-        lookup_embedding_func=params.get_embedding_param,
-        update_embedding_func=params.set_embedding_param,
+        lookup_embedding_func=params.get_embedding_param_with_slots,
+        update_embedding_func=params.set_embedding_param_with_slots,
     )
 
     embed_layers = find_layer(model, Embedding)
@@ -204,24 +204,20 @@ class OptimizerWrapperTest(unittest.TestCase):
         indices = np.ndarray([2], dtype=np.int32)
         embed_values = np.ndarray([2, 2], dtype=np.float32)
         slot_values = {
-            "m": np.ndarray([2, 2], dtype=np.float32),
-            "v": np.ndarray([2, 2], dtype=np.float32),
+            "m": np.random.rand(2, 2).astype(np.float32),
+            "v": np.random.rand(2, 2).astype(np.float32),
         }
-        params = Parameters()
-        params.embedding_params[embed_name] = EmbeddingTable(embed_name, 8)
-        for slot in ["m", "v"]:
-            slot_table_name = get_slot_table_name(embed_name, slot)
-            params.embedding_params[slot_table_name] = EmbeddingTable(
-                slot_table_name, 2, "0.0", True
-            )
 
         opt = Adam()
-        opt_wrapper = OptimizerWrapper(opt, None, params.get_embedding_param)
+        opt_wrapper = OptimizerWrapper(opt, None, None)
         opt_wrapper._init_thread_local()
 
         opt_wrapper._tls._unique_ids_all_layers[embed_name] = indices
         opt_wrapper._create_embedding_variable(embed_name, embed_values)
-        opt_wrapper._get_slot_and_set_to_optimizer(embed_name)
+        opt_wrapper._set_slots_to_optimizer(
+            embed_name,
+            [slot_values[name] for name in opt_wrapper.allowed_slot_names],
+        )
 
         self.assertEqual(len(opt._slots), 1)
         opt_slots = list(opt._slots.values())[0]
@@ -235,10 +231,7 @@ class OptimizerWrapperTest(unittest.TestCase):
         params = Parameters()
         for name in ["test_1", "test_2"]:
             params.embedding_params[name] = EmbeddingTable(name, 8)
-            slot_key = get_slot_table_name(name, "momentum")
-            params.embedding_params[slot_key] = EmbeddingTable(
-                slot_key, 8, "0.0", True
-            )
+        params.create_slot_params(["momentum"], [0.0])
 
         indices = {
             "test_1": np.array([1, 5]),
@@ -263,7 +256,7 @@ class OptimizerWrapperTest(unittest.TestCase):
 
         opt = SGD(momentum=0.1)
         opt_wrapper = OptimizerWrapper(
-            opt, None, None, params.set_embedding_param
+            opt, None, None, params.set_embedding_param_with_slots
         )
         opt_wrapper._tls._unique_ids_all_layers = indices
         opt_wrapper._tls._embed_variables = embed_vars
@@ -288,22 +281,11 @@ class OptimizerWrapperTest(unittest.TestCase):
             )
 
     def test_delete_variables(self):
-        params = Parameters()
         embed_layers = ["test_1", "test_2"]
-        slot_names = ["m", "v"]
         dim = 8
-        for layer in embed_layers:
-            params.embedding_params[layer] = EmbeddingTable(layer, dim)
-            for slot in slot_names:
-                slot_key = get_slot_table_name(layer, slot)
-                params.embedding_params[slot_key] = EmbeddingTable(
-                    slot_key, dim, "0.0", True
-                )
 
         opt = Adam()
-        opt_wrapper = OptimizerWrapper(
-            opt, None, params.get_embedding_param, params.set_embedding_param
-        )
+        opt_wrapper = OptimizerWrapper(opt, None, None, None)
 
         opt_wrapper._init_thread_local()
         for name in embed_layers:
@@ -313,7 +295,9 @@ class OptimizerWrapperTest(unittest.TestCase):
             opt_wrapper._create_embedding_variable(
                 name, np.ndarray([2, dim], np.float32)
             )
-            opt_wrapper._get_slot_and_set_to_optimizer(name)
+            opt_wrapper._set_slots_to_optimizer(
+                name, [np.ndarray([2, dim], np.float32)] * 2
+            )
 
         self.assertTrue(len(opt._weights) == 4)
         self.assertTrue(len(opt._slots) == 2)
@@ -468,8 +452,8 @@ class OptimizerWrapperTest(unittest.TestCase):
         opt_wrapper = OptimizerWrapper(
             opt,
             True,
-            lookup_embedding_func=params.get_embedding_param,
-            update_embedding_func=params.set_embedding_param,
+            lookup_embedding_func=params.get_embedding_param_with_slots,
+            update_embedding_func=params.set_embedding_param_with_slots,
         )
 
         # call optimizer_wrapper.apply_gradients asynchronously
@@ -0,0 +1,126 @@
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+from elasticdl.python.data.parallel_task_reader import ParallelTaskReader
+from elasticdl.python.data.reader.data_reader import AbstractDataReader
+
+_MockedTask = namedtuple("_MockedTask", ["start", "end", "shard_name"])
+
+
+class _RangeDataReader(AbstractDataReader):
+    """Reads the record ids of a task, skipping empty records at ids which
+    are multiples of 10, and fails in shard "bad"."""
+
+    def read_records(self, task):
+        if task.shard_name == "bad":
+            raise ValueError("Bad shard")
+        for i in range(task.start, task.end):
+            yield "%s:%d" % (task.shard_name, i) if i % 10 else ""
+
+    def create_shards(self):
+        pass
+
+
+def _parse_record(record):
+    shard_name, i = record.split(":")
+    return shard_name, int(i)
+
+
+def _expected_records(tasks):
+    return [
+        "%s:%d" % (task.shard_name, i)
+        for task in tasks
+        for i in range(task.start, task.end)
+        if i % 10
+    ]
+
+
+class ParallelTaskReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.reader = ParallelTaskReader(
+            _RangeDataReader(),
+            num_processes=3,
+            chunk_size=7,
+        )
+
+    def tearDown(self):
+        self.reader.close()
+
+    def test_read_in_order(self):
+        tasks = [
+            _MockedTask(start, start + size, "shard_%d" % (start % 3))
+            for start, size in zip(range(0, 1000, 50), [50, 3, 0, 41] * 5)
+        ]
+        records = list(self.reader.read(tasks))
+        self.assertListEqual(records, _expected_records(tasks))
+
+        # The tasks are got lazily
+        tasks = iter(tasks)
+        records = self.reader.read(tasks)
+        next(records)
+        self.assertEqual(len(list(tasks)), 20 - 2 * 3)
+
+    def test_read_after_unfinished_read(self):
+        tasks = [_MockedTask(0, 100, "a"), _MockedTask(0, 100, "b")]
+        records = self.reader.read(tasks)
+        self.assertEqual(next(records), "a:1")
+        records.close()
+
+        tasks = [_MockedTask(0, 30, "c")]
+        records = list(self.reader.read(tasks))
+        self.assertListEqual(records, _expected_records(tasks))
+
+    def test_read_error(self):
+        tasks = [_MockedTask(0, 20, "a"), _MockedTask(0, 20, "bad")]
+        records = self.reader.read(tasks)
+        with self.assertRaisesRegex(RuntimeError, "Bad shard"):
+            list(records)
+
+    def test_read_parsed_records(self):
+        reader = ParallelTaskReader(
+            _RangeDataReader(),
+            num_processes=2,
+            chunk_size=7,
+            record_parse_fn=_parse_record,
+            output_dtypes=[object, np.int64],
+        )
+        tasks = [_MockedTask(0, 30, "a"), _MockedTask(5, 20, "b")]
+        try:
+            chunks = list(reader.read(tasks))
+        finally:
+            reader.close()
+        for shard_names, ids in chunks:
+            self.assertLessEqual(len(shard_names), 7)
+            self.assertEqual(len(shard_names), len(ids))
+            self.assertEqual(ids.dtype, np.int64)
+        records = [
+            "%s:%d" % (shard_name, i)
+            for shard_names, ids in chunks
+            for shard_name, i in zip(shard_names, ids)
+        ]
+        self.assertListEqual(records, _expected_records(tasks))
+
+    def test_worker_process_exited(self):
+        tasks = [_MockedTask(0, 100, "a")]
+        records = self.reader.read(tasks)
+        self.assertEqual(next(records), "a:1")
+        for w in self.reader._workers:
+            w.kill()
+            w.join()
+        tasks = [_MockedTask(0, 100, "b")]
+        with self.assertRaisesRegex(RuntimeError, "exited"):
+            list(self.reader.read(tasks))
+
+    def test_close(self):
+        workers = self.reader._workers
+        self.reader.close()
+        for w in workers:
+            self.assertFalse(w.is_alive())
+        # Closing again does nothing
+        self.reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
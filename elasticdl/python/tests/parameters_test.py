@@ -4,7 +4,9 @@ import numpy as np
 import tensorflow as tf
 
 from elasticdl.proto.elasticdl_pb2 import EmbeddingTableInfo, Model
+from elasticdl.python.common.constants import EmbeddingEvictionPolicy
 from elasticdl.python.common.tensor import Tensor
+from elasticdl.python.ps.embedding_evictor import EmbeddingEvictor
 from elasticdl.python.ps.embedding_table import get_slot_table_name
 from elasticdl.python.ps.parameters import Parameters
 
@@ -88,6 +90,20 @@ class ParametersTest(unittest.TestCase):
         self.assertTrue("x" in self.params.non_embedding_params)
         self.assertTrue("y" in self.params.non_embedding_params)
 
+    def test_non_embedding_param_versions(self):
+        self.params.reset()
+        self.model_pb.version = 3
+        self.params.init_from_model_pb(self.model_pb)
+        self.assertEqual(self.params.get_non_embedding_param_version("x"), 3)
+        self.assertEqual(self.params.get_non_embedding_param_version("y"), 3)
+
+        self.params.version = 5
+        self.params.set_non_embedding_params_modified(["y"], 5)
+        self.assertEqual(self.params.get_non_embedding_param_version("x"), 3)
+        self.assertEqual(self.params.get_non_embedding_param_version("y"), 5)
+        # Unknown params are treated as modified in the current version
+        self.assertEqual(self.params.get_non_embedding_param_version("z"), 5)
+
     def test_get_embedding_param(self):
         self.params.reset()
         self.params.init_embedding_params(self.embeddings_pb)
@@ -98,8 +114,10 @@ class ParametersTest(unittest.TestCase):
         self.params.init_embedding_params(self.embeddings_pb)
         indices = [100, 34, 8]
         x = len(indices)
-        values = np.random.uniform(size=x * self.embedding_dim).reshape(
-            (x, self.embedding_dim)
+        values = (
+            np.random.uniform(size=x * self.embedding_dim)
+            .reshape((x, self.embedding_dim))
+            .astype(np.float32)
         )
 
         self.params.set_embedding_param(
@@ -149,6 +167,24 @@ class ParametersTest(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, "Keras embedding param error"):
             self.params.check_grad(grad3)
 
+        # Indices should be in [0, 3) for parameter "x" of shape (3, 4)
+        for indices in [[0, 3], [-1, 2]]:
+            grad4 = Tensor(
+                name="x",
+                values=np.random.uniform(size=(2, 4)),
+                indices=np.array(indices),
+            )
+            with self.assertRaisesRegex(
+                ValueError, "Keras embedding param error"
+            ):
+                self.params.check_grad(grad4)
+        grad4.indices = np.array([0, 2])
+        self.params.check_grad(grad4)
+
+        # The cached shape follows a replaced variable
+        self.params.non_embedding_params["x"] = tf.Variable(np.ones((3, 5)))
+        self.params.check_grad(grad1)
+
     def test_create_slot_params(self):
         # At first, no embedding table are in the parameters
         self.assertFalse(self.params.has_embedding_params())
@@ -162,6 +198,71 @@ class ParametersTest(unittest.TestCase):
         self.params.create_slot_params(slot_names, slot_init_value)
         self._test_get_embedding_param(slot_names, slot_init_value)
 
+    def test_evict_embedding_params(self):
+        self.params.reset()
+        self.params.init_embedding_params(self.embeddings_pb)
+        slot_names = ["m", "v"]
+        self.params.create_slot_params(slot_names, {"m": 0.0, "v": 0.0})
+        self.params.evict_embedding_params()
+
+        self.params.get_embedding_param(self.embedding_table_name, [0, 1, 2])
+        for slot in slot_names:
+            self.params.get_embedding_param(
+                get_slot_table_name(self.embedding_table_name, slot), [0, 1, 2]
+            )
+        self.params.get_embedding_param(self.embedding_table_name, [1, 2])
+
+        self.params.embedding_evictor = EmbeddingEvictor(
+            EmbeddingEvictionPolicy.LFU, max_rows=2
+        )
+        self.assertEqual(self.params.evict_embedding_params(), 1)
+        table = self.params.embedding_params[self.embedding_table_name]
+        self.assertListEqual(table.ids.tolist(), [1, 2])
+        self.assertTrue(
+            "Total evicted embedding rows: 1" in self.params.debug_info()
+        )
+
+    def test_embedding_param_with_slots(self):
+        self.params.reset()
+        self.params.init_embedding_params(self.embeddings_pb)
+        slot_names = ["m", "v"]
+        self.params.create_slot_params(slot_names, {"m": 1.0, "v": 2.0})
+        dim = self.embeddings_pb[0].dim
+        for slot in slot_names:
+            self.assertFalse(
+                get_slot_table_name(self.embedding_table_name, slot)
+                in self.params.embedding_params
+            )
+
+        indices = [0, 3]
+        values = self.params.get_embedding_param_with_slots(
+            self.embedding_table_name, indices
+        )
+        self.assertTupleEqual(values.shape, (2, 3 * dim))
+        _, m, v = np.split(values, 3, axis=1)
+        np.testing.assert_array_equal(m, 1.0)
+        np.testing.assert_array_equal(v, 2.0)
+
+        values = np.random.rand(2, 3 * dim).astype(np.float32)
+        self.params.set_embedding_param_with_slots(
+            self.embedding_table_name, indices, values
+        )
+        expected = np.split(values, 3, axis=1)
+        np.testing.assert_array_equal(
+            self.params.get_embedding_param(
+                self.embedding_table_name, indices
+            ),
+            expected[0],
+        )
+        for slot, slot_value in zip(slot_names, expected[1:]):
+            np.testing.assert_array_equal(
+                self.params.get_embedding_param(
+                    get_slot_table_name(self.embedding_table_name, slot),
+                    indices,
+                ),
+                slot_value,
+            )
+
     def test_export_to_model_pb(self):
         self.params.init_from_model_pb(self.model_pb)
         self.params.version = 15
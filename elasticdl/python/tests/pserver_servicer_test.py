@@ -1,12 +1,16 @@
 import os
 import tempfile
+import threading
 import unittest
+from unittest import mock
 
 import numpy as np
 import tensorflow as tf
 from google.protobuf import empty_pb2
 
 from elasticdl.proto import elasticdl_pb2, elasticdl_pb2_grpc
+from elasticdl.python.common.constants import GradientCompression
+from elasticdl.python.common.gradient_compression import GradientCompressor
 from elasticdl.python.common.grpc_utils import build_channel
 from elasticdl.python.common.model_utils import (
     get_module_file_path,
@@ -14,9 +18,14 @@ from elasticdl.python.common.model_utils import (
 )
 from elasticdl.python.common.save_utils import CheckpointSaver
 from elasticdl.python.common.tensor import (
+    Tensor,
+    TensorChunkAssembler,
+    emplace_tensor_chunk_pb,
     emplace_tensor_pb_from_ndarray,
+    split_tensor_to_chunks,
     tensor_pb_to_ndarray,
 )
+from elasticdl.python.ps import servicer as ps_servicer
 from elasticdl.python.ps.embedding_table import (
     EmbeddingTable,
     get_slot_table_name,
@@ -43,6 +52,7 @@ class PserverServicerTest(unittest.TestCase):
         embedding_info.initializer = "normal"
         self._embedding_info = embedding_info
         self._server = None
+        self._lr = 0.1
 
     def tearDown(self):
         if self._server:
@@ -200,6 +210,213 @@ class PserverServicerTest(unittest.TestCase):
         self.assertEqual(res.model.version, pull_req.current_model_version)
         self.assertTrue(not res.model.param)
 
+    def test_pull_variable_snapshot(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=1,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=False,
+        )
+        value = np.random.rand(3, 2).astype(np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        pull_req = elasticdl_pb2.PullVariableRequest()
+        pull_req.current_model_version = -1
+        res = servicer.pull_variable(pull_req, None)
+        snapshot = servicer._dense_snapshot
+        self.assertEqual(snapshot.version, 0)
+        self.assertEqual(res.model.version, 0)
+
+        # Pulls of the same version share the serialized response
+        self.assertIs(servicer.pull_variable(pull_req, None), res)
+        self.assertIs(servicer._dense_snapshot, snapshot)
+        # Responses are shared, so deserialize a copy of the response
+        res_copy = elasticdl_pb2.PullVariableResponse()
+        res_copy.CopyFrom(res)
+        self.assertTrue(
+            np.allclose(tensor_pb_to_ndarray(res_copy.model.param[0]), value)
+        )
+
+        grad = np.ones_like(value)
+        push_req = elasticdl_pb2.PushGradientRequest()
+        push_req.model_version = 0
+        emplace_tensor_pb_from_ndarray(push_req.gradients, grad, name="v0")
+        servicer.push_gradient(push_req, None)
+
+        res_copy.CopyFrom(servicer.pull_variable(pull_req, None))
+        self.assertEqual(res_copy.model.version, 1)
+        self.assertEqual(servicer._dense_snapshot.version, 1)
+        self.assertTrue(
+            np.allclose(
+                tensor_pb_to_ndarray(res_copy.model.param[0]),
+                value - self._lr * grad,
+            )
+        )
+
+        pull_req.current_model_version = 1
+        res = servicer.pull_variable(pull_req, None)
+        self.assertEqual(res.model.version, 1)
+        self.assertFalse(res.model.param)
+
+    def test_pull_variable_delta(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=1,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=True,
+        )
+        values = {
+            "v0": np.random.rand(3, 2).astype(np.float32),
+            "v1": np.random.rand(4).astype(np.float32),
+        }
+        model = elasticdl_pb2.Model()
+        for name, value in values.items():
+            emplace_tensor_pb_from_ndarray(model.param, value, name=name)
+        servicer.push_model(model, None)
+
+        # Only update "v1" in version 1
+        grad = np.ones_like(values["v1"])
+        push_req = elasticdl_pb2.PushGradientRequest()
+        push_req.model_version = 0
+        emplace_tensor_pb_from_ndarray(push_req.gradients, grad, name="v1")
+        servicer.push_gradient(push_req, None)
+
+        pull_req = elasticdl_pb2.PullVariableRequest()
+        for current_version, expected_names in [
+            (-1, ["v0", "v1"]),
+            (0, ["v1"]),
+            (1, []),
+        ]:
+            pull_req.current_model_version = current_version
+            res = servicer.pull_variable(pull_req, None)
+            self.assertEqual(res.model.version, 1)
+            self.assertListEqual(
+                [pb.name for pb in res.model.param], expected_names
+            )
+            # Pulls of the same version share the serialized response
+            self.assertIs(servicer.pull_variable(pull_req, None), res)
+
+        pull_req.current_model_version = 0
+        res = elasticdl_pb2.PullVariableResponse()
+        res.CopyFrom(servicer.pull_variable(pull_req, None))
+        self.assertTrue(
+            np.allclose(
+                tensor_pb_to_ndarray(res.model.param[0]),
+                values["v1"] - self._lr * grad,
+            )
+        )
+
+    def test_push_compressed_gradient(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=1,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=True,
+        )
+        value = np.random.rand(4, 5).astype(np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        grad = np.zeros_like(value)
+        grad[1, 2] = 1.0
+        compressor = GradientCompressor(GradientCompression.TOP_K, 0.05)
+        push_req = elasticdl_pb2.PushGradientRequest()
+        compressor.emplace_gradient_pb(push_req.gradients, grad, "v0")
+        self.assertEqual(
+            push_req.gradients[0].compression, GradientCompression.TOP_K
+        )
+        res = servicer.push_gradient(push_req, None)
+        self.assertTrue(res.accepted)
+        self.assertTrue(
+            np.allclose(
+                servicer._parameters.non_embedding_params["v0"].numpy(),
+                value - self._lr * grad,
+            )
+        )
+
+    def test_streaming_rpcs(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=1,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=True,
+        )
+        values = {
+            "v0": np.random.rand(10, 4).astype(np.float32),
+            "v1": np.random.rand(3).astype(np.float32),
+        }
+        max_chunk_bytes = 50
+
+        def _chunk_requests(request_cls, field, tensors):
+            for tensor in tensors:
+                for chunk, row_offset, total_rows in split_tensor_to_chunks(
+                    tensor, max_chunk_bytes
+                ):
+                    request = request_cls()
+                    emplace_tensor_chunk_pb(
+                        getattr(request, field), chunk, row_offset, total_rows
+                    )
+                    yield request
+
+        model = elasticdl_pb2.Model()
+        model.version = 1
+        requests = [model] + list(
+            _chunk_requests(
+                elasticdl_pb2.Model,
+                "param",
+                [Tensor(value, name=name) for name, value in values.items()],
+            )
+        )
+        servicer.push_model_stream(iter(requests), None)
+        self.assertEqual(servicer._parameters.version, 1)
+        for name, value in values.items():
+            self.assertTrue(
+                np.allclose(
+                    servicer._parameters.non_embedding_params[name].numpy(),
+                    value,
+                )
+            )
+
+        grad = np.ones_like(values["v0"])
+        push_req = elasticdl_pb2.PushGradientRequest()
+        push_req.model_version = 1
+        requests = [push_req] + list(
+            _chunk_requests(
+                elasticdl_pb2.PushGradientRequest,
+                "gradients",
+                [Tensor(grad, name="v0")],
+            )
+        )
+        self.assertEqual(len(requests), 5)
+        res = servicer.push_gradient_stream(iter(requests), None)
+        self.assertTrue(res.accepted)
+        self.assertEqual(res.model_version, 2)
+
+        pull_req = elasticdl_pb2.PullVariableRequest()
+        pull_req.current_model_version = 1
+        pull_req.max_chunk_bytes = max_chunk_bytes
+        responses = list(servicer.pull_variable_stream(pull_req, None))
+        self.assertTrue(responses[0].model_init_status)
+        self.assertEqual(responses[0].model.version, 2)
+        # Only "v0" is updated after version 1
+        self.assertEqual(len(responses), 5)
+        assembler = TensorChunkAssembler()
+        tensors = []
+        for res in responses:
+            self.assertLessEqual(len(res.model.param), 1)
+            for pb in res.model.param:
+                tensor = assembler.add(pb)
+                if tensor is not None:
+                    tensors.append(tensor)
+        assembler.finish()
+        self.assertListEqual([t.name for t in tensors], ["v0"])
+        self.assertTrue(
+            np.allclose(tensors[0].values, values["v0"] - self._lr * grad)
+        )
+
     def test_pull_embedding_vector(self):
         self.create_default_server_and_stub()
 
@@ -246,6 +463,44 @@ class PserverServicerTest(unittest.TestCase):
         vectors = self.get_embedding_vectors("layer_a", [])
         self.assertEqual(vectors, None)
 
+    def test_pull_embedding_vectors(self):
+        self.create_default_server_and_stub()
+
+        req = elasticdl_pb2.Model()
+        req.version = 1
+        req.embedding_table_info.append(self._embedding_info)
+        another_embedding_info = elasticdl_pb2.EmbeddingTableInfo()
+        another_embedding_info.name = "layer_b"
+        another_embedding_info.dim = 16
+        another_embedding_info.initializer = "normal"
+        req.embedding_table_info.append(another_embedding_info)
+        self._stub.push_model(req)
+
+        name_and_ids = [
+            ("layer_a", [1, 3, 9, 6]),
+            ("layer_b", [8, 9, 1]),
+            ("layer_a", []),
+        ]
+        pull_req = elasticdl_pb2.PullEmbeddingVectorsRequest()
+        for name, ids in name_and_ids:
+            table_req = pull_req.requests.add()
+            table_req.name = name
+            table_req.ids.extend(ids)
+        res = self._stub.pull_embedding_vectors(pull_req)
+
+        self.assertEqual(len(res.embedding_vectors), len(name_and_ids))
+        for (name, ids), tensor_pb in zip(name_and_ids, res.embedding_vectors):
+            self.assertEqual(tensor_pb.name, name)
+            if not ids:
+                self.assertFalse(tensor_pb.content)
+                continue
+            self.assertTrue(
+                np.array_equal(
+                    tensor_pb_to_ndarray(tensor_pb),
+                    self.get_embedding_vectors(name, ids),
+                )
+            )
+
     def push_gradient_test_setup(self):
         self.var_names = ["test_1", "test_2"]
         self.var_values = [
@@ -429,6 +684,180 @@ class PserverServicerTest(unittest.TestCase):
         )
         self.assertTrue(np.allclose(expected_embed_table, actual_embed_table))
 
+    def test_push_gradient_sync_accumulation(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=2,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=False,
+        )
+        value = np.random.rand(3, 2).astype(np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        expected = value
+        buffer = None
+        for version in range(2):
+            grads = [np.random.rand(3, 2).astype(np.float32) for _ in range(2)]
+            for grad in grads:
+                req = elasticdl_pb2.PushGradientRequest()
+                req.model_version = version
+                emplace_tensor_pb_from_ndarray(req.gradients, grad, name="v0")
+                res = servicer.push_gradient(req, None)
+                self.assertTrue(res.accepted)
+            self.assertEqual(res.model_version, version + 1)
+            expected = expected - self._lr * (grads[0] + grads[1]) / 2
+            self.assertTrue(
+                np.allclose(
+                    servicer._parameters.non_embedding_params["v0"].numpy(),
+                    expected,
+                )
+            )
+            # The accumulator buffer is reused in the next version
+            accumulator = servicer._grads_buffer["v0"]
+            self.assertEqual(accumulator.count, 0)
+            if buffer is not None:
+                self.assertIs(accumulator.get().values, buffer)
+            buffer = accumulator.get().values
+
+    def test_push_gradient_sync_concurrently(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=4,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=False,
+        )
+        value = np.zeros((3, 2), dtype=np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        threads_num = 8
+        pushes_per_thread = 10
+        versions = threads_num * pushes_per_thread // 4
+
+        def _push():
+            for _ in range(pushes_per_thread):
+                req = elasticdl_pb2.PushGradientRequest()
+                # Not to be rejected as a stale gradient
+                req.model_version = versions
+                emplace_tensor_pb_from_ndarray(
+                    req.gradients, np.ones_like(value), name="v0"
+                )
+                self.assertTrue(servicer.push_gradient(req, None).accepted)
+
+        threads = [threading.Thread(target=_push) for _ in range(threads_num)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Each version applies the average gradient of exactly 4 pushes
+        self.assertEqual(servicer._parameters.version, versions)
+        self.assertTrue(
+            np.allclose(
+                servicer._parameters.non_embedding_params["v0"].numpy(),
+                value - self._lr * versions,
+            )
+        )
+
+    def test_push_gradient_sync_failure(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=2,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=False,
+            grad_check_pushes_per_worker=1,
+        )
+        value = np.zeros((3, 2), dtype=np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        def _push(grad, model_version=0, worker_id=1):
+            req = elasticdl_pb2.PushGradientRequest()
+            req.model_version = model_version
+            req.worker_id = worker_id
+            emplace_tensor_pb_from_ndarray(req.gradients, grad, name="v0")
+            return servicer.push_gradient(req, None)
+
+        # A malformed push which is not checked against the parameters
+        # fails without blocking the other pushes.
+        self.assertTrue(_push(np.ones_like(value)).accepted)
+        with self.assertRaises(ValueError):
+            _push(np.ones((2, 2), np.float32))
+        self.assertEqual(servicer._grads_reserved, 1)
+        res = _push(np.ones_like(value))
+        self.assertTrue(res.accepted)
+        self.assertEqual(res.model_version, 1)
+        np.testing.assert_allclose(
+            servicer._parameters.non_embedding_params["v0"].numpy(),
+            value - self._lr,
+        )
+
+        # The accumulation of the next version starts if the gradients
+        # fail to be applied.
+        apply_gradients = servicer._optimizer.apply_gradients
+
+        def _fail_to_apply_gradients(grad_vars):
+            raise RuntimeError("Failed to apply gradients")
+
+        servicer._optimizer.apply_gradients = _fail_to_apply_gradients
+        _push(np.ones_like(value), model_version=1)
+        with self.assertRaises(RuntimeError):
+            _push(np.ones_like(value), model_version=1)
+        self.assertEqual(servicer._grads_reserved, 0)
+        servicer._optimizer.apply_gradients = apply_gradients
+        _push(np.ones_like(value), model_version=1)
+        res = _push(np.ones_like(value), model_version=1)
+        self.assertEqual(res.model_version, 2)
+
+        # A push beyond `grads_to_wait` is rejected if the reserved pushes
+        # are not applied in time.
+        servicer._grads_reserved = 2
+        with mock.patch.object(ps_servicer, "_SYNC_PUSH_WAIT_TIMEOUT", 0):
+            res = _push(np.ones_like(value), model_version=2)
+        self.assertFalse(res.accepted)
+        self.assertEqual(res.model_version, 2)
+
+    def test_grad_check_pushes_per_worker(self):
+        servicer = PserverServicer(
+            Parameters(),
+            grads_to_wait=1,
+            optimizer=tf.keras.optimizers.SGD(self._lr),
+            use_async=True,
+            grad_check_pushes_per_worker=2,
+        )
+        value = np.zeros((3, 2), dtype=np.float32)
+        model = elasticdl_pb2.Model()
+        emplace_tensor_pb_from_ndarray(model.param, value, name="v0")
+        servicer.push_model(model, None)
+
+        checked_workers = []
+        check_grad = servicer._parameters.check_grad
+
+        def _check_grad(grad):
+            checked_workers.append(worker_id)
+            check_grad(grad)
+
+        servicer._parameters.check_grad = _check_grad
+        for worker_id in [0, 1, 0, 0, 1, 1, 0]:
+            req = elasticdl_pb2.PushGradientRequest()
+            req.worker_id = worker_id
+            emplace_tensor_pb_from_ndarray(
+                req.gradients, np.ones_like(value), name="v0"
+            )
+            self.assertTrue(servicer.push_gradient(req, None).accepted)
+        # Only the first 2 pushes of each worker are checked
+        self.assertListEqual(checked_workers, [0, 1, 0, 1])
+        self.assertTrue(
+            np.allclose(
+                servicer._parameters.non_embedding_params["v0"].numpy(),
+                value - self._lr * 7,
+            )
+        )
+
     def test_save_parameters_to_checkpoint_file(self):
         with tempfile.TemporaryDirectory() as tempdir:
             checkpoint_saver = CheckpointSaver(
@@ -494,9 +923,7 @@ class PserverServicerTest(unittest.TestCase):
         pserver_0 = ParameterServer(args)
 
         embedding_table = pserver_0.parameters.embedding_params["embedding"]
-        self.assertEqual(
-            list(embedding_table.embedding_vectors.keys()), [0, 2]
-        )
+        self.assertEqual(embedding_table.ids.tolist(), [0, 2])
         self.assertEqual(
             list(pserver_0.parameters.non_embedding_params.keys()),
             ["dense/kernel:0"],
@@ -522,9 +949,7 @@ class PserverServicerTest(unittest.TestCase):
         pserver_1 = ParameterServer(args)
 
         embedding_table = pserver_1.parameters.embedding_params["embedding"]
-        self.assertEqual(
-            list(embedding_table.embedding_vectors.keys()), [1, 3]
-        )
+        self.assertEqual(embedding_table.ids.tolist(), [1, 3])
         self.assertEqual(
             list(pserver_1.parameters.non_embedding_params.keys()),
             ["dense/bias:0"],
@@ -110,6 +110,28 @@ class ServicerTest(unittest.TestCase):
             tasks,
         )
 
+    def testReturnTask(self):
+        task_d = _TaskDispatcher(
+            {"shard_1": (0, 10)}, {}, {}, records_per_task=5, num_epochs=1
+        )
+        master = MasterServicer(3, task_d, evaluation_service=None)
+        req = elasticdl_pb2.GetTaskRequest()
+        req.worker_id = 1
+        task = master.get_task(req, None)
+
+        # A returned task is dispatched again
+        report = elasticdl_pb2.ReportTaskResultRequest()
+        report.task_id = task.task_id
+        report.returned = True
+        master.report_task_result(report, None)
+        self.assertNotIn(task.task_id, task_d._doing)
+        returned_task = master.get_task(req, None)
+        self.assertEqual(
+            (returned_task.shard_name, returned_task.start, returned_task.end),
+            (task.shard_name, task.start, task.end),
+        )
+        self.assertEqual(task_d._job_counters[task.type].failed_records, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
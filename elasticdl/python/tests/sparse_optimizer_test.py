@@ -0,0 +1,160 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.optimizers import (
+    SGD,
+    Adadelta,
+    Adagrad,
+    Adam,
+    Ftrl,
+    RMSprop,
+)
+
+from elasticdl.python.common.constants import SparseUpdateEngine
+from elasticdl.python.ps.embedding_table import EmbeddingTable
+from elasticdl.python.ps.optimizer_wrapper import OptimizerWrapper
+from elasticdl.python.ps.parameters import Parameters
+from elasticdl.python.ps.sparse_optimizer import (
+    SparseOptimizer,
+    merge_duplicate_ids,
+)
+
+
+class MergeDuplicateIdsTest(unittest.TestCase):
+    def test_merge_duplicate_ids(self):
+        ids = np.array([7, 2, 7, 5, 2, 7])
+        values = np.arange(12, dtype=np.float32).reshape((6, 2))
+        unique_ids, merged = merge_duplicate_ids(ids, values)
+        np.testing.assert_array_equal(unique_ids, [2, 5, 7])
+        np.testing.assert_array_equal(
+            merged, [[2 + 8, 3 + 9], [6, 7], [0 + 4 + 10, 1 + 5 + 11]]
+        )
+
+    def test_merge_unique_ids(self):
+        ids = np.array([7, 2, 5])
+        values = np.arange(6, dtype=np.float32).reshape((3, 2))
+        unique_ids, merged = merge_duplicate_ids(ids, values)
+        np.testing.assert_array_equal(unique_ids, [2, 5, 7])
+        np.testing.assert_array_equal(merged, [[2, 3], [4, 5], [0, 1]])
+
+
+class SparseOptimizerTest(unittest.TestCase):
+    """Checks that "numpy" sparse update engine updates parameters in the
+    same way as "tensorflow" sparse update engine."""
+
+    def setUp(self):
+        self.layer_name = "embedding"
+        self.dim = 4
+        self.vocab_size = 20
+        rng = np.random.RandomState(0)
+        self.embedding = rng.rand(self.vocab_size, self.dim).astype(np.float32)
+        self.dense = rng.rand(3, 2).astype(np.float32)
+        self.grads = []
+        for _ in range(5):
+            # Ids are duplicated in each step
+            ids = rng.randint(0, self.vocab_size, size=12)
+            embed_grad = rng.normal(size=(len(ids), self.dim))
+            dense_grad = rng.normal(size=self.dense.shape)
+            self.grads.append(
+                (
+                    ids.astype(np.int64),
+                    embed_grad.astype(np.float32),
+                    dense_grad.astype(np.float32),
+                )
+            )
+
+    def _train(self, opt, engine, with_dense=True):
+        params = Parameters()
+        table = EmbeddingTable(self.layer_name, self.dim, "uniform")
+        table.set(np.arange(self.vocab_size), self.embedding)
+        params.embedding_params[self.layer_name] = table
+        dense_var = tf.Variable(self.dense, name="dense")
+        opt_wrapper = OptimizerWrapper(
+            opt,
+            False,
+            params.get_embedding_param_with_slots,
+            params.set_embedding_param_with_slots,
+            engine,
+            params.update_embedding_param_with_slots,
+        )
+        params.create_slot_params(
+            opt_wrapper.allowed_slot_names, opt_wrapper.slot_initial_value
+        )
+        for ids, embed_grad, dense_grad in self.grads:
+            grads_and_vars = [
+                (
+                    tf.IndexedSlices(
+                        tf.constant(embed_grad), tf.constant(ids)
+                    ),
+                    self.layer_name,
+                )
+            ]
+            if with_dense:
+                grads_and_vars.append((tf.constant(dense_grad), dense_var))
+            opt_wrapper.apply_gradients(grads_and_vars)
+        values = params.get_embedding_param_with_slots(
+            self.layer_name, np.arange(self.vocab_size)
+        )
+        return values, dense_var.numpy(), opt.iterations.numpy()
+
+    def _test_parity(self, opt_class, **kwargs):
+        for with_dense in [True, False]:
+            expected = self._train(
+                opt_class(**kwargs), SparseUpdateEngine.TENSORFLOW, with_dense
+            )
+            result = self._train(
+                opt_class(**kwargs), SparseUpdateEngine.NUMPY, with_dense
+            )
+            msg = "%s%s differs from TensorFlow" % (opt_class.__name__, kwargs)
+            np.testing.assert_allclose(
+                result[0], expected[0], rtol=1e-5, atol=1e-6, err_msg=msg
+            )
+            np.testing.assert_allclose(
+                result[1], expected[1], rtol=1e-5, atol=1e-6, err_msg=msg
+            )
+            self.assertEqual(result[2], expected[2], msg=msg)
+
+    def test_sgd(self):
+        self._test_parity(SGD, learning_rate=0.1)
+        self._test_parity(SGD, learning_rate=0.1, momentum=0.9)
+        self._test_parity(SGD, learning_rate=0.1, momentum=0.9, nesterov=True)
+
+    def test_adagrad(self):
+        self._test_parity(Adagrad, learning_rate=0.1)
+
+    def test_adam(self):
+        self._test_parity(Adam, learning_rate=0.1)
+        self._test_parity(Adam, learning_rate=0.1, amsgrad=True)
+
+    def test_ftrl(self):
+        self._test_parity(Ftrl, learning_rate=0.1)
+        self._test_parity(
+            Ftrl,
+            learning_rate=0.1,
+            learning_rate_power=-0.8,
+            l1_regularization_strength=0.01,
+            l2_regularization_strength=0.01,
+        )
+        self._test_parity(
+            Ftrl,
+            learning_rate=0.1,
+            l1_regularization_strength=0.01,
+            l2_shrinkage_regularization_strength=0.01,
+        )
+
+    def test_rmsprop(self):
+        self._test_parity(RMSprop, learning_rate=0.1)
+        self._test_parity(RMSprop, learning_rate=0.1, centered=True)
+        self._test_parity(RMSprop, learning_rate=0.1, momentum=0.5)
+        self._test_parity(
+            RMSprop, learning_rate=0.1, momentum=0.5, centered=True
+        )
+
+    def test_unsupported_optimizer(self):
+        with self.assertRaises(NotImplementedError):
+            SparseOptimizer(Adadelta(), ["accum_grad", "accum_var"])
+
+
+if __name__ == "__main__":
+    unittest.main()
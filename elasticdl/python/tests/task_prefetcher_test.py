@@ -0,0 +1,155 @@
+import threading
+import unittest
+
+import tensorflow as tf
+
+from elasticdl.proto import elasticdl_pb2
+from elasticdl.python.data.reader.data_reader import AbstractDataReader
+from elasticdl.python.worker.task_data_service import TaskDataService
+from elasticdl.python.worker.task_prefetcher import TaskPrefetcher
+
+
+class _RangeDataReader(AbstractDataReader):
+    def __init__(self, **kwargs):
+        self.opened_tasks = []
+
+    def read_records(self, task):
+        self.opened_tasks.append(task.task_id)
+        for i in range(task.start, task.end):
+            yield ("%s:%d" % (task.shard_name, i)).encode()
+
+    def create_shards(self):
+        pass
+
+
+def _parse_record(record):
+    shard_name, i = record.decode().split(":")
+    return shard_name, int(i)
+
+
+class _ParsingRangeDataReader(_RangeDataReader):
+    parsed_records_output_types = (tf.string, tf.int64)
+    parsed_records_output_shapes = ((), ())
+
+    def record_parse_fn(self):
+        return _parse_record
+
+
+class _MockedWorker(object):
+    def __init__(self, task_num, last_task_type=elasticdl_pb2.TRAINING):
+        self._tasks = [
+            elasticdl_pb2.Task(
+                task_id=i + 1,
+                shard_name="shard_%d" % i,
+                start=0,
+                end=3,
+                type=elasticdl_pb2.TRAINING,
+            )
+            for i in range(task_num)
+        ]
+        self._tasks.append(elasticdl_pb2.Task(type=last_task_type))
+        self._lock = threading.Lock()
+        self.leased_task_num = 0
+        self.reported_tasks = []
+        self.data_reader = _RangeDataReader()
+        self._custom_data_reader = lambda data_origin: self.data_reader
+
+    def get_task(self):
+        with self._lock:
+            task = self._tasks[min(self.leased_task_num, len(self._tasks) - 1)]
+            self.leased_task_num += 1
+            return task
+
+    def report_task_result(
+        self, task_id, err_msg, exec_counters=None, returned=False
+    ):
+        self.reported_tasks.append((task_id, err_msg, returned))
+
+
+class TaskPrefetcherTest(unittest.TestCase):
+    def test_get_tasks_and_read_records(self):
+        worker = _MockedWorker(5)
+        prefetcher = TaskPrefetcher(
+            worker, worker.data_reader.read_records, 2, buffered_records=2
+        )
+        prefetcher.start()
+        for i in range(5):
+            task = prefetcher.get_task()
+            self.assertEqual(task.task_id, i + 1)
+            self.assertLessEqual(worker.leased_task_num, i + 3)
+            # The records of the task are opened in the background
+            self.assertIn(task.task_id, worker.data_reader.opened_tasks)
+            self.assertListEqual(
+                list(prefetcher.read_records(task)),
+                [("shard_%d:%d" % (i, j)).encode() for j in range(3)],
+            )
+        self.assertFalse(prefetcher.get_task().shard_name)
+        self.assertListEqual(prefetcher.stop(), [])
+
+    def test_stop(self):
+        worker = _MockedWorker(5)
+        prefetcher = TaskPrefetcher(worker, worker.data_reader.read_records, 3)
+        prefetcher.start()
+        self.assertEqual(prefetcher.get_task().task_id, 1)
+        tasks = prefetcher.stop()
+        self.assertEqual(worker.leased_task_num, 1 + len(tasks))
+        self.assertListEqual(
+            [task.task_id for task in tasks], list(range(2, 2 + len(tasks)))
+        )
+
+        # Leases tasks again after stopped
+        leased_task_num = worker.leased_task_num
+        prefetcher.start()
+        self.assertEqual(prefetcher.get_task().task_id, leased_task_num + 1)
+        prefetcher.stop()
+
+    def test_task_data_service(self):
+        worker = _MockedWorker(5, last_task_type=elasticdl_pb2.WAIT)
+        service = TaskDataService(worker, False, prefetch_tasks=2)
+        gen = service._gen()
+        self.assertEqual(next(gen), b"shard_0:0")
+        self.assertListEqual(
+            [task.task_id for task in service._pending_tasks], [1]
+        )
+        # The prefetched tasks are returned to the master
+        gen.close()
+        self.assertListEqual(
+            worker.reported_tasks,
+            [
+                (task_id, "", True)
+                for task_id in range(2, worker.leased_task_num + 1)
+            ],
+        )
+
+        worker = _MockedWorker(5, last_task_type=elasticdl_pb2.WAIT)
+        service = TaskDataService(worker, False, prefetch_tasks=2)
+        records = list(service._gen())
+        self.assertEqual(len(records), 15)
+        self.assertEqual(records[-1], b"shard_4:2")
+        self.assertEqual(len(service._pending_tasks), 5)
+        self.assertTrue(service._pending_dataset)
+        self.assertListEqual(worker.reported_tasks, [])
+
+    def test_task_data_service_parsing_records(self):
+        expected = [
+            (("shard_%d" % i).encode(), j) for i in range(5) for j in range(3)
+        ]
+        for data_reader_processes in [0, 2]:
+            worker = _MockedWorker(5)
+            worker.data_reader = _ParsingRangeDataReader()
+            service = TaskDataService(
+                worker, False, data_reader_processes=data_reader_processes
+            )
+            try:
+                dataset = service.get_dataset()
+                records = [
+                    (shard_name.numpy(), i.numpy())
+                    for shard_name, i in dataset
+                ]
+            finally:
+                service.close()
+            self.assertListEqual(records, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,9 +7,12 @@ from elasticdl.proto import elasticdl_pb2, tensor_dtype_pb2
 from elasticdl.python.common.dtypes import dtype_numpy_to_tensor
 from elasticdl.python.common.tensor import (
     Tensor,
+    TensorChunkAssembler,
     deserialize_tensor_pb,
+    emplace_tensor_chunk_pb,
     emplace_tensor_pb_from_ndarray,
     serialize_tensor,
+    split_tensor_to_chunks,
     tensor_pb_to_ndarray,
     tensor_pb_to_tf_tensor,
 )
@@ -40,7 +43,9 @@ class TensorTest(unittest.TestCase):
         self.assertEqual(pb.name, "test")
         self.assertEqual(pb.dim, [3, 1, 2, 4])
         self.assertEqual(pb.dtype, tensor_dtype_pb2.DT_INT32)
-        np.testing.assert_array_equal(pb.indices, indices)
+        np.testing.assert_array_equal(
+            np.frombuffer(pb.indices_content, dtype=np.int64), indices
+        )
 
         # tensor PB to tensor
         tensor_new = Tensor.from_tensor_pb(pb)
@@ -103,7 +108,8 @@ class TensorTest(unittest.TestCase):
         t = _ndarray_to_tensor_pb(arr, "test", indices)
         self.assertTrue(t.name == "test")
         self.assertEqual([2, 1, 3, 4], t.dim)
-        self.assertEqual([3, 0], t.indices)
+        self.assertEqual(indices.tobytes(), t.indices_content)
+        self.assertFalse(t.indices)
         self.assertEqual(4 * 2 * 1 * 3 * 4, len(t.content))
 
     def test_deserialize_tensor_pb(self):
@@ -189,6 +195,18 @@ class TensorTest(unittest.TestCase):
             np.array([1, 0]),
         )
 
+        # verify with int32 indices and int64 indices out of the int32 range
+        verify(
+            np.ndarray([2, 3], dtype=np.float32),
+            "test",
+            np.array([1, 0], dtype=np.int32),
+        )
+        verify(
+            np.ndarray([2, 3], dtype=np.float32),
+            "test",
+            np.array([2 ** 40, 7], dtype=np.int64),
+        )
+
         # dtype = np.int64
         # 1-D random array
         verify(np.array([1, 2, 3, 4], dtype=np.int64))
@@ -241,9 +259,80 @@ class TensorTest(unittest.TestCase):
         self.assertEqual(pb.name, expected_pb.name)
         self.assertEqual(pb.dim, expected_pb.dim)
         self.assertEqual(pb.content, expected_pb.content)
-        self.assertEqual(pb.indices, expected_pb.indices)
+        self.assertEqual(pb.indices_content, expected_pb.indices_content)
         self.assertEqual(pb.dtype, expected_pb.dtype)
 
+    def test_split_and_assemble_tensor_chunks(self):
+        values = np.random.rand(10, 4).astype(np.float32)
+        small = np.random.rand(2).astype(np.float32)
+        model = elasticdl_pb2.Model()
+        # 3 rows of 16 bytes in a chunk of at most 50 bytes
+        for tensor in [Tensor(values, name="v0"), Tensor(small, name="v1")]:
+            for chunk, row_offset, total_rows in split_tensor_to_chunks(
+                tensor, 50
+            ):
+                emplace_tensor_chunk_pb(
+                    model.param, chunk, row_offset, total_rows
+                )
+        self.assertEqual(len(model.param), 5)
+        self.assertListEqual(
+            [pb.chunk_row_offset for pb in model.param], [0, 3, 6, 9, 0]
+        )
+        self.assertListEqual(
+            [pb.chunk_total_rows for pb in model.param], [10, 10, 10, 10, 0]
+        )
+
+        assembler = TensorChunkAssembler()
+        tensors = [assembler.add(pb) for pb in model.param]
+        assembler.finish()
+        self.assertListEqual(tensors[:3], [None, None, None])
+        self.assertEqual(tensors[3].name, "v0")
+        np.testing.assert_array_equal(tensors[3].values, values)
+        self.assertEqual(tensors[4].name, "v1")
+        np.testing.assert_array_equal(tensors[4].values, small)
+
+        # Chunks of tf.IndexedSlices are tensors by themselves
+        indices = np.arange(10) * 2
+        chunks = list(split_tensor_to_chunks(Tensor(values, indices, "e"), 50))
+        self.assertEqual(len(chunks), 4)
+        for chunk, row_offset, total_rows in chunks:
+            self.assertEqual(total_rows, 0)
+            end = row_offset + len(chunk.indices)
+            np.testing.assert_array_equal(
+                chunk.indices, indices[row_offset:end]
+            )
+            np.testing.assert_array_equal(chunk.values, values[row_offset:end])
+
+        # A tensor is not split if `max_chunk_bytes` is 0
+        self.assertEqual(len(list(split_tensor_to_chunks(tensor, 0))), 1)
+
+    def test_assemble_invalid_tensor_chunks(self):
+        model = elasticdl_pb2.Model()
+        values = np.random.rand(4, 2).astype(np.float32)
+        for chunk, row_offset, total_rows in split_tensor_to_chunks(
+            Tensor(values, name="v0"), 8
+        ):
+            emplace_tensor_chunk_pb(model.param, chunk, row_offset, total_rows)
+
+        def _copy(pb):
+            pb_copy = elasticdl_pb2.Tensor()
+            pb_copy.CopyFrom(pb)
+            return pb_copy
+
+        # Out of order chunks
+        assembler = TensorChunkAssembler()
+        with self.assertRaises(ValueError):
+            assembler.add(_copy(model.param[1]))
+        assembler.add(_copy(model.param[0]))
+        with self.assertRaises(ValueError):
+            assembler.add(_copy(model.param[2]))
+
+        # Partially assembled tensor
+        assembler = TensorChunkAssembler()
+        assembler.add(_copy(model.param[0]))
+        with self.assertRaises(ValueError):
+            assembler.finish()
+
 
 if __name__ == "__main__":
     unittest.main()
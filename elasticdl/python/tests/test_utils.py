@@ -58,6 +58,12 @@ class PserverArgs(object):
         num_ps_pods=1,
         num_workers=2,
         checkpoint_dir_for_init=None,
+        embedding_eviction_policy="",
+        embedding_eviction_max_rows=0,
+        embedding_eviction_ttl=0,
+        embedding_eviction_steps=100,
+        sparse_update_engine="tensorflow",
+        grad_check_pushes_per_worker=0,
     ):
         self.grads_to_wait = grads_to_wait
         self.learning_rate_scheduler = lr_scheduler
@@ -80,6 +86,12 @@ class PserverArgs(object):
         self.num_ps_pods = num_ps_pods
         self.num_workers = num_workers
         self.checkpoint_dir_for_init = checkpoint_dir_for_init
+        self.embedding_eviction_policy = embedding_eviction_policy
+        self.embedding_eviction_max_rows = embedding_eviction_max_rows
+        self.embedding_eviction_ttl = embedding_eviction_ttl
+        self.embedding_eviction_steps = embedding_eviction_steps
+        self.sparse_update_engine = sparse_update_engine
+        self.grad_check_pushes_per_worker = grad_check_pushes_per_worker
 
 
 class DatasetName(object):
@@ -181,6 +181,73 @@ class WorkerPSInteractionTest(unittest.TestCase):
             expected_result = np.concatenate(expected_result)
             self.assertTrue(np.allclose(expected_result, result_dict[layer]))
 
+        # Pull embedding vectors of all layers in one call per PS
+        results = worker.pull_embedding_vectors(
+            [(layer, ids) for layer in layers]
+        )
+        for layer, result in zip(layers, results):
+            self.assertTrue(np.allclose(result_dict[layer], result))
+
+        # Embedding vectors pulled for the minibatch are looked up locally
+        unique_ids = np.unique(ids)
+        worker._minibatch_embedding_vectors[layers[0]] = (
+            unique_ids,
+            np.zeros((len(unique_ids), 8), dtype=np.float32),
+        )
+        embedding = worker.pull_embedding_vector(layers[0], ids[:3])
+        self.assertTrue(np.array_equal(embedding, np.zeros((3, 8))))
+
+    def test_prefetch_embedding_vectors(self):
+        model_def = "deepfm_functional_api.deepfm_functional_api.custom_model"
+        self._create_pserver(model_def, 2)
+        db, _ = get_frappe_dataset(self._batch_size)
+        self._create_worker(1)
+        worker = self._workers[0]
+        worker._prefetch_embedding_vectors = True
+        self.assertIsNotNone(worker._embedding_ids_model)
+
+        steps = 3
+        for step, (x, y) in enumerate(
+            worker._iterate_prefetching_embedding_vectors(db.take(steps))
+        ):
+            # The embedding vectors of the next minibatch are being pulled
+            self.assertEqual(
+                len(worker._prefetched_embedding_vectors),
+                2 if step < steps - 1 else 1,
+            )
+            worker._pull_embedding_vectors_of_minibatch(x)
+            self.assertEqual(
+                len(worker._prefetched_embedding_vectors),
+                1 if step < steps - 1 else 0,
+            )
+            prefetched = worker._minibatch_embedding_vectors
+            self.assertEqual(len(prefetched), len(worker._embedding_layers))
+            for name, (ids, vectors) in prefetched.items():
+                self.assertTrue(
+                    np.array_equal(
+                        vectors,
+                        worker.pull_embedding_vectors([(name, ids)])[0],
+                    )
+                )
+
+        # The embedding vectors of a minibatch which is not prefetched are
+        # pulled before the forward pass as well
+        worker._pull_embedding_vectors_of_minibatch(x)
+        self.assertEqual(
+            len(worker._minibatch_embedding_vectors),
+            len(worker._embedding_layers),
+        )
+
+        # Without prefetching, only the embedding vectors of the current
+        # minibatch are being pulled
+        worker._prefetch_embedding_vectors = False
+        for x, y in worker._iterate_prefetching_embedding_vectors(
+            db.take(steps)
+        ):
+            self.assertEqual(len(worker._prefetched_embedding_vectors), 1)
+            worker._pull_embedding_vectors_of_minibatch(x)
+            self.assertEqual(len(worker._prefetched_embedding_vectors), 0)
+
     def test_compare_onebatch_train(self):
         model_def = "mnist_functional_api.mnist_functional_api.custom_model"
         self._create_pserver(model_def, 2)
@@ -248,6 +315,90 @@ class WorkerPSInteractionTest(unittest.TestCase):
             )
             np.testing.assert_array_equal(ps_v.numpy(), v.numpy())
 
+    def test_inflight_gradient_pushes(self):
+        model_def = "mnist_functional_api.mnist_functional_api.custom_model"
+        self._create_pserver(model_def, 2)
+        images, labels = get_random_batch(self._batch_size)
+        arguments = [
+            "--worker_id",
+            0,
+            "--job_type",
+            elasticdl_pb2.TRAINING,
+            "--minibatch_size",
+            self._batch_size,
+            "--model_zoo",
+            self._model_zoo_path,
+            "--model_def",
+            model_def,
+            "--distribution_strategy",
+            DistributionStrategy.PARAMETER_SERVER,
+            "--max_inflight_gradient_pushes",
+            2,
+        ]
+        args = parse_worker_args(arguments)
+        worker = Worker(args, ps_channels=self._channels)
+        worker._run_model_call_before_training(images)
+
+        steps = 5
+        for _ in range(steps):
+            worker.get_model()
+            _, w_grads = worker.training_process_eagerly(images, labels)
+            accepted, _ = worker.report_gradient(w_grads)
+            self.assertTrue(accepted)
+            self.assertLessEqual(len(worker._inflight_gradient_pushes), 2)
+
+        self.assertEqual(worker._complete_gradient_pushes(), "")
+        self.assertEqual(len(worker._inflight_gradient_pushes), 0)
+        for pserver in self._pservers:
+            self.assertEqual(pserver.parameters.version, steps)
+
+    def test_push_after_rejected_inflight_gradient_push(self):
+        model_def = "mnist_functional_api.mnist_functional_api.custom_model"
+        self._create_pserver(model_def, 2)
+        images, labels = get_random_batch(self._batch_size)
+        arguments = [
+            "--worker_id",
+            0,
+            "--job_type",
+            elasticdl_pb2.TRAINING,
+            "--minibatch_size",
+            self._batch_size,
+            "--model_zoo",
+            self._model_zoo_path,
+            "--model_def",
+            model_def,
+            "--distribution_strategy",
+            DistributionStrategy.PARAMETER_SERVER,
+            "--max_inflight_gradient_pushes",
+            1,
+        ]
+        args = parse_worker_args(arguments)
+        worker = Worker(args, ps_channels=self._channels)
+        worker._run_model_call_before_training(images)
+        worker.get_model()
+
+        class _RejectedFuture(object):
+            def done(self):
+                return True
+
+            def result(self):
+                return elasticdl_pb2.PushGradientResponse(
+                    accepted=False, model_version=0
+                )
+
+        worker._inflight_gradient_pushes.append(([_RejectedFuture()], {}))
+        _, w_grads = worker.training_process_eagerly(images, labels)
+        # The gradients are pushed though the earlier push is rejected
+        accepted, _ = worker.report_gradient(w_grads)
+        self.assertTrue(accepted)
+        self.assertEqual(len(worker._inflight_gradient_pushes), 1)
+        self.assertEqual(
+            worker._complete_gradient_pushes(), "Gradients rejected by PS"
+        )
+        self.assertEqual(worker._complete_gradient_pushes(), "")
+        for pserver in self._pservers:
+            self.assertEqual(pserver.parameters.version, 1)
+
     def test_compare_mnist_train(self):
         model_def = "mnist_functional_api.mnist_functional_api.custom_model"
         self._create_pserver(model_def, 2)
@@ -0,0 +1,170 @@
+import numpy as np
+
+from elasticdl.python.common.constants import EmbeddingEvictionPolicy
+from elasticdl.python.ps.id_index import IdIndex
+
+# The fraction of the capacity of a full table evicted at once besides the
+# rows to make room for new ids
+_EVICTED_FRACTION = 0.1
+
+
+class EmbeddingCache(object):
+    """A cache of embedding vectors pulled from PS by a worker.
+
+    Each cached vector is tagged with the model version of the worker when
+    it was pulled. A vector is served while the model version of the
+    worker is at most `staleness` versions ahead of its tag. If a table
+    of the cache is full, stale vectors are evicted first, and then the
+    least recently ("lru") or the least frequently ("lfu") used vectors.
+
+    Like `EmbeddingTable`, the cached vectors of a table are stored in
+    rows of a 2-D numpy.ndarray and an `IdIndex` maps ids to rows, so that
+    a batch of ids is looked up with vectorized gathers.
+    """
+
+    def __init__(
+        self, capacity, policy=EmbeddingEvictionPolicy.LRU, staleness=0
+    ):
+        """
+        Args:
+            capacity: The maximum number of vectors cached for a table.
+            policy: The eviction policy, "lru" or "lfu".
+            staleness: The maximum number of model versions that a cached
+                vector may fall behind.
+        """
+        if capacity <= 0:
+            raise ValueError("Embedding cache capacity should be positive")
+        if policy not in (
+            EmbeddingEvictionPolicy.LRU,
+            EmbeddingEvictionPolicy.LFU,
+        ):
+            raise ValueError("Unknown embedding cache policy %s" % policy)
+        if staleness < 0:
+            raise ValueError("Embedding cache staleness should be >= 0")
+        self._capacity = capacity
+        self._policy = policy
+        self._staleness = staleness
+        self._tables = {}
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    def lookup(self, name, ids, version):
+        """Looks up the cached vectors of `ids` in table `name`.
+
+        Args:
+            name: The embedding table name.
+            ids: A 1-D int64 numpy.ndarray.
+            version: The current model version of the worker.
+
+        Returns:
+            A tuple (hit, vectors). `hit` is a bool numpy.ndarray which
+            tells whether a fresh vector of each id is cached. `vectors` is
+            a 2-D numpy.ndarray of the vectors of `ids[hit]`, or None if no
+            id hits.
+        """
+        table = self._tables.get(name)
+        if table is None:
+            return np.zeros(len(ids), dtype=bool), None
+        return table.lookup(ids, version - self._staleness)
+
+    def insert(self, name, ids, vectors, version):
+        """Caches `vectors` of `ids` in table `name` pulled at model
+        `version`, replacing the cached vectors of the same ids."""
+        if len(ids) == 0:
+            return
+        table = self._tables.get(name)
+        if table is None:
+            table = _CacheTable(
+                self._capacity, self._policy, vectors.shape[1], vectors.dtype
+            )
+            self._tables[name] = table
+        table.insert(ids, vectors, version, version - self._staleness)
+
+    def clear(self):
+        self._tables = {}
+
+
+class _CacheTable(object):
+    """The cached vectors of an embedding table."""
+
+    def __init__(self, capacity, policy, dim, dtype):
+        self._capacity = capacity
+        self._policy = policy
+        self._index = IdIndex()
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._vectors = np.empty((capacity, dim), dtype=dtype)
+        self._versions = np.empty(capacity, dtype=np.int64)
+        # The access clocks of rows for "lru", or the access counts of
+        # rows for "lfu". The row with the smallest score is evicted first.
+        self._scores = np.empty(capacity, dtype=np.int64)
+        self._clock = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _touch(self, rows):
+        if self._policy == EmbeddingEvictionPolicy.LRU:
+            self._clock += 1
+            self._scores[rows] = self._clock
+        else:
+            np.add.at(self._scores, rows, 1)
+
+    def lookup(self, ids, min_version):
+        rows = self._index.lookup(ids)
+        hit = rows >= 0
+        hit[hit] = self._versions[rows[hit]] >= min_version
+        if not hit.any():
+            return hit, None
+        rows = rows[hit]
+        self._touch(rows)
+        return hit, self._vectors[rows]
+
+    def insert(self, ids, vectors, version, min_version):
+        ids, first = np.unique(ids, return_index=True)
+        ids = ids[: self._capacity]
+        vectors = vectors[first[: self._capacity]]
+
+        rows = self._index.lookup(ids)
+        new = rows < 0
+        new_num = np.count_nonzero(new)
+        if self._size + new_num > self._capacity:
+            self._evict(rows[~new], min_version, new_num)
+            rows = self._index.lookup(ids)
+        rows[new] = np.arange(self._size, self._size + new_num)
+        self._size += new_num
+
+        self._ids[rows] = ids
+        self._vectors[rows] = vectors
+        self._versions[rows] = version
+        if self._policy == EmbeddingEvictionPolicy.LFU:
+            self._scores[rows[new]] = 0
+        self._touch(rows)
+        self._index.insert(ids[new], rows[new])
+
+    def _evict(self, inserted_rows, min_version, new_num):
+        """Evicts rows to make room for `new_num` new ids, keeping the rows
+        `inserted_rows` of the ids being inserted.
+
+        `_EVICTED_FRACTION` of the capacity is evicted at once besides, and
+        the kept rows are moved to the front, so that the O(capacity) cost
+        of rebuilding the index is amortized over many inserts.
+        """
+        keep_num = max(
+            len(inserted_rows),
+            self._capacity - new_num - int(self._capacity * _EVICTED_FRACTION),
+        )
+        scores = self._scores[: self._size].copy()
+        scores[self._versions[: self._size] < min_version] = np.iinfo(
+            np.int64
+        ).min
+        scores[inserted_rows] = np.iinfo(np.int64).max
+        evict_num = self._size - keep_num
+        kept = np.argpartition(scores, evict_num - 1)[evict_num:]
+        self._ids[:keep_num] = self._ids[kept]
+        self._vectors[:keep_num] = self._vectors[kept]
+        self._versions[:keep_num] = self._versions[kept]
+        self._scores[:keep_num] = self._scores[kept]
+        self._size = keep_num
+        self._index.reset(self._ids[:keep_num])
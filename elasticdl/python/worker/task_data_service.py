@@ -7,12 +7,19 @@ import tensorflow as tf
 from elasticdl.proto import elasticdl_pb2
 from elasticdl.python.common.constants import TaskExecCounterKey
 from elasticdl.python.common.log_utils import default_logger as logger
+from elasticdl.python.data.parallel_task_reader import ParallelTaskReader
 from elasticdl.python.data.reader.data_reader_factory import create_data_reader
+from elasticdl.python.worker.task_prefetcher import TaskPrefetcher
 
 
 class TaskDataService(object):
     def __init__(
-        self, worker, training_with_evaluation, data_reader_params=None
+        self,
+        worker,
+        training_with_evaluation,
+        data_reader_params=None,
+        data_reader_processes=0,
+        prefetch_tasks=0,
     ):
         self._worker = worker
         self._create_data_reader_fn = create_data_reader
@@ -34,6 +41,62 @@ class TaskDataService(object):
         self._reported_record_count = 0
         self._current_task = None
         self._pending_tasks = deque()
+        # If the data reader provides `record_parse_fn`, the records are
+        # parsed by it before they are passed to `tf.data`, and the dataset
+        # has the declared `parsed_records_output_types` and
+        # `parsed_records_output_shapes` of a record.
+        self._record_parse_fn = None
+        if hasattr(self.data_reader, "record_parse_fn"):
+            self._record_parse_fn = self.data_reader.record_parse_fn()
+        self._parallel_task_reader = None
+        if data_reader_processes > 0:
+            # The records are parsed in the reader processes, which send
+            # them as column arrays of chunks of records.
+            output_dtypes = None
+            if self._record_parse_fn is not None:
+                output_dtypes = [
+                    tf.as_dtype(dtype).as_numpy_dtype
+                    for dtype in self.data_reader.parsed_records_output_types
+                ]
+            self._parallel_task_reader = ParallelTaskReader(
+                self.data_reader,
+                data_reader_processes,
+                record_parse_fn=self._record_parse_fn,
+                output_dtypes=output_dtypes,
+            )
+        # If the data reader provides `read_record_batches`, the records
+        # read in this process are passed to `tf.data` in batches.
+        self._read_record_batches = (
+            self._parallel_task_reader is None
+            and self._record_parse_fn is None
+            and hasattr(self.data_reader, "read_record_batches")
+        )
+        self._read_records_fn = (
+            self.data_reader.read_record_batches
+            if self._read_record_batches
+            else self.data_reader.read_records
+        )
+        # The records of tasks are opened in the prefetcher only if they are
+        # read in this process.
+        self._task_prefetcher = None
+        if prefetch_tasks > 0:
+            self._task_prefetcher = TaskPrefetcher(
+                self._worker,
+                self._read_records_fn,
+                prefetch_tasks,
+                open_readers=self._parallel_task_reader is None,
+                buffered_records=1 if self._read_record_batches else 64,
+            )
+
+    def close(self):
+        """
+        Stop the processes reading records if any, and release the
+        resources of the data reader.
+        """
+        if self._parallel_task_reader:
+            self._parallel_task_reader.close()
+        if hasattr(self.data_reader, "close"):
+            self.data_reader.close()
 
     def _reset(self):
         """
@@ -72,6 +135,16 @@ class TaskDataService(object):
         )
         logger.warning(msg)
 
+    def is_task_done_after(self, count):
+        """
+        Return True if reporting `count` more records by
+        `report_record_done` finishes the current task.
+        """
+        if not self._pending_tasks:
+            return False
+        task = self._pending_tasks[0]
+        return self._reported_record_count + count >= task.end - task.start
+
     def report_record_done(self, count, err_msg=""):
         """
         Report the number of records in the latest processed batch,
@@ -119,10 +192,31 @@ class TaskDataService(object):
             for task in tasks:
                 for data in self.data_reader.read_records(task):
                     if data:
-                        yield data
+                        yield self._parse_record(data)
 
         return gen
 
+    def _parse_record(self, record):
+        if self._record_parse_fn is None:
+            return record
+        return tuple(self._record_parse_fn(record))
+
+    def _create_dataset_from_generator(self, gen):
+        """Creates a `tf.data.Dataset` of the records, or the parsed
+        records, yielded by `gen`."""
+        if self._record_parse_fn is None:
+            return tf.data.Dataset.from_generator(
+                gen, self.data_reader.records_output_types
+            )
+        return tf.data.Dataset.from_generator(
+            gen,
+            tuple(self.data_reader.parsed_records_output_types),
+            tuple(
+                tf.TensorShape(shape)
+                for shape in self.data_reader.parsed_records_output_shapes
+            ),
+        )
+
     def get_save_model_task_and_dataset(self):
         if not self._pending_save_model_task:
             return None, None
@@ -131,9 +225,7 @@ class TaskDataService(object):
         self._pending_save_model_task = None
 
         gen = self.get_dataset_gen(task)
-        dataset = tf.data.Dataset.from_generator(
-            gen, self.data_reader.records_output_types
-        )
+        dataset = self._create_dataset_from_generator(gen)
         return task, dataset
 
     def get_dataset(self):
@@ -170,9 +262,26 @@ class TaskDataService(object):
                     for _ in self.data_reader.read_records(task):
                         break
                     self._has_warmed_up = True
-            ds = tf.data.Dataset.from_generator(
-                self._gen, self.data_reader.records_output_types
-            )
+            if self._read_record_batches:
+                ds = tf.data.Dataset.from_generator(
+                    self._gen,
+                    self.data_reader.records_output_types,
+                    tf.TensorShape([None]),
+                ).unbatch()
+            elif self._record_parse_fn and self._parallel_task_reader:
+                # The reader processes yield column arrays of chunks
+                ds = tf.data.Dataset.from_generator(
+                    self._gen,
+                    tuple(self.data_reader.parsed_records_output_types),
+                    tuple(
+                        tf.TensorShape([None]).concatenate(shape)
+                        for shape in (
+                            self.data_reader.parsed_records_output_shapes
+                        )
+                    ),
+                ).unbatch()
+            else:
+                ds = self._create_dataset_from_generator(self._gen)
             self._pending_dataset = False
             return ds
         else:
@@ -183,28 +292,73 @@ class TaskDataService(object):
         A generator supports the iter() protocol (e.g. a generator function),
         used to create a `tf.data.Dataset` object from a list of tasks.
         """
-        while True:
-            # Make sure we also generate data from the warm-up task.
-            if self._warm_up_task is not None and self._has_warmed_up:
-                task = self._warm_up_task
-                self._warm_up_task = None
+        tasks = self._gen_tasks()
+        try:
+            if self._parallel_task_reader:
+                for data in self._parallel_task_reader.read(tasks):
+                    yield data
+                return
+            for task in tasks:
+                for data in self._read_records(task):
+                    if data:
+                        yield self._parse_record(data)
+        finally:
+            tasks.close()
+
+    def _read_records(self, task):
+        if self._task_prefetcher:
+            return self._task_prefetcher.read_records(task)
+        return self._read_records_fn(task)
+
+    def _return_prefetched_tasks(self):
+        """
+        Stop prefetching tasks and return the prefetched tasks which are
+        not read to the master, so that they can be dispatched again.
+        """
+        for task in self._task_prefetcher.stop():
+            if task.type == elasticdl_pb2.SAVE_MODEL:
+                self._pending_save_model_task = task
             else:
-                task = self._worker.get_task()
-            if not task.shard_name:
-                if task.type == elasticdl_pb2.WAIT:
-                    self._pending_dataset = True
-                    logger.info("No tasks for now, maybe more later")
-                else:
-                    logger.info("No more task, stopping")
-                break
-            with self._lock:
-                if task.type == elasticdl_pb2.SAVE_MODEL:
-                    self._pending_save_model_task = task
-                    continue
+                self._worker.report_task_result(
+                    task.task_id, "", returned=True
+                )
 
-                self._pending_tasks.append(task)
-                if len(self._pending_tasks) == 1:
-                    self._current_task = task
-            for data in self.data_reader.read_records(task):
-                if data:
-                    yield data
+    def _gen_tasks(self):
+        """
+        A generator of the tasks to read, which are appended to the pending
+        tasks before their records are read.
+        """
+        if self._task_prefetcher:
+            self._task_prefetcher.start()
+        try:
+            while True:
+                task = self._next_task()
+                if not task.shard_name:
+                    if task.type == elasticdl_pb2.WAIT:
+                        self._pending_dataset = True
+                        logger.info("No tasks for now, maybe more later")
+                    else:
+                        logger.info("No more task, stopping")
+                    break
+                with self._lock:
+                    if task.type == elasticdl_pb2.SAVE_MODEL:
+                        self._pending_save_model_task = task
+                        continue
+
+                    self._pending_tasks.append(task)
+                    if len(self._pending_tasks) == 1:
+                        self._current_task = task
+                yield task
+        finally:
+            if self._task_prefetcher:
+                self._return_prefetched_tasks()
+
+    def _next_task(self):
+        # Make sure we also generate data from the warm-up task.
+        if self._warm_up_task is not None and self._has_warmed_up:
+            task = self._warm_up_task
+            self._warm_up_task = None
+            return task
+        if self._task_prefetcher:
+            return self._task_prefetcher.get_task()
+        return self._worker.get_task()
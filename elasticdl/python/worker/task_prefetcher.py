@@ -0,0 +1,130 @@
+import itertools
+import queue
+import threading
+
+from elasticdl.proto import elasticdl_pb2
+
+
+class TaskPrefetcher(object):
+    """Leases the next tasks from the master in a background thread, so
+    that a worker does not wait for `get_task` at the boundary of tasks.
+
+    At most `num_tasks` tasks are leased ahead of the task being read. If
+    `open_readers` is True, the records of a prefetched task are opened with
+    `read_records_fn` and the first `buffered_records` items are read in
+    the background thread, which hides the latency of opening a shard.
+
+    The prefetcher stops after leasing a task without a shard name, i.e.
+    a WAIT task or no more tasks, and `start` should be called again to
+    lease tasks later. The tasks are got in the order they are leased.
+    """
+
+    def __init__(
+        self,
+        worker,
+        read_records_fn,
+        num_tasks,
+        open_readers=True,
+        buffered_records=64,
+    ):
+        """
+        Args:
+            worker: The worker to get tasks from the master.
+            read_records_fn: The function to open the records of a task,
+                e.g. `read_records` of a data reader, which returns an
+                iterator of records or batches of records.
+            num_tasks: The maximum number of tasks leased ahead.
+            open_readers: Whether to open the records of prefetched tasks.
+            buffered_records: The number of items read from the iterator
+                of a task when it is opened.
+        """
+        self._worker = worker
+        self._read_records_fn = read_records_fn
+        self._num_tasks = num_tasks
+        self._open_readers = open_readers
+        self._buffered_records = buffered_records
+        self._thread = None
+        # Task id -> (buffered records, iterator of the rest records)
+        self._records = {}
+
+    def start(self):
+        """Starts leasing tasks in a background thread."""
+        self.stop()
+        # A queue of (task, records, error) in the order tasks are leased
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(self._num_tasks)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._prefetch, daemon=True)
+        self._thread.start()
+
+    def _prefetch(self):
+        try:
+            while True:
+                self._slots.acquire()
+                if self._stopped.is_set():
+                    return
+                task = self._worker.get_task()
+                records = None
+                if (
+                    self._open_readers
+                    and task.shard_name
+                    and task.type != elasticdl_pb2.SAVE_MODEL
+                ):
+                    records = self._open_records(task)
+                self._queue.put((task, records, None))
+                if not task.shard_name:
+                    return
+        except Exception as e:
+            self._queue.put((None, None, e))
+
+    def _open_records(self, task):
+        try:
+            records = iter(self._read_records_fn(task))
+            buffered_records = list(
+                itertools.islice(records, self._buffered_records)
+            )
+        except Exception:
+            # The records are opened again when the task is read, so that
+            # the error is raised while reading the task.
+            return None
+        return buffered_records, records
+
+    def get_task(self):
+        """Gets the next leased task. It should not be called after a task
+        without a shard name is got, until `start` is called again."""
+        task, records, err = self._queue.get()
+        self._slots.release()
+        if err is not None:
+            raise err
+        if records is not None:
+            self._records[task.task_id] = records
+        return task
+
+    def read_records(self, task):
+        """Returns an iterator of the records of `task`, starting from the
+        records buffered when it was prefetched."""
+        records = self._records.pop(task.task_id, None)
+        if records is None:
+            return self._read_records_fn(task)
+        buffered_records, rest_records = records
+        return itertools.chain(buffered_records, rest_records)
+
+    def stop(self):
+        """Stops leasing tasks and returns the leased tasks which are not
+        got by `get_task` in order."""
+        if self._thread is None:
+            return []
+        self._stopped.set()
+        self._slots.release()
+        self._thread.join()
+        self._thread = None
+
+        tasks = []
+        while not self._queue.empty():
+            task, records, _ = self._queue.get()
+            if task is not None and task.shard_name:
+                tasks.append(task)
+            if records is not None and hasattr(records[1], "close"):
+                records[1].close()
+        self._records = {}
+        return tasks
@@ -1,8 +1,12 @@
+import collections
+import itertools
 import os
 import socket
 import time
 import traceback
+from concurrent import futures
 
+import grpc
 import numpy as np
 import tensorflow as tf
 
@@ -16,8 +20,9 @@ from elasticdl.python.common.constants import (
     Mode,
     SaveModelConfig,
 )
+from elasticdl.python.common.gradient_compression import GradientCompressor
 from elasticdl.python.common.hash_utils import (
-    int_to_id,
+    partition_ids,
     scatter_embedding_vector,
     string_to_id,
 )
@@ -31,14 +36,18 @@ from elasticdl.python.common.model_utils import (
 )
 from elasticdl.python.common.tensor import (
     Tensor,
+    TensorChunkAssembler,
+    emplace_tensor_chunk_pb,
     emplace_tensor_pb_from_ndarray,
     serialize_tensor,
+    split_tensor_to_chunks,
     tensor_pb_to_ndarray,
 )
 from elasticdl.python.common.tensor_utils import deduplicate_indexed_slices
 from elasticdl.python.common.timing_utils import Timing
 from elasticdl.python.elasticdl.feature_column import feature_column
 from elasticdl.python.elasticdl.layers.embedding import Embedding
+from elasticdl.python.worker.embedding_cache import EmbeddingCache
 from elasticdl.python.worker.task_data_service import TaskDataService
 
 # The default maximum number of a minibatch retry as its results
@@ -163,6 +172,8 @@ class Worker(object):
             data_reader_params=get_dict_from_params_str(
                 args.data_reader_params
             ),
+            data_reader_processes=args.data_reader_processes,
+            prefetch_tasks=args.prefetch_tasks,
         )
         if self._dataset_fn is None:
             if hasattr(
@@ -177,9 +188,34 @@ class Worker(object):
                     "not provide default implementation of dataset_fn"
                 )
         self._get_model_steps = args.get_model_steps
+        self._gradient_compression = args.gradient_compression
+        self._grad_compressor = GradientCompressor(
+            args.gradient_compression, args.gradient_compression_top_k_ratio
+        )
+        self._tensor_chunk_bytes = args.tensor_chunk_bytes
+        self._max_inflight_gradient_pushes = args.max_inflight_gradient_pushes
+        # A deque of (report futures, dense gradient names of each PS) of
+        # the gradient pushes in flight, in the order they are sent.
+        self._inflight_gradient_pushes = collections.deque()
+        # The error message of the failed pushes in flight, which is
+        # reported with the task when its pushes are completed.
+        self._gradient_push_err_msg = ""
+        self._prefetch_embedding_vectors = args.prefetch_embedding_vectors
+        self._embedding_cache = (
+            EmbeddingCache(
+                args.embedding_cache_size,
+                args.embedding_cache_policy,
+                args.embedding_cache_staleness,
+            )
+            if args.embedding_cache_size
+            else None
+        )
         if self._get_model_steps > 1:
             self._opt = self._opt_fn()
         self._non_embed_grads = {}
+        # Whether `_non_embed_vars` diverges from the model versions pulled
+        # from PS because of local updates.
+        self._local_model_updated = False
         self._evaluation_result = {}
 
     # TODO: Multiple tests are currently using this function to initialize
@@ -187,7 +223,6 @@ class Worker(object):
     def set_model(self, model_inst):
         """Set model instance to worker."""
         self._model = model_inst
-        self._train_eagerly = False
         self._init_embeddings()
         self._var_created = self._model.built
         self._non_embed_vars = {}
@@ -204,9 +239,15 @@ class Worker(object):
         Init elasticdl.layers.embedding layer list and assign worker to them
         """
         self._embedding_layers = find_layer(self._model, Embedding)
+        self._embedding_ids_model = None
+        self._minibatch_embedding_vectors = {}
+        # A list of (features, function to wait for embedding vectors) of
+        # the minibatches whose embedding vectors are being prefetched.
+        self._prefetched_embedding_vectors = []
         if self._use_multi_ps:
             for layer in self._embedding_layers:
                 layer.set_lookup_embedding_func(self.pull_embedding_vector)
+            self._embedding_ids_model = self._build_embedding_ids_model()
 
     def _init_embedding_column(self):
         self._embedding_columns = []
@@ -253,12 +294,6 @@ class Worker(object):
         if self._use_multi_ps:
             self.report_embedding_info()
 
-        self._need_embedding_layer_check = (
-            True
-            if self._embedding_layers or self._embedding_columns
-            else False
-        )
-
     def _set_tape_for_embedding(self, tape):
         for layer in self._embedding_layers:
             layer.set_tape(tape)
@@ -280,6 +315,7 @@ class Worker(object):
             zip(self._non_embed_grads, self._non_embed_vars.values())
         )
         self._non_embed_grads = None
+        self._local_model_updated = True
 
     def get_task(self, task_type=None):
         """
@@ -292,78 +328,372 @@ class Worker(object):
 
         return self._stub.get_task(req)
 
+    def _get_current_model_version_for_pull(self, ps_id):
+        # PS only sends the parameters modified after the current model
+        # version, so request all parameters if the local model has been
+        # updated locally.
+        if self._local_model_updated:
+            return -1
+        return self._model_versions_from_ps[ps_id]
+
+    def _pull_variable_from_ps(self, ps_id):
+        """Starts to pull variables from PS `ps_id` and returns an iterator
+        of the responses, which has a single response unless
+        `tensor_chunk_bytes` is positive."""
+        req = elasticdl_pb2.PullVariableRequest()
+        req.current_model_version = self._get_current_model_version_for_pull(
+            ps_id
+        )
+        stub = self._ps_stubs[ps_id]
+        if self._tensor_chunk_bytes:
+            req.max_chunk_bytes = self._tensor_chunk_bytes
+            return stub.pull_variable_stream(req)
+        # async grpc call
+        var_future = stub.pull_variable.future(req)
+        return (future.result() for future in [var_future])
+
     def get_model(self):
         self._timing.start_record_time("get_model")
-        variable_future_and_id_pairs = []
+        variable_responses_and_id_pairs = []
         if self._use_multi_ps:
             self.init_ps_var_partition()
-        for ps_id, stub in enumerate(self._ps_stubs):
+        for ps_id in range(self._ps_num):
             if ps_id not in self._ps_vars:
                 continue
-            # async grpc call
-            req = elasticdl_pb2.PullVariableRequest()
-            req.current_model_version = self._model_versions_from_ps[ps_id]
-            var_future = stub.pull_variable.future(req)
-            variable_future_and_id_pairs.append((var_future, ps_id))
-
-        for var_future, ps_id in variable_future_and_id_pairs:
-            res = var_future.result()
+            variable_responses_and_id_pairs.append(
+                (self._pull_variable_from_ps(ps_id), ps_id)
+            )
+
+        first_responses = []
+        uninitialized_ps_ids = []
+        for responses, ps_id in variable_responses_and_id_pairs:
+            res = next(responses)
             if not res.model_init_status:
-                # push variable to ps for initialization
-                self.report_variable_to_ps(ps_id)
-                req = elasticdl_pb2.PullVariableRequest()
-                req.current_model_version = self._model_versions_from_ps[ps_id]
-                res = self._ps_stubs[ps_id].pull_variable(req)
+                uninitialized_ps_ids.append(ps_id)
+            first_responses.append((res, responses, ps_id))
+        if uninitialized_ps_ids:
+            # push variable to ps for initialization
+            self._report_variables_to_ps(uninitialized_ps_ids)
+            repulled_responses = {
+                ps_id: self._pull_variable_from_ps(ps_id)
+                for ps_id in uninitialized_ps_ids
+            }
+
+        for res, responses, ps_id in first_responses:
+            if not res.model_init_status:
+                responses = repulled_responses[ps_id]
+                res = next(responses)
                 if not res.model_init_status:
                     # TODO: support PS fault-tolerance
                     raise RuntimeError(
                         "PS pod %d cannot be initialized" % ps_id
                     )
 
-            for tensor_pb in res.model.param:
-                tensor = Tensor.from_tensor_pb(tensor_pb)
-                self._non_embed_vars[tensor.name].assign(tensor.to_ndarray())
-            self._model_versions_from_ps[ps_id] = res.model.version
+            # Only the parameters modified after the current model version
+            # are in the responses.
+            assembler = TensorChunkAssembler()
+            for res in itertools.chain([res], responses):
+                for tensor_pb in res.model.param:
+                    tensor = assembler.add(tensor_pb)
+                    if tensor is not None:
+                        self._non_embed_vars[tensor.name].assign(
+                            tensor.to_ndarray()
+                        )
+                self._model_versions_from_ps[ps_id] = res.model.version
+            assembler.finish()
 
+        self._local_model_updated = False
         self._model_version = max(self._model_versions_from_ps)
         self._timing.end_record_time("get_model")
 
     def pull_embedding_vector(self, layer_name, embedding_ids):
-        """Pulls and returns embedding vectors ordered by the embedding ids."""
-        ps_ids = {}
-        ps_ids_index = {}
-        for idx, embedding_id in enumerate(embedding_ids):
-            ps_id = int_to_id(embedding_id, self._ps_num)
-            ps_ids.setdefault(ps_id, []).append(embedding_id)
-            ps_ids_index.setdefault(ps_id, []).append(idx)
-
-        embeddings = []
-        index = []
+        """Pulls and returns embedding vectors ordered by the embedding ids.
+
+        The vectors are taken from the embedding vectors pulled for the
+        current minibatch by `_pull_embedding_vectors_of_minibatch` if all
+        the ids are there.
+        """
+        prefetched = self._minibatch_embedding_vectors.get(layer_name)
+        if prefetched is not None:
+            prefetched_ids, prefetched_vectors = prefetched
+            positions = np.searchsorted(prefetched_ids, embedding_ids)
+            positions = np.minimum(positions, len(prefetched_ids) - 1)
+            if np.array_equal(prefetched_ids[positions], embedding_ids):
+                return prefetched_vectors[positions]
+        return self.pull_embedding_vectors([(layer_name, embedding_ids)])[0]
+
+    def pull_embedding_vectors(self, name_and_ids):
+        """Pulls embedding vectors of multiple embedding tables with one
+        call to each PS.
+
+        Vectors in the embedding cache, which are at most
+        `--embedding_cache_staleness` model versions behind, are not
+        pulled again.
+
+        Args:
+            name_and_ids: A list of (embedding table name, embedding ids).
+
+        Returns:
+            A list of numpy.ndarray of embedding vectors ordered by the
+            embedding ids of each table.
+        """
+        return self._start_pulling_embedding_vectors(name_and_ids)()
+
+    def _start_pulling_embedding_vectors(self, name_and_ids):
+        """Sends the requests of `pull_embedding_vectors` without waiting
+        for the responses.
+
+        Returns:
+            A function which waits for the responses and returns the
+            embedding vectors like `pull_embedding_vectors`.
+        """
+        if self._embedding_cache is None:
+            return self._start_pulling_embedding_vectors_from_ps(name_and_ids)
+
+        version = self._model_version
+        lookups = []
+        missed_name_and_ids = []
+        for name, embedding_ids in name_and_ids:
+            ids = np.asarray(embedding_ids, dtype=np.int64)
+            hit, vectors = self._embedding_cache.lookup(name, ids, version)
+            hit_num = np.count_nonzero(hit)
+            self._timing.add_count("embedding_cache_hits", hit_num)
+            self._timing.add_count(
+                "embedding_cache_misses", len(ids) - hit_num
+            )
+            if vectors is not None:
+                self._timing.add_count(
+                    "embedding_cache_bytes_saved", vectors.nbytes
+                )
+            if hit_num < len(ids):
+                missed_name_and_ids.append((name, ids[~hit]))
+            lookups.append((ids, hit, vectors))
+        wait_for_missed = self._start_pulling_embedding_vectors_from_ps(
+            missed_name_and_ids
+        )
+
+        def _wait():
+            pulled_vectors = iter(wait_for_missed())
+            embeddings = []
+            for (name, _), (ids, hit, cached) in zip(name_and_ids, lookups):
+                if hit.all():
+                    embeddings.append(cached)
+                    continue
+                pulled = next(pulled_vectors)
+                self._embedding_cache.insert(name, ids[~hit], pulled, version)
+                if cached is None:
+                    embeddings.append(pulled)
+                    continue
+                vectors = np.empty(
+                    (len(ids),) + pulled.shape[1:], dtype=pulled.dtype
+                )
+                vectors[hit] = cached
+                vectors[~hit] = pulled
+                embeddings.append(vectors)
+            return embeddings
+
+        return _wait
+
+    def _start_pulling_embedding_vectors_from_ps(self, name_and_ids):
+        reqs = {}
+        # The indices in `name_and_ids` of the tables in the request to
+        # each PS, and the ids of each table ordered by PS ids.
+        ps_table_indices = {}
+        table_inverses = []
+        for i, (name, embedding_ids) in enumerate(name_and_ids):
+            ids = np.asarray(embedding_ids, dtype=np.int64)
+            order, offsets, inverse = partition_ids(ids, self._ps_num)
+            ids = ids[order]
+            ps_ids = np.flatnonzero(offsets[1:] > offsets[:-1])
+            for ps_id in ps_ids:
+                if ps_id not in reqs:
+                    reqs[ps_id] = elasticdl_pb2.PullEmbeddingVectorsRequest()
+                    ps_table_indices[ps_id] = []
+                req = reqs[ps_id].requests.add()
+                req.name = name
+                begin, end = offsets[ps_id], offsets[ps_id + 1]
+                req.ids.extend(ids[begin:end].tolist())
+                ps_table_indices[ps_id].append(i)
+            # The ids are on a single PS in their original order
+            table_inverses.append(inverse if len(ps_ids) > 1 else None)
+
         pb_future_and_id_pairs = []
-        for ps_id, embedding_ids in ps_ids.items():
-            req = elasticdl_pb2.PullEmbeddingVectorRequest()
-            req.name = layer_name
-            req.ids.extend(embedding_ids)
-            pb_future = self._ps_stubs[ps_id].pull_embedding_vector.future(req)
+        for ps_id, req in reqs.items():
+            pb_future = self._ps_stubs[ps_id].pull_embedding_vectors.future(
+                req
+            )
             pb_future_and_id_pairs.append((pb_future, ps_id))
-        for pb_future, ps_id in pb_future_and_id_pairs:
-            pb = pb_future.result()
-            embeddings.append(tensor_pb_to_ndarray(pb))
-            index.extend(ps_ids_index[ps_id])
-        embeddings = np.concatenate(embeddings)
-
-        # adjust the order of embedding vectors
-        new_embeddings = np.empty_like(embeddings)
-        new_embeddings[index] = embeddings
-        return new_embeddings
-
-    def report_task_result(self, task_id, err_msg, exec_counters=None):
+
+        def _wait():
+            table_vectors = [{} for _ in name_and_ids]
+            for pb_future, ps_id in pb_future_and_id_pairs:
+                res = pb_future.result()
+                for i, pb in zip(
+                    ps_table_indices[ps_id], res.embedding_vectors
+                ):
+                    table_vectors[i][ps_id] = tensor_pb_to_ndarray(pb)
+            embeddings = []
+            for ps_vectors, inverse in zip(table_vectors, table_inverses):
+                if not ps_vectors:
+                    embeddings.append(None)
+                elif inverse is None:
+                    embeddings.append(next(iter(ps_vectors.values())))
+                else:
+                    # Restore the order of ids from the order of PS ids
+                    vectors = np.concatenate(
+                        [ps_vectors[ps_id] for ps_id in sorted(ps_vectors)]
+                    )
+                    embeddings.append(vectors[inverse])
+            return embeddings
+
+        return _wait
+
+    def _build_embedding_ids_model(self):
+        """Builds a Keras model which computes the inputs of ElasticDL
+        embedding layers from the features, so that the embedding vectors
+        of a minibatch can be pulled before the forward pass. Returns None
+        if the model is not a functional model or an embedding layer is
+        called more than once."""
+        if not self._embedding_layers:
+            return None
+        try:
+            inputs = [layer.input for layer in self._embedding_layers]
+            return tf.keras.Model(inputs=self._model.input, outputs=inputs)
+        except (AttributeError, ValueError):
+            return None
+
+    def _start_pulling_embedding_vectors_of_minibatch(self, embedding_inputs):
+        """Sends the requests to pull the embedding vectors of ElasticDL
+        embedding layers needed by a minibatch, with one call to each PS.
+
+        Args:
+            embedding_inputs: The outputs of `_embedding_ids_model` for the
+                features of the minibatch.
+
+        Returns:
+            A function which waits for the responses and returns a dict
+            from the embedding layer names to tuples of (sorted unique ids,
+            embedding vectors).
         """
-        report task result to master
+        if len(self._embedding_layers) == 1:
+            embedding_inputs = [embedding_inputs]
+        name_and_ids = []
+        for layer, ids in zip(self._embedding_layers, embedding_inputs):
+            if isinstance(ids, tf.SparseTensor):
+                ids = ids.values
+            ids = np.unique(tf.cast(ids, tf.int64).numpy())
+            if ids.size:
+                name_and_ids.append((layer.name, ids))
+        if not name_and_ids:
+            return lambda: {}
+        wait_for_vectors = self._start_pulling_embedding_vectors(name_and_ids)
+
+        def _wait():
+            return {
+                name: (ids, vectors)
+                for (name, ids), vectors in zip(
+                    name_and_ids, wait_for_vectors()
+                )
+            }
+
+        return _wait
+
+    def _iterate_prefetching_embedding_vectors(self, dataset):
+        """Yields the minibatches of `dataset`. The embedding vectors of a
+        minibatch are requested with one call to each PS before the
+        minibatch is yielded. If `--prefetch_embedding_vectors` is set, the
+        embedding vectors of the next minibatch are requested as well, so
+        that pulling them overlaps processing the minibatch.
+
+        The inputs of the embedding layers are computed by
+        `_embedding_ids_model` in the `tf.data` pipeline, so that the
+        training loop does not run another model call for them.
+        """
+        if self._embedding_ids_model is None:
+            yield from dataset
+            return
+
+        def _add_embedding_inputs(*dataset_batch):
+            if len(dataset_batch) == 1:
+                dataset_batch = dataset_batch[0]
+            features = (
+                dataset_batch
+                if self._job_type == JobType.PREDICTION_ONLY
+                else dataset_batch[0]
+            )
+            return dataset_batch, self._embedding_ids_model(features)
+
+        def _start_pulling(dataset_batch, embedding_inputs):
+            features = (
+                dataset_batch
+                if self._job_type == JobType.PREDICTION_ONLY
+                else dataset_batch[0]
+            )
+            self._prefetched_embedding_vectors.append(
+                (
+                    features,
+                    self._start_pulling_embedding_vectors_of_minibatch(
+                        embedding_inputs
+                    ),
+                )
+            )
+
+        self._prefetched_embedding_vectors = []
+        iterator = iter(dataset.map(_add_embedding_inputs).prefetch(1))
+        if not self._prefetch_embedding_vectors:
+            for element in iterator:
+                _start_pulling(*element)
+                yield element[0]
+            self._prefetched_embedding_vectors = []
+            return
+
+        element = next(iterator, None)
+        if element is not None:
+            _start_pulling(*element)
+        while element is not None:
+            next_element = next(iterator, None)
+            if next_element is not None:
+                _start_pulling(*next_element)
+            yield element[0]
+            element = next_element
+        self._prefetched_embedding_vectors = []
+
+    def _pull_embedding_vectors_of_minibatch(self, features):
+        """Pulls the embedding vectors of ElasticDL embedding layers needed
+        by the minibatch `features` with one call to each PS before the
+        forward pass. The vectors requested by
+        `_iterate_prefetching_embedding_vectors` are used if there are,
+        otherwise the inputs of the embedding layers are computed by
+        `_embedding_ids_model`. If the model can not compute them, the
+        embedding layers pull their vectors when they are called."""
+        self._minibatch_embedding_vectors = {}
+        if self._embedding_ids_model is None:
+            return
+        for i, (prefetched_features, wait) in enumerate(
+            self._prefetched_embedding_vectors
+        ):
+            if prefetched_features is features:
+                del self._prefetched_embedding_vectors[: i + 1]
+                self._minibatch_embedding_vectors = wait()
+                return
+        embedding_inputs = self._embedding_ids_model(features)
+        self._minibatch_embedding_vectors = (
+            self._start_pulling_embedding_vectors_of_minibatch(
+                embedding_inputs
+            )()
+        )
+
+    def report_task_result(
+        self, task_id, err_msg, exec_counters=None, returned=False
+    ):
+        """
+        report task result to master. If `returned` is True, the task is
+        returned to the master without being processed.
         """
         report = elasticdl_pb2.ReportTaskResultRequest()
         report.task_id = task_id
         report.err_message = err_msg
+        report.returned = returned
         if isinstance(exec_counters, dict):
             report.exec_counters.update(exec_counters)
         return self._stub.report_task_result(report)
@@ -401,10 +731,23 @@ class Worker(object):
                 # tf.keras.initializers. Keep aligned between these two.
                 embedding_info.initializer = "uniform"
 
-        for ps_id in range(self._ps_num):
-            self._ps_stubs[ps_id].push_embedding_info(model)
+        report_futures = [
+            self._ps_stubs[ps_id].push_embedding_info.future(model)
+            for ps_id in range(self._ps_num)
+        ]
+        for report_future in report_futures:
+            report_future.result()
 
     def report_variable_to_ps(self, ps_id):
+        self._start_reporting_variable_to_ps(ps_id).result()
+
+    def _start_reporting_variable_to_ps(self, ps_id):
+        """Sends the request to push variables to PS `ps_id` and returns
+        the gRPC future of the call."""
+        if self._tensor_chunk_bytes:
+            return self._ps_stubs[ps_id].push_model_stream.future(
+                self._model_request_stream(ps_id)
+            )
         model = elasticdl_pb2.Model()
         model.version = self._model_versions_from_ps[ps_id]
         if ps_id in self._ps_vars:
@@ -413,12 +756,40 @@ class Worker(object):
                 emplace_tensor_pb_from_ndarray(
                     model.param, var.numpy(), name=var.name
                 )
-        self._ps_stubs[ps_id].push_model(model)
+        return self._ps_stubs[ps_id].push_model.future(model)
+
+    def _model_request_stream(self, ps_id):
+        """Yields the requests of `push_model_stream` to PS `ps_id`. Only one
+        variable is copied out of TensorFlow at a time."""
+        model = elasticdl_pb2.Model()
+        model.version = self._model_versions_from_ps[ps_id]
+        yield model
+        for var in self._ps_vars.get(ps_id, []):
+            tensor = Tensor(var.numpy(), name=var.name)
+            for chunk, row_offset, total_rows in split_tensor_to_chunks(
+                tensor, self._tensor_chunk_bytes
+            ):
+                model = elasticdl_pb2.Model()
+                emplace_tensor_chunk_pb(
+                    model.param, chunk, row_offset, total_rows
+                )
+                yield model
 
     def report_variable(self):
-        # TODO: call `push_model` in parallel
-        for ps_id in range(self._ps_num):
-            self.report_variable_to_ps(ps_id)
+        self._report_variables_to_ps(range(self._ps_num))
+
+    def _report_variables_to_ps(self, ps_ids):
+        """Pushes variables to PS `ps_ids` in parallel. The requests to PS
+        are encoded in a thread pool and sent with gRPC futures."""
+        ps_ids = list(ps_ids)
+        if not ps_ids:
+            return
+        with futures.ThreadPoolExecutor(max_workers=len(ps_ids)) as executor:
+            report_futures = list(
+                executor.map(self._start_reporting_variable_to_ps, ps_ids)
+            )
+        for report_future in report_futures:
+            report_future.result()
 
     def _collect_edl_embedding_name_values(self):
         """
@@ -442,7 +813,42 @@ class Worker(object):
         return embedding_name_values
 
     def report_gradient_to_ps(self, grads):
+        """Pushes gradients to PS.
+
+        If `--max_inflight_gradient_pushes` is positive, it returns after
+        the requests are sent, and waits for the earliest pushes only if
+        that many pushes are in flight. The failures of earlier pushes do
+        not affect `grads`, they are reported with the task by
+        `_complete_gradient_pushes`.
+
+        Returns:
+            A tuple (accepted, model version).
+        """
         self._timing.start_record_time("report_gradient")
+        if not self._max_inflight_gradient_pushes:
+            accepted, max_version = self._wait_for_gradient_push(
+                self._send_gradients_to_ps(grads)
+            )
+        else:
+            max_version = self._wait_for_gradient_pushes(
+                self._max_inflight_gradient_pushes - 1
+            )
+            self._inflight_gradient_pushes.append(
+                self._send_gradients_to_ps(grads)
+            )
+            accepted = True
+            max_version = max(max_version, self._model_version)
+        self._timing.end_record_time("report_gradient")
+        return accepted, max_version
+
+    def _send_gradients_to_ps(self, grads):
+        """Sends the requests to push gradients to PS without waiting for
+        the responses.
+
+        Returns:
+            A tuple (report futures, dense gradient names of each PS) to
+            wait for by `_wait_for_gradient_push`.
+        """
         reqs = [
             elasticdl_pb2.PushGradientRequest() for i in range(self._ps_num)
         ]
@@ -457,11 +863,15 @@ class Worker(object):
             else:
                 ps_grads[ps_id].append((g, v.name))
 
-        for ps_id in ps_grads:
-            req = reqs[ps_id]
-            for g, name in ps_grads[ps_id]:
-                emplace_tensor_pb_from_ndarray(req.gradients, g, name=name)
+        if not self._tensor_chunk_bytes:
+            for ps_id in ps_grads:
+                req = reqs[ps_id]
+                for g, name in ps_grads[ps_id]:
+                    self._grad_compressor.emplace_gradient_pb(
+                        req.gradients, g, name
+                    )
 
+        ps_embedding_grads = {}
         edl_embedding_name_values = self._collect_edl_embedding_name_values()
 
         if edl_embedding_name_values:
@@ -505,30 +915,116 @@ class Worker(object):
                 )
 
                 for ps_id in results:
-                    req = reqs[ps_id]
                     gv, gi = results[ps_id]
+                    if self._tensor_chunk_bytes:
+                        ps_embedding_grads.setdefault(ps_id, []).append(
+                            Tensor(gv, gi, name)
+                        )
+                        continue
+                    req = reqs[ps_id]
                     emplace_tensor_pb_from_ndarray(
                         req.gradients, values=gv, indices=gi, name=name
                     )
 
         report_futures = []
         for ps_id in range(self._ps_num):
-            req = reqs[ps_id]
-            req.model_version = self._model_versions_from_ps[ps_id]
-            report_future = self._ps_stubs[ps_id].push_gradient.future(req)
+            stub = self._ps_stubs[ps_id]
+            if self._tensor_chunk_bytes:
+                requests = self._gradient_request_stream(
+                    ps_id,
+                    ps_grads.get(ps_id, []),
+                    ps_embedding_grads.get(ps_id, []),
+                )
+                if self._max_inflight_gradient_pushes:
+                    # Compress the gradients before the residuals are
+                    # updated below, instead of in the gRPC thread.
+                    requests = iter(list(requests))
+                report_future = stub.push_gradient_stream.future(requests)
+            else:
+                req = reqs[ps_id]
+                req.model_version = self._model_versions_from_ps[ps_id]
+                req.worker_id = self._worker_id
+                report_future = stub.push_gradient.future(req)
             report_futures.append(report_future)
 
+        ps_grad_names = {
+            ps_id: [name for _, name in dense_grads]
+            for ps_id, dense_grads in ps_grads.items()
+        }
+        if self._max_inflight_gradient_pushes:
+            # The next gradients are compressed before this push completes,
+            # so the residuals are kept without waiting for the responses.
+            # PS accepts all gradients in asynchronous SGD.
+            self._grad_compressor.update_residuals(
+                itertools.chain(*ps_grad_names.values())
+            )
+        return report_futures, ps_grad_names
+
+    def _wait_for_gradient_push(self, push):
+        """Waits for a push sent by `_send_gradients_to_ps`.
+
+        Returns:
+            A tuple (accepted, max model version of PS). `accepted` is True
+            if any PS accepts the gradients.
+        """
+        report_futures, ps_grad_names = push
         accepted = False
         max_version = -1
-        for report_future in report_futures:
+        accepted_names = []
+        for ps_id, report_future in enumerate(report_futures):
             res = report_future.result()
             if res.accepted:
                 accepted = True
+                accepted_names.extend(ps_grad_names.get(ps_id, []))
             if res.model_version > max_version:
                 max_version = res.model_version
-        self._timing.end_record_time("report_gradient")
+        if not self._max_inflight_gradient_pushes:
+            self._grad_compressor.update_residuals(accepted_names)
         return accepted, max_version
 
+    def _wait_for_gradient_pushes(self, max_inflight=0):
+        """Waits for the earliest gradient pushes in flight until at most
+        `max_inflight` pushes are in flight. Pushes which have completed
+        are also collected. The failures of the collected pushes are kept
+        in `self._gradient_push_err_msg`.
+
+        Returns:
+            The max model version of PS.
+        """
+        max_version = -1
+        pushes = self._inflight_gradient_pushes
+        while pushes and (
+            len(pushes) > max_inflight
+            or all(future.done() for future in pushes[0][0])
+        ):
+            try:
+                accepted, version = self._wait_for_gradient_push(
+                    pushes.popleft()
+                )
+                if not accepted:
+                    self._gradient_push_err_msg = "Gradients rejected by PS"
+            except grpc.RpcError as err:
+                self._gradient_push_err_msg = (
+                    "Failed to push gradients to PS: %s" % err
+                )
+                continue
+            max_version = max(max_version, version)
+        return max_version
+
+    def _complete_gradient_pushes(self):
+        """Waits for all the gradient pushes in flight.
+
+        Returns:
+            The error message of the pushes failed since the last call, or
+            an empty string if all of them are accepted.
+        """
+        self._wait_for_gradient_pushes()
+        err_msg = self._gradient_push_err_msg
+        self._gradient_push_err_msg = ""
+        if err_msg:
+            self.logger.warning(err_msg)
+        return err_msg
+
     def report_gradient_locally(self, grads):
         if self._embedding_layers or self._embedding_columns:
             raise ValueError(
@@ -564,6 +1060,41 @@ class Worker(object):
         serialize_tensor(tensor, req.labels)
         self._stub.report_evaluation_metrics(req)
 
+    def _gradient_request_stream(self, ps_id, dense_grads, embedding_grads):
+        """Yields the requests of `push_gradient_stream` to PS `ps_id`.
+
+        Args:
+            ps_id: The id of the PS.
+            dense_grads: A list of (gradient, variable name) of the
+                non-embedding variables on the PS.
+            embedding_grads: A list of ElasticDL `Tensor`s of the
+                ElasticDL embedding gradients on the PS.
+        """
+        req = elasticdl_pb2.PushGradientRequest()
+        req.model_version = self._model_versions_from_ps[ps_id]
+        req.worker_id = self._worker_id
+        yield req
+        tensors = []
+        for g, name in dense_grads:
+            if self._gradient_compression:
+                # A compressed gradient is sent in a single request
+                req = elasticdl_pb2.PushGradientRequest()
+                self._grad_compressor.emplace_gradient_pb(
+                    req.gradients, g, name
+                )
+                yield req
+            else:
+                tensors.append(Tensor(g, name=name))
+        for tensor in itertools.chain(tensors, embedding_grads):
+            for chunk, row_offset, total_rows in split_tensor_to_chunks(
+                tensor, self._tensor_chunk_bytes
+            ):
+                req = elasticdl_pb2.PushGradientRequest()
+                emplace_tensor_chunk_pb(
+                    req.gradients, chunk, row_offset, total_rows
+                )
+                yield req
+
     def report_prediction_outputs(self, predictions):
         if self._prediction_outputs_processor:
             self._prediction_outputs_processor.process(
@@ -578,10 +1109,8 @@ class Worker(object):
         return True
 
     def _run_model_call_before_training(self, features):
-        """Call `self._model.call` before training for two things:
-            * Create variables and report to ps if not created.
-            * Check whether there is an embedding layer that is called
-              more than once during one forward-pass.
+        """Call `self._model.call` before training to create variables and
+        report them to ps if not created.
         """
         if self._embedding_layers:
             with tf.GradientTape() as tape:
@@ -602,18 +1131,6 @@ class Worker(object):
                 self.report_variable()
             self._var_created = True
 
-        if self._need_embedding_layer_check:
-            self._train_eagerly = False
-            for layer in self._embedding_layers:
-                if len(layer.embedding_and_ids) > 1:
-                    self._train_eagerly = True
-                    self.logger.warning(
-                        "ElasticDL embedding layer %s is called more than "
-                        "once, this will make the training process unable "
-                        "to accelerate with tf.function." % (layer.name)
-                    )
-            self._need_embedding_layer_check = False
-
         self._reset_embedding()
 
     def get_trainable_items(self):
@@ -643,18 +1160,13 @@ class Worker(object):
 
         return list(self._non_embed_vars.values()) + bets
 
-    def training_process(self, features, labels):
-        """
-        training for models with elasticdl.layers.embedding does not
-        support tf.function decorator
-        """
-        if self._train_eagerly:
-            return self.training_process_eagerly(features, labels)
-        else:
-            return self.training_process_with_acceleration(features, labels)
-
     @tf.function
     def training_process_with_acceleration(self, features, labels):
+        """
+        The training step runs under tf.function, including the embedding
+        lookups of elasticdl.layers.embedding which call PS through
+        `tf.py_function`.
+        """
         return self.training_process_eagerly(features, labels)
 
     def training_process_eagerly(self, features, labels):
@@ -758,7 +1270,9 @@ class Worker(object):
         return accepted, min_model_version
 
     def _run_training_task(self, features, labels):
-        loss, grads = self.training_process(features, labels)
+        self._pull_embedding_vectors_of_minibatch(features)
+        loss, grads = self.training_process_with_acceleration(features, labels)
+        self._minibatch_embedding_vectors = {}
         if self._distribution_strategy == DistributionStrategy.ALLREDUCE:
             # TODO: Delay certain amount of time before retrying
             for _ in range(self._max_allreduce_retry_num + 1):
@@ -770,6 +1284,7 @@ class Worker(object):
                         "Failed to perform allreduce operation on"
                         "the gradients. Retrying..."
                     )
+            return False, None, loss
         else:
             return (*self._collect_gradients_without_allreduce(grads), loss)
 
@@ -788,13 +1303,17 @@ class Worker(object):
             self._evaluation_result[key].append(labels.numpy())
 
     def _run_evaluation_task(self, features, labels):
+        self._pull_embedding_vectors_of_minibatch(features)
         outputs = self.forward_process(features)
+        self._minibatch_embedding_vectors = {}
         if not isinstance(outputs, dict):
             outputs = {MetricsDictKey.MODEL_OUTPUT: outputs}
         self._collect_evaluation_result(outputs, labels)
 
     def _run_prediction_task(self, features):
+        self._pull_embedding_vectors_of_minibatch(features)
         predictions = self.forward_process(features)
+        self._minibatch_embedding_vectors = {}
         return self.report_prediction_outputs(predictions)
 
     def _process_minibatch(
@@ -805,7 +1324,7 @@ class Worker(object):
         min_model_version,
         train_with_local_model=False,
     ):
-        if self._need_embedding_layer_check or not self._var_created:
+        if not self._var_created:
             self._run_model_call_before_training(features)
         self._timing.start_record_time("batch_process")
         for _ in range(self._max_minibatch_retry_num):
@@ -817,7 +1336,7 @@ class Worker(object):
                 #       get_model call.
                 if not train_with_local_model:
                     self.get_model()
-                *accepted, min_model_version, loss = self._run_training_task(
+                accepted, min_model_version, loss = self._run_training_task(
                     features, labels
                 )
                 if accepted:
@@ -976,7 +1495,9 @@ class Worker(object):
             )
             dataset = dataset.batch(self._minibatch_size).prefetch(1)
             self._timing.start_record_time("task_process")
-            for dataset_batch in dataset:
+            for dataset_batch in self._iterate_prefetching_embedding_vectors(
+                dataset
+            ):
                 if self._job_type == JobType.TRAINING_WITH_EVALUATION:
                     # Give the worker a chance to process an evaluation task
                     # during training if the task exists
@@ -1011,12 +1532,22 @@ class Worker(object):
                     last_training_minibatch_failed = False
                     if local_update_count < self._get_model_steps:
                         self._update_local_model()
+                # The pushes in flight are all of the current task, so
+                # they are completed before the task is reported, and
+                # their failures fail the task.
+                if self._task_data_service.is_task_done_after(
+                    self._minibatch_size
+                ):
+                    err_msg = self._complete_gradient_pushes() or err_msg
                 if self._task_data_service.report_record_done(
                     self._minibatch_size, err_msg
                 ):
                     self._timing.end_record_time("task_process")
                     self._timing.report_timing(reset=True)
                     self._timing.start_record_time("task_process")
+            # Complete the gradient pushes before evaluating or saving the
+            # model.
+            self._complete_gradient_pushes()
             del dataset
             # New evaluation tasks may be created after this worker's
             # training tasks are done, as other workers' may still
@@ -1061,7 +1592,9 @@ class Worker(object):
                 self._task_data_service.data_reader.metadata,
             )
             dataset = dataset.batch(self._minibatch_size).prefetch(1)
-            for dataset_batch in dataset:
+            for dataset_batch in self._iterate_prefetching_embedding_vectors(
+                dataset
+            ):
                 task = self._task_data_service.get_current_task()
 
                 err_msg = self._process_minibatch_and_report(
@@ -1077,9 +1610,12 @@ class Worker(object):
         Fetches task from master with and performs training, evaluation
         or prediction.
         """
-        if self._job_type == JobType.PREDICTION_ONLY:
-            self._predict_only()
-        elif self._job_type == JobType.EVALUATION_ONLY:
-            self._evaluate_only()
-        else:
-            self._train_and_evaluate()
+        try:
+            if self._job_type == JobType.PREDICTION_ONLY:
+                self._predict_only()
+            elif self._job_type == JobType.EVALUATION_ONLY:
+                self._evaluate_only()
+            else:
+                self._train_and_evaluate()
+        finally:
+            self._task_data_service.close()
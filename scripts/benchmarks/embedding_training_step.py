@@ -0,0 +1,122 @@
+"""Benchmark of eager and tf.function training steps of deepfm_edl_embedding.
+
+The ElasticDL `Embedding` layers of the model look up embedding vectors
+from in-process `EmbeddingTable`s instead of PS, so the time includes the
+`tf.py_function` boundary of the lookups but not the RPCs. The steps are
+the same as `Worker.training_process_eagerly` and
+`Worker.training_process_with_acceleration`.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/embedding_training_step.py \
+        --batch_size 64 --steps 100
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from elasticdl.python.common.model_utils import (
+    find_layer,
+    get_non_embedding_trainable_vars,
+    load_module,
+)
+from elasticdl.python.elasticdl.layers.embedding import Embedding
+from elasticdl.python.ps.embedding_table import EmbeddingTable
+
+_MODEL_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "../../model_zoo/deepfm_edl_embedding/deepfm_edl_embedding.py",
+)
+
+
+def _create_model(args):
+    module = load_module(_MODEL_FILE).__dict__
+    model = module["custom_model"](
+        input_dim=args.input_dim, embedding_dim=args.embedding_dim
+    )
+    embedding_layers = find_layer(model, Embedding)
+    tables = {
+        layer.name: EmbeddingTable(layer.name, layer.output_dim, "uniform")
+        for layer in embedding_layers
+    }
+    for layer in embedding_layers:
+        layer.set_lookup_embedding_func(
+            lambda name, ids: tables[name].get(ids)
+        )
+    return model, module["loss"], embedding_layers
+
+
+def _benchmark(args, compiled):
+    model, loss_fn, embedding_layers = _create_model(args)
+    rng = np.random.RandomState(0)
+    minibatches = [
+        (
+            tf.constant(
+                rng.randint(1, args.input_dim, size=(args.batch_size, 10)),
+                dtype=tf.int64,
+            ),
+            tf.constant(rng.randint(0, 2, size=(args.batch_size, 1))),
+        )
+        for _ in range(args.steps)
+    ]
+
+    # Create the model variables before training like
+    # `Worker._run_model_call_before_training`.
+    model.call(minibatches[0][0])
+    non_embed_vars = get_non_embedding_trainable_vars(model, embedding_layers)
+
+    def _training_step(features, labels):
+        with tf.GradientTape() as tape:
+            for layer in embedding_layers:
+                layer.set_tape(tape)
+            outputs = model.call(features, training=True)
+            loss = loss_fn(labels, outputs)
+        bets = [
+            batch_embedding
+            for layer in embedding_layers
+            for batch_embedding, _ in layer.embedding_and_ids
+        ]
+        grads = tape.gradient(loss, non_embed_vars + bets)
+        return loss, grads
+
+    if compiled:
+        _training_step = tf.function(_training_step)
+
+    def _run(features, labels):
+        _training_step(features, labels)
+        for layer in embedding_layers:
+            layer.reset()
+
+    # Warm up, including tracing the tf.function
+    _run(*minibatches[0])
+    start = time.time()
+    for features, labels in minibatches:
+        _run(features, labels)
+    return (time.time() - start) / args.steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--input_dim", type=int, default=5383)
+    parser.add_argument("--embedding_dim", type=int, default=64)
+    args = parser.parse_args()
+
+    eager_seconds = _benchmark(args, compiled=False)
+    compiled_seconds = _benchmark(args, compiled=True)
+    print(
+        "deepfm_edl_embedding, batch size %d, %d steps:"
+        % (args.batch_size, args.steps)
+    )
+    print("  %10s %14s" % ("step", "ms per step"))
+    print("  %10s %14.2f" % ("eager", eager_seconds * 1000))
+    print("  %10s %14.2f" % ("compiled", compiled_seconds * 1000))
+    print("  speedup %.2fx" % (eager_seconds / compiled_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Benchmark of bytes on the wire against convergence of gradient compression.
+
+It trains a model of the model zoo on MNIST or CIFAR-10 for each gradient
+compression codec. The gradients of every step are compressed into a
+`PushGradientRequest` like `Worker.report_gradient_to_ps` does, decoded like
+`PserverServicer.push_gradient` does, and then applied to the model.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/gradient_compression.py \
+        --model_def mnist_functional_api.mnist_functional_api.custom_model \
+        --dataset mnist --steps 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from elasticdl.proto import elasticdl_pb2
+from elasticdl.python.common.constants import GradientCompression
+from elasticdl.python.common.gradient_compression import (
+    GradientCompressor,
+    deserialize_gradient_pb,
+)
+from elasticdl.python.common.model_utils import (
+    get_module_file_path,
+    load_module,
+)
+
+
+def _load_data(dataset, num_samples, synthetic):
+    if synthetic:
+        # Random data which checks the benchmark itself runs
+        shape = (28, 28) if dataset == "mnist" else (32, 32, 3)
+        rng = np.random.RandomState(0)
+        images = rng.randint(0, 256, size=(num_samples,) + shape)
+        labels = rng.randint(0, 10, size=(num_samples, 1))
+        return (images, labels), (images, labels)
+    if dataset == "mnist":
+        return tf.keras.datasets.mnist.load_data()
+    return tf.keras.datasets.cifar10.load_data()
+
+
+def _preprocess(images, labels):
+    images = images.astype(np.float32) / 255.0
+    labels = labels.reshape((-1, 1)).astype(np.int32)
+    return images, labels
+
+
+def _train(model_module, train_data, test_data, compression, args):
+    tf.random.set_seed(0)
+    model = model_module["custom_model"]()
+    opt = model_module["optimizer"]()
+    loss_fn = model_module["loss"]
+    compressor = GradientCompressor(compression, args.top_k_ratio)
+    names = ["grad_%d" % i for i in range(len(model.trainable_variables))]
+
+    dataset = (
+        tf.data.Dataset.from_tensor_slices(train_data)
+        .shuffle(1024, seed=0)
+        .repeat()
+        .batch(args.minibatch_size)
+        .take(args.steps)
+    )
+    wire_bytes = 0
+    start = time.time()
+    for images, labels in dataset:
+        with tf.GradientTape() as tape:
+            outputs = model({"image": images}, training=True)
+            loss = loss_fn(labels, outputs)
+        grads = tape.gradient(loss, model.trainable_variables)
+
+        request = elasticdl_pb2.PushGradientRequest()
+        for grad, name in zip(grads, names):
+            compressor.emplace_gradient_pb(request.gradients, grad, name)
+        wire_bytes += request.ByteSize()
+        compressor.update_residuals(names)
+        grads = [
+            deserialize_gradient_pb(pb).to_tf_tensor()
+            for pb in request.gradients
+        ]
+        opt.apply_gradients(zip(grads, model.trainable_variables))
+    seconds = time.time() - start
+
+    test_images, test_labels = test_data
+    outputs = model.predict(
+        {"image": test_images}, batch_size=args.minibatch_size, verbose=0
+    )
+    accuracy = np.mean(np.argmax(outputs, axis=1) == test_labels[:, 0])
+    return wire_bytes / args.steps, float(loss), accuracy, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--model_zoo", default="model_zoo")
+    parser.add_argument(
+        "--model_def",
+        default="mnist_functional_api.mnist_functional_api.custom_model",
+    )
+    parser.add_argument(
+        "--dataset", choices=["mnist", "cifar10"], default="mnist"
+    )
+    parser.add_argument("--minibatch_size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--top_k_ratio", type=float, default=0.01)
+    parser.add_argument("--num_test_samples", type=int, default=2000)
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Use random data instead of downloading the dataset",
+    )
+    args = parser.parse_args()
+
+    model_module = load_module(
+        get_module_file_path(args.model_zoo, args.model_def)
+    ).__dict__
+    (train_images, train_labels), (test_images, test_labels) = _load_data(
+        args.dataset, args.num_test_samples, args.synthetic
+    )
+    train_data = _preprocess(train_images, train_labels)
+    test_data = _preprocess(
+        test_images[: args.num_test_samples],
+        test_labels[: args.num_test_samples],
+    )
+
+    print(
+        "%s on %s, %d steps of minibatch size %d:"
+        % (args.model_def, args.dataset, args.steps, args.minibatch_size)
+    )
+    print(
+        "  %-8s %14s %10s %10s %10s"
+        % ("codec", "bytes/push", "loss", "accuracy", "seconds")
+    )
+    for compression in [
+        "",
+        GradientCompression.FP16,
+        GradientCompression.BF16,
+        GradientCompression.TOP_K,
+    ]:
+        push_bytes, loss, accuracy, seconds = _train(
+            model_module, train_data, test_data, compression, args
+        )
+        print(
+            "  %-8s %14d %10.4f %10.4f %10.1f"
+            % (compression or "none", push_bytes, loss, accuracy, seconds)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of the throughput of sync-SGD push_gradient on PS.
+
+Concurrent workers are simulated by threads which call
+`PserverServicer.push_gradient` with serialized requests, so the time
+includes decoding the gradients, accumulating them and applying them every
+`grads_to_wait` pushes.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/sync_push_gradient.py \
+        --workers 1,2,4,8 --params 8 --rows 1000 --dim 64
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from elasticdl.proto import elasticdl_pb2
+from elasticdl.python.common.tensor import emplace_tensor_pb_from_ndarray
+from elasticdl.python.ps.parameters import Parameters
+from elasticdl.python.ps.servicer import PserverServicer
+
+
+def _create_servicer(args, workers):
+    servicer = PserverServicer(
+        Parameters(),
+        grads_to_wait=args.grads_to_wait or workers,
+        optimizer=tf.keras.optimizers.SGD(0.1),
+        use_async=False,
+        sync_version_tolerance=1 << 20,
+    )
+    model = elasticdl_pb2.Model()
+    for i in range(args.params):
+        emplace_tensor_pb_from_ndarray(
+            model.param,
+            np.zeros((args.rows, args.dim), dtype=np.float32),
+            name="param_%d" % i,
+        )
+    servicer.push_model(model, None)
+    return servicer
+
+
+def _serialized_request(args):
+    rng = np.random.RandomState(0)
+    req = elasticdl_pb2.PushGradientRequest()
+    for i in range(args.params):
+        emplace_tensor_pb_from_ndarray(
+            req.gradients,
+            rng.rand(args.rows, args.dim).astype(np.float32),
+            name="param_%d" % i,
+        )
+    return req.SerializeToString()
+
+
+def _benchmark(args, workers, request_bytes):
+    servicer = _create_servicer(args, workers)
+
+    def _push():
+        for _ in range(args.pushes):
+            req = elasticdl_pb2.PushGradientRequest.FromString(request_bytes)
+            servicer.push_gradient(req, None)
+
+    threads = [threading.Thread(target=_push) for _ in range(workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - start
+    return workers * args.pushes / seconds, servicer._parameters.version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--params", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--pushes", type=int, default=50)
+    parser.add_argument(
+        "--grads_to_wait",
+        type=int,
+        default=0,
+        help="The grads_to_wait of PS, or the number of workers if 0",
+    )
+    args = parser.parse_args()
+
+    request_bytes = _serialized_request(args)
+    print(
+        "%d parameters of (%d, %d), %d bytes per push, grads_to_wait %s:"
+        % (
+            args.params,
+            args.rows,
+            args.dim,
+            len(request_bytes),
+            args.grads_to_wait or "equals workers",
+        )
+    )
+    print("  %8s %12s %10s" % ("workers", "pushes/s", "versions"))
+    for workers in [int(w) for w in args.workers.split(",")]:
+        pushes_per_second, versions = _benchmark(args, workers, request_bytes)
+        print("  %8d %12.1f %10d" % (workers, pushes_per_second, versions))
+
+
+if __name__ == "__main__":
+    main()
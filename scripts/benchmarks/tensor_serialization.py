@@ -0,0 +1,95 @@
+"""Micro-benchmark of serializing sparse gradients to tensor protocol buffers.
+
+It compares `serialize_tensor` and `deserialize_tensor_pb` with the former
+encoding, which saves indices in the repeated field `indices`.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/tensor_serialization.py \
+        --rows 100000 --dim 16
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from elasticdl.proto import elasticdl_pb2
+from elasticdl.python.common.dtypes import (
+    dtype_numpy_to_tensor,
+    dtype_tensor_to_numpy,
+)
+from elasticdl.python.common.tensor import (
+    Tensor,
+    deserialize_tensor_pb,
+    serialize_tensor,
+)
+
+
+def _legacy_serialize_tensor(tensor, tensor_pb):
+    tensor_pb.dtype = dtype_numpy_to_tensor(tensor.values.dtype)
+    tensor_pb.dim.extend(tensor.values.shape)
+    tensor_pb.content = tensor.values.tobytes()
+    tensor_pb.indices.extend(tuple(tensor.indices))
+    tensor_pb.name = tensor.name
+
+
+def _legacy_deserialize_tensor_pb(tensor_pb, tensor):
+    dtype = dtype_tensor_to_numpy(tensor_pb.dtype)
+    size = dtype.itemsize
+    for d in tensor_pb.dim:
+        size *= d
+    if size != len(tensor_pb.content):
+        raise ValueError("Tensor PB size mismatch")
+    tensor.set(
+        values=np.ndarray(
+            shape=tensor_pb.dim, dtype=dtype, buffer=tensor_pb.content
+        ),
+        indices=np.array(tensor_pb.indices),
+        name=tensor_pb.name,
+    )
+    tensor_pb.Clear()
+
+
+def _benchmark(serialize_fn, deserialize_fn, tensor, repeat):
+    def _round_trip():
+        pb = elasticdl_pb2.Tensor()
+        serialize_fn(tensor, pb)
+        size = pb.ByteSize()
+        deserialize_fn(pb, Tensor())
+        return size
+
+    size = _round_trip()
+    seconds = min(timeit.repeat(_round_trip, number=1, repeat=repeat))
+    return seconds, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    tensor = Tensor(
+        rng.rand(args.rows, args.dim).astype(np.float32),
+        rng.randint(0, 2 ** 31 - 1, size=args.rows).astype(np.int64),
+        "embedding",
+    )
+    print("Round trip of (%d, %d) sparse tensor:" % (args.rows, args.dim))
+    for name, serialize_fn, deserialize_fn in [
+        (
+            "repeated indices",
+            _legacy_serialize_tensor,
+            _legacy_deserialize_tensor_pb,
+        ),
+        ("packed indices", serialize_tensor, deserialize_tensor_pb),
+    ]:
+        seconds, size = _benchmark(
+            serialize_fn, deserialize_fn, tensor, args.repeat
+        )
+        print("  %-18s %8.2f ms  %10d bytes" % (name, seconds * 1000, size))
+
+
+if __name__ == "__main__":
+    main()